@@ -0,0 +1,144 @@
+import argparse
+import importlib
+import os
+import sys
+import threading
+import time
+import traceback
+from contextlib import contextmanager
+
+# Application factory. Nothing heavy is imported at module level, so
+# `python app_factory.py --measure-startup` can attribute start-up time to
+# each blueprint. Optional heavy dependencies (fuzzywuzzy, numpy) and the
+# catalog snapshot are loaded on first use, or by a background warm-up
+# thread right after start-up, which then primes the hot routes (see warmup)
+# before /health/ready reports ready.
+
+# (module, blueprint attribute, url prefix)
+BLUEPRINTS = [
+    ('auth', 'auth_routes', '/auth'),
+    ('users', 'user_routes', '/user'),
+    ('movies', 'movie_routes', '/movies'),
+    ('people', 'people_routes', '/people'),
+    ('recommendations', 'rec_routes', '/recommendations'),
+]
+
+WARM_IMPORTS = ['fuzzywuzzy.fuzz', 'numpy']
+
+warm_up_state = {"done": False, "ms": None}
+
+
+@contextmanager
+def _phase(timings, name):
+    modules = len(sys.modules)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.append((name, (time.perf_counter() - start) * 1000, len(sys.modules) - modules))
+
+
+def warm_up(app):
+    # Imports deferred dependencies, maps the catalog snapshot and primes hot routes
+    import warmup
+    start = time.perf_counter()
+    for module_name in WARM_IMPORTS:
+        try:
+            importlib.import_module(module_name)
+        except ImportError:
+            pass
+    try:
+        import catalog_snapshot
+        catalog_snapshot.load()
+    except Exception:
+        print(traceback.format_exc())
+    if app.config.get('WARMUP_ENABLED', True):
+        warmup.run(app)
+    else:
+        warmup.mark_ready()
+    warm_up_state.update(done=True, ms=round((time.perf_counter() - start) * 1000, 1))
+
+
+def create_app(config=None, warm='background', timings=None):
+    """Build the Flask app.
+
+    `warm` is 'background' (warm up on a daemon thread), 'eager' (before
+    returning, e.g. with Gunicorn's --preload so workers inherit it) or None.
+    """
+    timings = [] if timings is None else timings
+    with _phase(timings, 'flask'):
+        from flask import Flask
+    with _phase(timings, 'flask_jwt_extended'):
+        from flask_jwt_extended import JWTManager
+    with _phase(timings, 'metrics'):
+        # Registers the Mongo command listener, so it must precede `database`
+        import metrics
+    with _phase(timings, 'database'):
+        from database import db  # noqa: F401
+
+    app = Flask(__name__)
+    # jsonify through orjson when it is installed
+    import serialization
+    app.json = serialization.JSONProvider(app)
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY')
+    app.config.update(config or {})
+
+    with _phase(timings, 'extensions'):
+        JWTManager(app)
+        try:
+            from flask_cors import CORS
+            CORS(app)
+        except ImportError:
+            pass
+
+    for module_name, attribute, prefix in BLUEPRINTS:
+        with _phase(timings, f"blueprint {module_name}"):
+            module = importlib.import_module(module_name)
+            app.register_blueprint(getattr(module, attribute), url_prefix=prefix)
+
+    with _phase(timings, 'init hooks'):
+        import catalog_changes
+        import interactions
+        import warmup
+        metrics.init_app(app)
+        catalog_changes.init_app(app)
+        interactions.init_app(app)
+        app.register_blueprint(warmup.health_routes, url_prefix='/health')
+
+    if warm == 'eager':
+        with _phase(timings, 'warm-up'):
+            warm_up(app)
+    elif warm == 'background':
+        threading.Thread(target=warm_up, args=(app,), name='startup-warm-up', daemon=True).start()
+    else:
+        warmup.mark_ready()
+    return app
+
+
+def measure_startup(warm=None):
+    timings = []
+    start = time.perf_counter()
+    create_app(warm=warm, timings=timings)
+    total = (time.perf_counter() - start) * 1000
+
+    print(f"{'phase':28} {'ms':>9} {'modules':>8}")
+    for name, ms, modules in timings:
+        print(f"{name:28} {ms:>9.1f} {modules:>8}")
+    print(f"{'total':28} {total:>9.1f} {len(sys.modules):>8}")
+    # Blueprint imports include whatever shared modules they pull in first
+    deferred = [name for name in WARM_IMPORTS if name in sys.modules]
+    if deferred and warm is None:
+        print(f"imported eagerly despite deferral: {', '.join(deferred)}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run the CineScope API")
+    parser.add_argument('--measure-startup', action='store_true', help="print import and init time per phase and exit")
+    parser.add_argument('--eager', action='store_true', help="include the warm-up in the startup measurement")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    args = parser.parse_args()
+    if args.measure_startup:
+        measure_startup(warm='eager' if args.eager else None)
+    else:
+        create_app().run(host=args.host, port=args.port)
@@ -0,0 +1,31 @@
+from quart import Quart
+from asgiref.wsgi import WsgiToAsgi
+from async_routes import async_movie_routes, async_people_routes
+
+# Optional ASGI serving mode, e.g.:
+#   hypercorn "asgi:create_asgi_app(app)"
+# Routes with async counterparts are served by Quart on the event loop,
+# every other request falls through to the existing Flask (WSGI) app.
+
+ASYNC_BLUEPRINTS = [
+    (async_movie_routes, '/movies'),
+    (async_people_routes, '/people'),
+]
+
+
+def create_asgi_app(flask_app):
+    quart_app = Quart(__name__)
+    for blueprint, prefix in ASYNC_BLUEPRINTS:
+        quart_app.register_blueprint(blueprint, url_prefix=prefix)
+    wsgi_app = WsgiToAsgi(flask_app)
+    adapter = quart_app.url_map.bind('')
+
+    async def app(scope, receive, send):
+        if scope['type'] == 'http':
+            try:
+                adapter.match(scope['path'], method=scope['method'])
+            except Exception:
+                return await wsgi_app(scope, receive, send)
+        return await quart_app(scope, receive, send)
+
+    return app
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import db_settings
+
+# Async data access for the ASGI serving mode.
+# With MONGO_URI set and motor installed, collections come from Motor.
+# Otherwise the synchronous collections from `database.db` are wrapped and run
+# on worker threads, which is also the local stand-in used with mongomock.
+
+
+class AsyncCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def sort(self, *args, **kwargs):
+        self._cursor = self._cursor.sort(*args, **kwargs)
+        return self
+
+    def limit(self, count):
+        self._cursor = self._cursor.limit(count)
+        return self
+
+    async def to_list(self, length=None):
+        cursor = self._cursor
+        if length is not None:
+            cursor = cursor.limit(length)
+        return await asyncio.to_thread(list, cursor)
+
+
+class AsyncAggregateCursor:
+    def __init__(self, collection, pipeline, kwargs):
+        self._collection = collection
+        self._pipeline = pipeline
+        self._kwargs = kwargs
+
+    async def to_list(self, length=None):
+        results = await asyncio.to_thread(
+            lambda: list(self._collection.aggregate(self._pipeline, **self._kwargs))
+        )
+        return results[:length] if length is not None else results
+
+
+class AsyncCollection:
+    def __init__(self, collection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs):
+        return AsyncCursor(self._collection.find(*args, **kwargs))
+
+    def aggregate(self, pipeline, **kwargs):
+        return AsyncAggregateCursor(self._collection, pipeline, kwargs)
+
+    async def find_one(self, *args, **kwargs):
+        return await asyncio.to_thread(self._collection.find_one, *args, **kwargs)
+
+    def with_options(self, **kwargs):
+        return AsyncCollection(self._collection.with_options(**kwargs))
+
+
+class ThreadedAsyncDB:
+    def __init__(self, sync_db):
+        self._db = sync_db
+
+    def get_movies_collection(self):
+        return AsyncCollection(self._db.get_movies_collection())
+
+    def get_people_collection(self):
+        return AsyncCollection(self._db.get_people_collection())
+
+    def get_users_collection(self):
+        return AsyncCollection(self._db.get_users_collection())
+
+
+class MotorDB:
+    def __init__(self, uri, db_name):
+        from motor.motor_asyncio import AsyncIOMotorClient
+        self._db = AsyncIOMotorClient(uri, **db_settings.client_options())[db_name]
+
+    def get_movies_collection(self):
+        return self._db['movies']
+
+    def get_people_collection(self):
+        return self._db['people']
+
+    def get_users_collection(self):
+        return self._db['users']
+
+
+_async_db = None
+
+
+def get_async_db():
+    global _async_db
+    if _async_db is None:
+        uri = os.environ.get('MONGO_URI')
+        driver = os.environ.get('CINESCOPE_ASYNC_DRIVER', 'motor' if uri else 'threaded')
+        if driver == 'motor' and uri:
+            try:
+                _async_db = MotorDB(uri, os.environ.get('MONGO_DB_NAME', 'cinescope'))
+            except ImportError:
+                _async_db = None
+        if _async_db is None:
+            from database import db
+            _async_db = ThreadedAsyncDB(db)
+    return _async_db
+
+
+def set_async_db(async_db):
+    # Used by tests to plug in a local stand-in
+    global _async_db
+    _async_db = async_db
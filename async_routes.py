@@ -0,0 +1,132 @@
+import asyncio
+from quart import Blueprint, jsonify
+from async_database import get_async_db
+from catalog_store import get_store
+from db_settings import OVERLOAD_ERRORS, OVERLOADED_ERROR, RETRY_AFTER_S, aggregate_options, catalog_reads, find_options
+from movies import CAST_PROJECTION, CREW_PROJECTION, cast_entry
+from people import (
+    POPULAR_PEOPLE_LIMIT, POPULAR_PEOPLE_PIPELINE, POPULAR_PEOPLE_PROJECTION, PERSON_MOVIE_PROJECTION,
+    cached_popular_body, person_movie_queries
+)
+from serialization import dumps
+
+# Async counterparts of the I/O-heavy catalog routes, served by the ASGI app.
+# Responses match the synchronous views in movies.py and people.py, with the
+# same query budgets, read preferences (route overrides use the Flask endpoint
+# names), overload responses and popular-people cache.
+async_movie_routes = Blueprint('async_movies', __name__)
+async_people_routes = Blueprint('async_people', __name__)
+
+
+async def _none():
+    return None
+
+
+async def _empty():
+    return []
+
+
+def _overloaded():
+    return jsonify(OVERLOADED_ERROR), 503, {"Retry-After": str(RETRY_AFTER_S)}
+
+
+@async_movie_routes.route('/<int:movie_id>', methods=['GET'])
+async def get_movie_details(movie_id):
+    async_db = get_async_db()
+    movies_collection = catalog_reads(async_db.get_movies_collection(), 'movies.get_movie_details')
+    people_collection = catalog_reads(async_db.get_people_collection(), 'movies.get_movie_details')
+    try:
+        movie = await movies_collection.find_one({"id": movie_id}, {"_id": 0, "content_hash": 0}, **find_options('detail'))
+        if not movie:
+            return jsonify({"error": "Movie not found"}), 404
+
+        # Cast, director and producers are independent lookups
+        cast_ids = movie.get('cast_ids', [])
+        people, director, producers = await asyncio.gather(
+            people_collection.find(
+                {"id": {"$in": cast_ids}}, CAST_PROJECTION, **find_options('detail')
+            ).to_list(None) if cast_ids else _empty(),
+            people_collection.find_one(
+                {"id": movie['director_id']}, CREW_PROJECTION, **find_options('detail')
+            ) if 'director_id' in movie else _none(),
+            people_collection.find(
+                {"id": {"$in": movie['producer_ids']}}, CREW_PROJECTION, **find_options('detail')
+            ).to_list(None) if 'producer_ids' in movie else _empty()
+        )
+
+        people_by_id = {p['id']: p for p in people}
+        movie['cast'] = [
+            cast_entry(people_by_id[cast_id], movie['title'])
+            for cast_id in cast_ids if cast_id in people_by_id
+        ]
+        if director:
+            movie['director'] = director
+        if producers:
+            movie['producers'] = producers
+        return jsonify(movie)
+    except OVERLOAD_ERRORS:
+        return _overloaded()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+async def _person_movies(movies_collection, person):
+    queries = person_movie_queries(person)
+    results = await asyncio.gather(*(
+        movies_collection.find(movie_filter, PERSON_MOVIE_PROJECTION, **find_options('people.popular')).to_list(None)
+        for _, movie_filter in queries
+    ))
+    movies = []
+    for (job, _), job_movies in zip(queries, results):
+        for movie in job_movies:
+            movie['job'] = job
+        movies.extend(job_movies)
+    return movies
+
+
+async def _popular_people(people_collection, movies_collection):
+    # Same ranking as people.popular_people, from the store when a snapshot is loaded
+    store = get_store()
+    if store is not None:
+        top = store.top_people(min_movies=5, limit=POPULAR_PEOPLE_LIMIT)
+        found = await people_collection.find(
+            {"id": {"$in": [person_id for person_id, _ in top]}}, POPULAR_PEOPLE_PROJECTION,
+            **find_options('people.popular')
+        ).to_list(None)
+        people_by_id = {p['id']: p for p in found}
+        people = [
+            {**people_by_id[person_id], "movie_count": movie_count}
+            for person_id, movie_count in top if person_id in people_by_id
+        ]
+    else:
+        people = await people_collection.aggregate(
+            POPULAR_PEOPLE_PIPELINE, **aggregate_options('people.popular')
+        ).to_list(None)
+    filmographies = await asyncio.gather(*(
+        _person_movies(movies_collection, person) for person in people
+    ))
+    for person, movies in zip(people, filmographies):
+        person['movies'] = movies
+    return people
+
+
+@async_people_routes.route('/popular', methods=['GET'])
+async def get_popular_people():
+    async_db = get_async_db()
+    people_collection = catalog_reads(async_db.get_people_collection(), 'people.get_popular_people')
+    movies_collection = catalog_reads(async_db.get_movies_collection(), 'people.get_popular_people')
+    loop = asyncio.get_running_loop()
+
+    def compute():
+        # Runs on a cache thread (or the refresh pool), the queries on this loop
+        future = asyncio.run_coroutine_threadsafe(_popular_people(people_collection, movies_collection), loop)
+        return dumps(future.result())
+
+    try:
+        # Shares the sync view's cache, so concurrent misses still run one computation
+        body = await asyncio.to_thread(cached_popular_body, compute)
+        return body + b"\n", 200, {"Content-Type": "application/json"}
+    except OVERLOAD_ERRORS:
+        return _overloaded()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
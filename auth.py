@@ -1,9 +1,17 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, create_refresh_token
-from models.user import User
+from models.user import User, LOGIN_PROJECTION
+import click
+from password_hashing import HashingOverloaded
 
 auth_routes = Blueprint('auth', __name__)
 
+@auth_routes.cli.command('backfill-default-profiles')
+def backfill_default_profiles():
+    """Give every legacy user without profiles a default profile."""
+    count = User.backfill_default_profiles()
+    click.echo(f"Backfilled default profiles for {count} users")
+
 @auth_routes.route('/register', methods=['POST'])
 def register():
     try:
@@ -34,6 +42,8 @@ def register():
 
     except ValueError as e:
         return jsonify({"error": str(e)}), 400
+    except HashingOverloaded:
+        return jsonify({"error": "Server busy, please try again"}), 503
     except Exception as e:
         print(e)
         return jsonify({"error": "Registration failed"}), 500
@@ -44,12 +54,23 @@ def login():
     if not data or 'email' not in data or 'password' not in data:
         return jsonify({"error": "Email and password are required"}), 400
 
-    user = User.find_by_email(data['email'])
-    if not user or not User.verify_password(user, data['password']):
-        return jsonify({"error": "Invalid credentials"}), 401
+    try:
+        user = User.find_by_email(data['email'], LOGIN_PROJECTION)
+        if not user or not User.verify_password(user, data['password']):
+            return jsonify({"error": "Invalid credentials"}), 401
+    except HashingOverloaded:
+        return jsonify({"error": "Server busy, please try again"}), 503
+
+    # Transparently upgrade hashes made with older parameters; a busy pool only
+    # postpones the upgrade to a later login
+    try:
+        User.rehash_password_if_needed(user, data['password'])
+    except HashingOverloaded:
+        pass
 
-    # Ensure default profile exists
-    User.ensure_default_profile(str(user['_id']))
+    # Legacy documents the backfill has not reached yet are fixed without another read
+    if not user.get('profiles'):
+        User.ensure_default_profile(str(user['_id']), user)
 
     response_data = {
         "access_token": create_access_token(identity=str(user['_id'])),
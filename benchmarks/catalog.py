@@ -0,0 +1,215 @@
+import itertools
+import random
+from array import array
+from datetime import datetime
+
+# Synthetic movies / people / users collections for benchmarking.
+# Popularity is Zipf-like: a few actors appear in many movies and a few
+# movies collect most of the likes, like the real catalog.
+
+SCALES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+GENRES = [
+    "Action", "Adventure", "Animation", "Comedy", "Crime", "Documentary", "Drama", "Family",
+    "Fantasy", "History", "Horror", "Music", "Mystery", "Romance", "Science Fiction",
+    "Thriller", "War", "Western"
+]
+LANGUAGES = ["en", "hi", "te", "ta", "ml", "ko", "ja", "fr", "es"]
+LANGUAGE_WEIGHTS = [50, 14, 9, 7, 5, 5, 4, 3, 3]
+KNOWN_FOR = ["acting"] * 8 + ["directing", "production"]
+
+ADJECTIVES = [
+    "Silent", "Broken", "Golden", "Last", "Hidden", "Crimson", "Endless", "Lost", "Midnight",
+    "Wild", "Frozen", "Burning", "Secret", "Dark", "Little", "Electric", "Distant", "Final"
+]
+NOUNS = [
+    "River", "Kingdom", "Promise", "Road", "Empire", "Summer", "Storm", "Garden", "Signal",
+    "Harbor", "Letter", "Horizon", "Machine", "Dream", "City", "Witness", "Frontier", "Song"
+]
+FIRST_NAMES = [
+    "Arjun", "Maya", "Ravi", "Sofia", "Kenji", "Lena", "Omar", "Priya", "Lucas", "Aisha",
+    "Daniel", "Mei", "Vikram", "Elena", "Samuel", "Nora", "Karthik", "Yuna", "Marco", "Ines"
+]
+LAST_NAMES = [
+    "Sharma", "Reddy", "Tanaka", "Garcia", "Kim", "Nair", "Rossi", "Khan", "Dubois", "Iyer",
+    "Silva", "Park", "Menon", "Novak", "Costa", "Das", "Moreau", "Rao", "Chen", "Lopez"
+]
+
+PASSWORD = "benchmark"
+
+
+def parse_scale(value):
+    value = str(value).lower()
+    if value in SCALES:
+        return SCALES[value]
+    return int(value)
+
+
+def zipf_weights(n, exponent=1.1):
+    # Cumulative weights for rank-ordered popularity, usable with random.choices
+    return list(itertools.accumulate(1 / (rank ** exponent) for rank in range(1, n + 1)))
+
+
+def movie_title(movie_id):
+    return (
+        f"{ADJECTIVES[movie_id % len(ADJECTIVES)]} "
+        f"{NOUNS[(movie_id // len(ADJECTIVES)) % len(NOUNS)]} {movie_id}"
+    )
+
+
+def person_name(person_id):
+    return (
+        f"{FIRST_NAMES[person_id % len(FIRST_NAMES)]} "
+        f"{LAST_NAMES[(person_id // len(FIRST_NAMES)) % len(LAST_NAMES)]} {person_id}"
+    )
+
+
+def _batches(documents, batch_size):
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _insert(collection, documents, batch_size, progress, label):
+    inserted = 0
+    for batch in _batches(documents, batch_size):
+        collection.insert_many(batch, ordered=False)
+        inserted += len(batch)
+        if progress:
+            progress(label, inserted)
+    return inserted
+
+
+def _movies(rng, count, people_cum, people_count, credits, current_year):
+    people_ids = range(1, people_count + 1)
+    for movie_id in range(1, count + 1):
+        language = rng.choices(LANGUAGES, LANGUAGE_WEIGHTS)[0]
+        cast_ids = sorted(set(rng.choices(people_ids, cum_weights=people_cum, k=rng.randint(3, 10))))
+        for person_id in cast_ids:
+            credits.setdefault(person_id, array('l')).append(movie_id)
+        movie = {
+            "id": movie_id,
+            "title": movie_title(movie_id),
+            "original_title": movie_title(movie_id),
+            "overview": f"A story set around the {NOUNS[movie_id % len(NOUNS)].lower()}.",
+            # Skewed towards recent years, with a slice of current-year releases
+            "release_year": str(max(1950, current_year - int(rng.expovariate(1 / 12)))),
+            "vote_average": round(rng.uniform(2.0, 9.5), 1),
+            "vote_count": int(rng.paretovariate(1.1) * 10),
+            "genres": rng.sample(GENRES, rng.randint(1, 3)),
+            "language": language,
+            "original_language": language,
+            "backdrop_path": f"/backdrop/{movie_id}.jpg",
+            "cast_ids": cast_ids,
+            "director_id": rng.choices(people_ids, cum_weights=people_cum)[0],
+            "producer_ids": sorted(set(rng.choices(people_ids, cum_weights=people_cum, k=2)))
+        }
+        if rng.random() < 0.95:
+            movie["poster_path"] = f"/poster/{movie_id}.jpg"
+        if rng.random() < 0.05:
+            movie["movie_url"] = f"https://example.com/watch/{movie_id}"
+        if rng.random() < 0.3:
+            movie["trailer_url"] = f"https://example.com/trailer/{movie_id}"
+        yield movie
+
+
+def _people(rng, count, credits, movie_languages):
+    for person_id in range(1, count + 1):
+        movie_ids = credits.get(person_id, ())
+        yield {
+            "id": person_id,
+            "name": person_name(person_id),
+            "profile_path": f"/profile/{person_id}.jpg",
+            "known_for": rng.choice(KNOWN_FOR),
+            "biography": "",
+            "birthday": f"{rng.randint(1940, 2005)}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "place_of_birth": "",
+            "popularity": round(len(movie_ids) + rng.random(), 2),
+            "characters": [
+                {
+                    "movie": movie_title(movie_id),
+                    "name": f"Character {movie_id}",
+                    "language": movie_languages[movie_id - 1]
+                }
+                for movie_id in movie_ids
+            ]
+        }
+
+
+def _users(rng, count, movie_cum, movie_count, password_hash):
+    movie_ids = range(1, movie_count + 1)
+    for index in range(count):
+        likes = list(dict.fromkeys(rng.choices(movie_ids, cum_weights=movie_cum, k=int(rng.expovariate(1 / 20)))))
+        dislikes = [m for m in rng.sample(movie_ids, min(movie_count, rng.randint(0, 5))) if m not in likes]
+        profiles = []
+        for profile_idx in range(rng.choice([1, 1, 1, 2, 3])):
+            profiles.append({
+                "name": f"Profile {profile_idx}",
+                "profile_emoji": "👤",
+                "is_child": False,
+                "is_default": profile_idx == 0,
+                "created_at": datetime.utcnow(),
+                "preferred_genres": rng.sample(GENRES, rng.randint(0, 3)),
+                "preferred_languages": rng.sample(LANGUAGES, rng.randint(0, 2)),
+                "watchlist": rng.sample(movie_ids, min(movie_count, rng.randint(0, 15)))
+            })
+        yield {
+            "name": f"Bench User {index}",
+            "email": f"bench{index}@example.com",
+            "password": password_hash,
+            "profile_emoji": "👤",
+            "accepted_terms": True,
+            "is_child": False,
+            "is_admin": False,
+            "profiles": profiles,
+            "liked_movies": likes,
+            "disliked_movies": dislikes,
+            "created_at": datetime.utcnow()
+        }
+
+
+def generate(db, movies=10_000, people=None, users=None, seed=42, batch_size=5000, progress=None):
+    """Drop and refill the movies, people and users collections; returns the document counts."""
+    from password_hashing import hash_password
+
+    people = people or max(50, movies // 4)
+    users = users or max(10, movies // 10)
+    rng = random.Random(seed)
+    current_year = datetime.now().year
+
+    movies_collection = db.get_movies_collection()
+    people_collection = db.get_people_collection()
+    users_collection = db.get_users_collection()
+    for collection in (movies_collection, people_collection, users_collection):
+        collection.delete_many({})
+
+    # Movie ids each person is credited on, filled while the movies are written
+    credits = {}
+    languages = []
+    movie_docs = _movies(rng, movies, zipf_weights(people), people, credits, current_year)
+
+    def tracked(documents):
+        for document in documents:
+            languages.append(document["language"])
+            yield document
+
+    counts = {
+        "movies": _insert(movies_collection, tracked(movie_docs), batch_size, progress, "movies"),
+        "people": _insert(people_collection, _people(rng, people, credits, languages), batch_size, progress, "people"),
+        # Every synthetic user shares one password, hashing it per user would dominate setup
+        "users": _insert(
+            users_collection, _users(rng, users, zipf_weights(movies), movies, hash_password(PASSWORD)),
+            batch_size, progress, "users"
+        )
+    }
+
+    movies_collection.create_index("id", unique=True)
+    movies_collection.create_index("title")
+    people_collection.create_index("id", unique=True)
+    users_collection.create_index("email", unique=True)
+    return counts
@@ -0,0 +1,328 @@
+import argparse
+import gc
+import itertools
+import json
+import os
+import random
+import resource
+import statistics
+import sys
+import time
+import tracemalloc
+
+from benchmarks import catalog, stand_in
+
+# Drives every blueprint route through the Flask test client against a
+# synthetic catalog and reports throughput, latency percentiles and peak
+# memory per route. Stored baselines turn a run into a regression check.
+#
+#   python -m benchmarks.run --scale 10k --save-baseline
+#   python -m benchmarks.run --scale 10k --compare
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), 'baselines')
+
+
+# (name, method, path, needs_auth, body) -- path and body are called with the
+# scenario so every request can pick its own movie, person or user
+ROUTES = [
+    ("auth.register", "POST", lambda s: "/auth/register", False,
+     lambda s: {"email": s.unique_email(), "password": catalog.PASSWORD, "name": "Bench", "accepted_terms": True}),
+    ("auth.login", "POST", lambda s: "/auth/login", False,
+     lambda s: {"email": s.user_email(), "password": catalog.PASSWORD}),
+
+    ("movies.by_genre", "GET", lambda s: f"/movies/by-genre/{s.rng.choice(catalog.GENRES).lower()}", False, None),
+    ("movies.popular", "GET", lambda s: "/movies/popular", False, None),
+    ("movies.by_genre_language", "GET",
+     lambda s: f"/movies/by-genre-language?genre={s.rng.choice(catalog.GENRES)}&language={s.language()}", False, None),
+    ("movies.by_decade", "GET", lambda s: f"/movies/by-decade/{s.decade()}", False, None),
+    ("movies.by_decade_language", "GET", lambda s: f"/movies/by-decade-language/{s.decade()}/{s.language()}", False, None),
+    ("movies.search", "GET", lambda s: f"/movies/search?q={s.search_term()}", False, None),
+    ("movies.by_language", "GET", lambda s: f"/movies/by-language/{s.language()}", False, None),
+    ("movies.details", "GET", lambda s: f"/movies/{s.movie_id()}", False, None),
+    ("movies.free", "GET", lambda s: "/movies/free", False, None),
+    ("movies.new_releases", "GET", lambda s: "/movies/new-releases", False, None),
+
+    ("people.popular", "GET", lambda s: "/people/popular", False, None),
+    ("people.search", "GET", lambda s: f"/people/search?q={s.rng.choice(catalog.FIRST_NAMES)}", False, None),
+    ("people.details", "GET", lambda s: f"/people/{s.person_id()}", False, None),
+
+    ("recommendations.more_like_this", "GET", lambda s: f"/recommendations/more-like-this/{s.movie_id()}", True, None),
+    ("recommendations.chat", "POST", lambda s: "/recommendations/chat", True,
+     lambda s: {"query": s.chat_query()}),
+
+    ("user.profile", "GET", lambda s: "/user/profile", True, None),
+    ("user.update_profile", "PUT", lambda s: "/user/profile", True, lambda s: {"name": "Bench", "profile_emoji": "👤"}),
+    ("user.preferences", "PUT", lambda s: "/user/preferences/0", True,
+     lambda s: {"preferred_genres": s.rng.sample(catalog.GENRES, 2), "preferred_languages": [s.language()]}),
+    ("user.watchlist", "GET", lambda s: "/user/watchlist/0", True, None),
+    ("user.watchlist_add", "POST", lambda s: f"/user/watchlist/0/{s.movie_id()}", True, None),
+    ("user.watchlist_remove", "DELETE", lambda s: f"/user/watchlist/0/{s.movie_id()}", True, None),
+    ("user.interactions", "POST", lambda s: "/user/interactions", True,
+     lambda s: {"events": [
+         {"type": "like", "movie_id": s.movie_id()},
+         {"type": "dislike", "movie_id": s.movie_id()},
+         {"type": "watchlist_add", "profile_idx": 0, "movie_id": s.movie_id()}
+     ]}),
+    ("user.register", "POST", lambda s: "/user/register", False,
+     lambda s: {"name": "Bench", "email": s.unique_email(), "password": catalog.PASSWORD, "accepted_terms": True}),
+    ("user.profiles", "GET", lambda s: "/user/profiles", True, None),
+    ("user.like", "POST", lambda s: f"/user/like/{s.movie_id()}", True, None),
+    ("user.dislike", "POST", lambda s: f"/user/dislike/{s.movie_id()}", True, None),
+    ("user.likes", "GET", lambda s: "/user/likes", True, None),
+    ("user.create_profile", "POST", lambda s: "/user/profiles", True, lambda s: {"name": "Bench"}),
+    ("user.reset_password", "POST", lambda s: "/user/reset-password", True, lambda s: {"new_password": catalog.PASSWORD}),
+    ("user.default_watchlist", "GET", lambda s: "/user/watchlist", True, None),
+    ("user.update_profile_at", "PUT", lambda s: "/user/profile/0", True, lambda s: {"name": "Bench", "profile_emoji": "🎬"}),
+]
+
+CHAT_QUERIES = [
+    "funny hindi movie", "dark thriller", "something romantic in telugu", "feel good family film",
+    "scary horror from the 90s", "sci-fi adventure", "movies like the lost kingdom", "sad drama"
+]
+
+# Shared by both register routes, so their emails never collide
+_emails = itertools.count(1)
+
+
+class Scenario:
+    def __init__(self, counts, user_ids, seed):
+        self.rng = random.Random(seed)
+        self.counts = counts
+        self.user_ids = user_ids
+
+    def movie_id(self):
+        return self.rng.randint(1, self.counts["movies"])
+
+    def person_id(self):
+        return self.rng.randint(1, self.counts["people"])
+
+    def user_index(self):
+        return self.rng.randrange(len(self.user_ids))
+
+    def user_email(self):
+        return f"bench{self.user_index()}@example.com"
+
+    def unique_email(self):
+        return f"new{next(_emails)}-{os.getpid()}@example.com"
+
+    def language(self):
+        return self.rng.choices(catalog.LANGUAGES, catalog.LANGUAGE_WEIGHTS)[0]
+
+    def decade(self):
+        return self.rng.choice(range(1970, 2030, 10))
+
+    def search_term(self):
+        return catalog.movie_title(self.movie_id()).split(" ")[0].lower()
+
+    def chat_query(self):
+        return self.rng.choice(CHAT_QUERIES)
+
+
+def build_app():
+    from app_factory import create_app
+    # Warmed up eagerly so the first timed requests do not pay for deferred imports
+    return create_app({
+        "JWT_SECRET_KEY": os.environ.get('JWT_SECRET_KEY', 'benchmark-secret-key-benchmark-secret'),
+        "JWT_ACCESS_TOKEN_EXPIRES": False,
+        # Every route gets its own warm-up requests below
+        "WARMUP_ENABLED": False
+    }, warm='eager')
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def _issue(client, scenario, tokens, route):
+    name, method, path, needs_auth, body = route
+    headers = {}
+    if needs_auth:
+        headers["Authorization"] = f"Bearer {tokens[scenario.user_index()]}"
+    return client.open(
+        path(scenario), method=method, headers=headers,
+        json=body(scenario) if body else None
+    )
+
+
+def bench_route(client, scenario, tokens, route, requests, warmup, memory_samples):
+    for _ in range(warmup):
+        _issue(client, scenario, tokens, route)
+
+    latencies = []
+    errors = 0
+    timed_state = scenario.rng.getstate()
+    started = time.perf_counter()
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = _issue(client, scenario, tokens, route)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code >= 500:
+            errors += 1
+    wall = time.perf_counter() - started
+
+    # Memory is sampled in a separate pass, tracemalloc would skew the latencies.
+    # It replays the first timed requests, so it sees the caches they warmed
+    # rather than whichever users and cards have expired by now, and takes the
+    # median so one request for a long list does not set the route's figure
+    peak_kb = 0.0
+    if memory_samples:
+        scenario.rng.setstate(timed_state)
+        peaks = []
+        tracemalloc.start()
+        for _ in range(memory_samples):
+            tracemalloc.reset_peak()
+            _issue(client, scenario, tokens, route)
+            peaks.append(tracemalloc.get_traced_memory()[1] / 1024)
+        tracemalloc.stop()
+        peak_kb = statistics.median(peaks)
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "throughput_rps": round(requests / wall, 2) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 0.50), 3),
+        "p95_ms": round(percentile(latencies, 0.95), 3),
+        "p99_ms": round(percentile(latencies, 0.99), 3),
+        "peak_alloc_kb": round(peak_kb, 1)
+    }
+
+
+def baseline_path(scale, backend):
+    return os.path.join(BASELINE_DIR, f"{scale}-{backend}.json")
+
+
+def compare(results, baseline, tolerance, min_delta_ms):
+    # A route regresses when its median latency grows by more than `tolerance`
+    # and `min_delta_ms`, or its peak allocation by more than `tolerance`.
+    # p95 and throughput move with a single slow request at these request
+    # counts, so they are reported but not gated
+    regressions = []
+    for name, current in results["routes"].items():
+        previous = baseline["routes"].get(name)
+        if not previous:
+            continue
+        if (current["p50_ms"] > previous["p50_ms"] * (1 + tolerance)
+                and current["p50_ms"] - previous["p50_ms"] > min_delta_ms):
+            regressions.append(f"{name}: p50 {previous['p50_ms']}ms -> {current['p50_ms']}ms")
+        if previous["peak_alloc_kb"] and current["peak_alloc_kb"] > previous["peak_alloc_kb"] * (1 + tolerance):
+            regressions.append(f"{name}: peak alloc {previous['peak_alloc_kb']}KB -> {current['peak_alloc_kb']}KB")
+        if current["errors"] > previous["errors"]:
+            regressions.append(f"{name}: errors {previous['errors']} -> {current['errors']}")
+    return regressions
+
+
+def print_report(results):
+    print(f"{'route':34} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak KB':>9} {'5xx':>5}")
+    for name, stats in results["routes"].items():
+        print(
+            f"{name:34} {stats['throughput_rps']:>9} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+            f"{stats['p99_ms']:>9} {stats['peak_alloc_kb']:>9} {stats['errors']:>5}"
+        )
+    print(f"setup {results['setup_s']}s, peak RSS {results['peak_rss_mb']}MB")
+
+
+def print_read_routing(client):
+    # Which replica set member served each endpoint's commands, from the metrics listener
+    import metrics
+    roles = {f"{host}:{port}": "secondary" for host, port in client.secondaries}
+    if client.primary:
+        roles[f"{client.primary[0]}:{client.primary[1]}"] = "primary"
+    print(f"{'endpoint':40} {'server':24} {'role':10} {'commands':>9}")
+    for (endpoint, server), commands in sorted(metrics.mongo_servers.items()):
+        print(f"{endpoint:40} {server:24} {roles.get(server, '?'):10} {commands:>9}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark CineScope routes against a synthetic catalog")
+    parser.add_argument('--scale', default='10k', help="10k, 100k, 1m or a movie count (1m needs --backend mongod)")
+    parser.add_argument('--backend', choices=['mongomock', 'mongod'], default='mongomock')
+    parser.add_argument('--uri', help="mongod URI (default BENCH_MONGO_URI or localhost)")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=50, help="timed requests per route")
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--memory-samples', type=int, default=5)
+    parser.add_argument('--routes', help="comma separated route name prefixes, e.g. movies,recommendations.chat")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--compare', action='store_true', help="exit non-zero on regressions against the stored baseline")
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    parser.add_argument('--min-delta-ms', type=float, default=1.0,
+                        help="ignore median latency changes smaller than this")
+    parser.add_argument('--read-routing', action='store_true',
+                        help="report which replica set member served each endpoint (needs --backend mongod)")
+    args = parser.parse_args(argv)
+    if args.read_routing and args.backend != 'mongod':
+        parser.error("--read-routing needs --backend mongod")
+
+    movies = catalog.parse_scale(args.scale)
+    bench_db = stand_in.install(args.backend, args.uri)
+
+    setup_start = time.perf_counter()
+    counts = catalog.generate(
+        bench_db, movies=movies, seed=args.seed,
+        progress=lambda label, done: print(f"\r  {label}: {done}", end="", file=sys.stderr)
+    )
+    print(file=sys.stderr)
+    setup_s = round(time.perf_counter() - setup_start, 2)
+
+    app = build_app()
+    client = app.test_client()
+    from flask_jwt_extended import create_access_token
+    user_ids = [str(u["_id"]) for u in bench_db.get_users_collection().find({}, {"_id": 1}).limit(1000)]
+    with app.app_context():
+        tokens = [create_access_token(identity=user_id) for user_id in user_ids]
+
+    import cache
+    prefixes = args.routes.split(',') if args.routes else None
+    results = {"scale": args.scale, "backend": args.backend, "counts": counts, "setup_s": setup_s, "routes": {}}
+    for route in ROUTES:
+        if prefixes and not any(route[0].startswith(p) for p in prefixes):
+            continue
+        print(f"  {route[0]}", file=sys.stderr)
+        # Cached entries expire on a TTL and garbage from earlier routes is
+        # collected whenever it piles up, so without this a route's figures
+        # would depend on which routes ran before it and for how long
+        for registered in cache.CACHES.values():
+            registered.clear()
+        gc.collect()
+        # Same request sequence for every run, whatever subset of routes is selected
+        scenario = Scenario(counts, user_ids, f"{args.seed}:{route[0]}")
+        results["routes"][route[0]] = bench_route(
+            client, scenario, tokens, route, args.requests, args.warmup, args.memory_samples
+        )
+    results["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+    print_report(results)
+    if args.read_routing:
+        print_read_routing(bench_db.client)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    path = baseline_path(args.scale, args.backend)
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        with open(path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {path}")
+    if args.compare:
+        if not os.path.exists(path):
+            print(f"No baseline at {path}, run with --save-baseline first")
+            return 1
+        with open(path) as f:
+            regressions = compare(results, json.load(f), args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("Regressions:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print("No regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+import os
+import sys
+import types
+
+# Local database behind the blueprints while benchmarking. It provides the
+# `database.db` accessor the route modules import, and `models.user` when the
+# checkout has no models package, so it has to be installed before any of them
+# is imported.
+
+
+class BenchDB:
+    def __init__(self, client, db_name):
+        self.client = client
+        self.db = client[db_name]
+
+    def get_users_collection(self):
+        return self.db['users']
+
+    def get_movies_collection(self):
+        return self.db['movies']
+
+    def get_people_collection(self):
+        return self.db['people']
+
+
+def install(backend='mongomock', uri=None, db_name='cinescope_bench'):
+    if backend == 'mongomock':
+        import mongomock
+        _patch_mongomock()
+        client = mongomock.MongoClient()
+    elif backend == 'mongod':
+        # Registers the command listener before the client exists
+        import metrics  # noqa: F401
+        import db_settings
+        from pymongo import MongoClient
+        client = MongoClient(uri or os.environ.get('BENCH_MONGO_URI', 'mongodb://localhost:27017'), **db_settings.client_options())
+    else:
+        raise ValueError(f"Unknown backend: {backend}")
+
+    bench_db = BenchDB(client, db_name)
+    module = types.ModuleType('database')
+    module.db = bench_db
+    sys.modules['database'] = module
+    _install_models()
+    return bench_db
+
+
+def _patch_mongomock():
+    # What the app does that mongomock 4.x gets wrong: pymongo >= 4.9 passes
+    # `sort` to bulk updates and replaces, $addToSet/$pull on an indexed path
+    # such as profiles.0.watchlist raise or do nothing, and projections are
+    # modified in place, which breaks when threads share a projection constant
+    from mongomock.collection import BulkOperationBuilder, Collection
+    if getattr(Collection, '_bench_patched', False):
+        return
+    add_update = BulkOperationBuilder.add_update
+    add_replace = BulkOperationBuilder.add_replace
+    apply_update = Collection._apply_update_document
+    copy_only_fields = Collection._copy_only_fields
+
+    def _add_update(self, selector, doc, multi=False, upsert=False, collation=None,
+                    array_filters=None, hint=None, sort=None):
+        return add_update(self, selector, doc, multi, upsert, collation, array_filters, hint)
+
+    def _add_replace(self, selector, doc, upsert, collation=None, hint=None, sort=None):
+        return add_replace(self, selector, doc, upsert, collation, hint)
+
+    def _apply_update_document(self, existing_document, spec, document, was_insert):
+        document = dict(document)
+        for operator in ('$addToSet', '$pull'):
+            fields = document.get(operator) or {}
+            indexed = [field for field in fields if any(part.isdigit() for part in field.split('.'))]
+            if not indexed:
+                continue
+            document[operator] = {field: value for field, value in fields.items() if field not in indexed}
+            if not document[operator]:
+                del document[operator]
+            for field in indexed:
+                _update_indexed_array(existing_document, field, operator, fields[field])
+        # An update left without operators would be applied as a replacement
+        if document:
+            apply_update(self, existing_document, spec, document, was_insert)
+
+    def _copy_only_fields(self, doc, fields, container):
+        return copy_only_fields(self, doc, dict(fields) if isinstance(fields, dict) else fields, container)
+
+    BulkOperationBuilder.add_update = _add_update
+    BulkOperationBuilder.add_replace = _add_replace
+    Collection._apply_update_document = _apply_update_document
+    Collection._copy_only_fields = _copy_only_fields
+    Collection._bench_patched = True
+
+
+def _update_indexed_array(document, field, operator, value):
+    *parents, name = field.split('.')
+    for part in parents:
+        if isinstance(document, list):
+            index = int(part)
+            document = document[index] if index < len(document) else None
+        else:
+            document = document.get(part)
+        if document is None:
+            return
+    if operator == '$addToSet':
+        values = document.setdefault(name, [])
+        if value not in values:
+            values.append(value)
+    elif name in document:
+        document[name] = [item for item in document[name] if item != value]
+
+
+def _install_models():
+    # auth and users import `models.user`, served here by the top-level user module
+    try:
+        import models.user  # noqa: F401
+        return
+    except ImportError:
+        pass
+    import user
+    package = types.ModuleType('models')
+    package.__path__ = []
+    package.user = user
+    sys.modules['models'] = package
+    sys.modules['models.user'] = user
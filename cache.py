@@ -0,0 +1,169 @@
+import os
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Registry of named caches, so hit ratios can be inspected in one place
+CACHES = {}
+
+# Shared by every cache for stale-while-revalidate refreshes, created on first use
+# and again in every forked worker (warm-up can start it before the fork)
+REFRESH_WORKERS = 4
+_refresh_executor = None
+_refresh_lock = threading.Lock()
+
+
+def _refresh_pool():
+    global _refresh_executor
+    with _refresh_lock:
+        if _refresh_executor is None:
+            _refresh_executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='cache-refresh')
+        return _refresh_executor
+
+
+def _reset_refresh_pool():
+    global _refresh_executor, _refresh_lock
+    _refresh_executor = None
+    _refresh_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_refresh_pool)
+
+
+class _Flight:
+    # One in-progress computation of a key that concurrent callers wait on
+    def __init__(self, generation):
+        self.generation = generation
+        # Set when the key is deleted while the computation runs
+        self.invalidated = False
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class LRUCache:
+    # Entries older than `ttl` seconds (when set) count as misses, which bounds
+    # staleness across worker processes that cannot see each other's invalidations.
+    # With `stale_ttl`, get_or_compute keeps serving an expired entry for that many
+    # more seconds while a single background refresh replaces it.
+    def __init__(self, name, maxsize=1024, ttl=None, stale_ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.coalesced = 0
+        self._data = OrderedDict()
+        self._flights = {}
+        # Bumped by clear, so a computation that started earlier is not stored;
+        # delete only marks the in-flight computation of that key
+        self._generation = 0
+        self._lock = threading.Lock()
+        CACHES[name] = self
+
+    def _servable(self, age):
+        return self.stale_ttl is not None and age < self.ttl + self.stale_ttl
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key in self._data:
+                stored_at, value = self._data[key]
+                age = time.monotonic() - stored_at
+                if self.ttl is None or age < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                if not self._servable(age):
+                    del self._data[key]
+            self.misses += 1
+            return default
+
+    def get_or_compute(self, key, compute, timeout=None):
+        # Cached value for key; on a miss compute() runs once per key at a time and
+        # concurrent callers wait for its result instead of repeating the work,
+        # for at most `timeout` seconds (TimeoutError)
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                age = time.monotonic() - entry[0]
+                if self.ttl is None or age < self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                if self._servable(age):
+                    self.hits += 1
+                    self.stale_hits += 1
+                    if key not in self._flights:
+                        flight = self._flights[key] = _Flight(self._generation)
+                        _refresh_pool().submit(self._run, key, compute, flight, True)
+                    return entry[1]
+            self.misses += 1
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight(self._generation)
+            else:
+                self.coalesced += 1
+        if leader:
+            self._run(key, compute, flight, False)
+        elif not flight.done.wait(timeout):
+            raise TimeoutError(f"Timed out waiting for {self.name} entry {key!r}")
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _run(self, key, compute, flight, background):
+        try:
+            flight.value = compute()
+            with self._lock:
+                if flight.generation == self._generation and not flight.invalidated:
+                    self._store(key, flight.value)
+        except Exception as e:
+            flight.error = e
+            if background:
+                # The stale entry keeps being served, the next request retries
+                print(traceback.format_exc())
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _store(self, key, value):
+        self._data[key] = (time.monotonic(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def set(self, key, value):
+        with self._lock:
+            self._store(key, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+            flight = self._flights.get(key)
+            if flight is not None:
+                flight.invalidated = True
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generation += 1
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale_hits": self.stale_hits,
+            "coalesced": self.coalesced,
+            "hit_ratio": (self.hits / total) if total else 0.0
+        }
@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+from bson import ObjectId
+from database import db
+from interaction_log import READ_LAG
+
+# Catalog change notifications. Ingestion publishes the ids it inserted,
+# updated or deleted; subscribers (e.g. the movie card cache) drop only those
+# entries. Changes are also recorded in `catalog_changes`, which other worker
+# processes replay through poll().
+# A subscriber is called as subscriber(collection, kind, ids).
+
+CHANGES_COLLECTION = 'catalog_changes'
+POLL_INTERVAL = float(os.environ.get('CATALOG_CHANGE_POLL_S', '5'))
+# Changes are removed by a TTL index after this long, far beyond any poll delay
+RETENTION_S = int(os.environ.get('CATALOG_CHANGE_RETENTION_S', str(7 * 24 * 3600)))
+
+_subscribers = []
+_index_ready = False
+_poll_lock = threading.Lock()
+_last_poll = 0.0
+_last_seen_id = None
+
+
+def subscribe(subscriber):
+    _subscribers.append(subscriber)
+    return subscriber
+
+
+def _notify(collection, kind, ids):
+    for subscriber in _subscribers:
+        try:
+            subscriber(collection, kind, ids)
+        except Exception:
+            print(traceback.format_exc())
+
+
+def _changes():
+    return db.get_movies_collection().database[CHANGES_COLLECTION]
+
+
+def _ensure_ttl_index():
+    global _index_ready
+    if not _index_ready:
+        _changes().create_index("ts", expireAfterSeconds=RETENTION_S)
+        _index_ready = True
+
+
+def publish(collection, kind, ids):
+    if not ids:
+        return
+    ids = list(ids)
+    try:
+        _ensure_ttl_index()
+        _changes().insert_one({
+            "collection": collection,
+            "kind": kind,
+            "ids": ids,
+            "ts": datetime.utcnow()
+        })
+    except Exception:
+        print(traceback.format_exc())
+    _notify(collection, kind, ids)
+
+
+def latest_id(collections):
+    # _id of the newest change to any of `collections`, None without one
+    latest = _changes().find_one({"collection": {"$in": list(collections)}}, {"_id": 1}, sort=[("_id", -1)])
+    return latest["_id"] if latest else None
+
+
+def poll():
+    # Replays changes recorded by other processes since the last poll.
+    # The first poll only records the current position.
+    # Changes are published from several processes and ingest lanes, so one
+    # with an older _id can be committed after a newer one; reading READ_LAG
+    # behind "now", like the interaction log, keeps the position from passing it.
+    global _last_seen_id
+    changes = _changes()
+    id_filter = {"$lt": ObjectId.from_datetime(datetime.utcnow() - READ_LAG)}
+    if _last_seen_id is None:
+        latest = changes.find_one({"_id": id_filter}, {"_id": 1}, sort=[("_id", -1)])
+        _last_seen_id = latest["_id"] if latest else False
+        return 0
+    if _last_seen_id:
+        id_filter["$gt"] = _last_seen_id
+    count = 0
+    for change in changes.find({"_id": id_filter}).sort("_id", 1):
+        _notify(change["collection"], change["kind"], change["ids"])
+        _last_seen_id = change["_id"]
+        count += 1
+    return count
+
+
+def _maybe_poll():
+    global _last_poll
+    now = time.monotonic()
+    if now - _last_poll < POLL_INTERVAL or not _poll_lock.acquire(blocking=False):
+        return
+    try:
+        _last_poll = now
+        poll()
+    except Exception:
+        print(traceback.format_exc())
+    finally:
+        _poll_lock.release()
+
+
+def init_app(app):
+    # Checks for catalog changes at most every POLL_INTERVAL seconds, on whichever request comes first
+    app.before_request(_maybe_poll)
@@ -0,0 +1,315 @@
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pymongo import ReplaceOne
+from database import db
+import catalog_changes
+
+# Streaming import of TMDB-style movies.json / people.json into the catalog.
+# Files may be one JSON array or JSON lines; they are parsed incrementally
+# (ijson when installed), normalized and upserted by id in batched bulk_writes
+# spread over a few worker threads. Documents are partitioned by id across the
+# workers, so every version of an id is written by the same worker, in file order.
+#
+# Every stored document carries a hash of its normalized content, so a
+# re-import only writes (and publishes) the documents that actually changed.
+
+BATCH_SIZE = int(os.environ.get('CATALOG_INGEST_BATCH', '1000'))
+WORKERS = int(os.environ.get('CATALOG_INGEST_WORKERS', '4'))
+CHUNK_SIZE = 1 << 20
+HASH_FIELD = 'content_hash'
+
+_WHITESPACE = re.compile(r'[\s,]*')
+_YEAR = re.compile(r'(\d{4})')
+
+
+# --- Incremental parsing ---
+
+def _iter_array(f):
+    # Decodes one array element at a time from a growing buffer
+    decoder = json.JSONDecoder()
+    buffer = f.read(CHUNK_SIZE)
+    pos = _WHITESPACE.match(buffer, 0).end()
+    if buffer[pos:pos + 1] != '[':
+        raise ValueError("Expected a JSON array")
+    pos += 1
+    while True:
+        pos = _WHITESPACE.match(buffer, pos).end()
+        if buffer[pos:pos + 1] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                raise
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            continue
+        yield item
+        pos = end
+        if pos > CHUNK_SIZE:
+            buffer = buffer[pos:]
+            pos = 0
+
+
+def iter_documents(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        head = f.read(CHUNK_SIZE).lstrip()[:1]
+        f.seek(0)
+        if head != '[':
+            for line in f:
+                line = line.strip()
+                if line:
+                    yield json.loads(line)
+            return
+        try:
+            import ijson
+        except ImportError:
+            yield from _iter_array(f)
+            return
+    with open(path, 'rb') as f:
+        yield from ijson.items(f, 'item', use_float=True)
+
+
+# --- Normalization ---
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _ids(values):
+    ids = []
+    for value in values or []:
+        value = _int(value.get('id') if isinstance(value, dict) else value)
+        if value is not None and value not in ids:
+            ids.append(value)
+    return ids
+
+
+def _year(movie):
+    # release_year is stored as a 4-digit string, the listing queries compare it as text
+    for value in (movie.get('release_year'), movie.get('release_date')):
+        match = _YEAR.match(str(value or '').strip())
+        if match:
+            return match.group(1)
+    return None
+
+
+def _compact(doc):
+    # Listing queries filter with $exists, so missing values must be absent rather than null
+    return {key: value for key, value in doc.items() if value not in (None, '', [])}
+
+
+def normalize_movie(raw):
+    movie_id = _int(raw.get('id'))
+    title = (raw.get('title') or '').strip()
+    if movie_id is None or not title:
+        return None
+
+    credits = raw.get('credits') or {}
+    crew = credits.get('crew') or []
+    original_language = (raw.get('original_language') or '').strip().lower()
+    director_id = _int(raw.get('director_id'))
+    if director_id is None:
+        director_id = next((_int(c.get('id')) for c in crew if c.get('job') == 'Director'), None)
+
+    doc = dict(raw)
+    doc.pop('_id', None)
+    doc.pop('credits', None)
+    doc.update({
+        "id": movie_id,
+        "title": title,
+        "original_title": (raw.get('original_title') or title).strip(),
+        "genres": [
+            g.get('name') if isinstance(g, dict) else g
+            for g in raw.get('genres') or []
+            if (g.get('name') if isinstance(g, dict) else g)
+        ],
+        "release_year": _year(raw),
+        "original_language": original_language,
+        "language": (raw.get('language') or original_language).strip(),
+        "vote_average": _float(raw.get('vote_average')),
+        "vote_count": _int(raw.get('vote_count')),
+        "cast_ids": _ids(raw.get('cast_ids') or credits.get('cast')),
+        "director_id": director_id,
+        "producer_ids": _ids(raw.get('producer_ids') or [c for c in crew if c.get('job') == 'Producer']),
+    })
+    return _compact(doc)
+
+
+def normalize_person(raw):
+    person_id = _int(raw.get('id'))
+    name = (raw.get('name') or '').strip()
+    if person_id is None or not name:
+        return None
+
+    doc = dict(raw)
+    doc.pop('_id', None)
+    doc.pop('known_for_department', None)
+    doc.update({
+        "id": person_id,
+        "name": name,
+        # TMDB's known_for_department ("Acting", "Directing", ...) maps onto known_for
+        "known_for": (raw.get('known_for') or raw.get('known_for_department') or '').strip().lower(),
+        "popularity": _float(raw.get('popularity')),
+        "characters": [
+            {
+                "movie": c['movie'].strip(),
+                "name": (c.get('name') or c.get('character') or '').strip(),
+                "language": (c.get('language') or '').strip()
+            }
+            for c in raw.get('characters') or []
+            if isinstance(c, dict) and c.get('movie')
+        ],
+    })
+    return _compact(doc)
+
+
+NORMALIZERS = {
+    "movies": normalize_movie,
+    "people": normalize_person,
+}
+
+
+# --- Delta writes ---
+
+def content_hash(doc):
+    payload = json.dumps(doc, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+
+def _collection(name):
+    return db.get_movies_collection() if name == 'movies' else db.get_people_collection()
+
+
+def _write_batch(collection_name, docs):
+    # Replaces only documents whose hash differs from the stored one,
+    # returns (inserted, updated, unchanged)
+    collection = _collection(collection_name)
+    docs = list({doc['id']: doc for doc in docs}.values())
+    stored = {
+        doc['id']: doc.get(HASH_FIELD)
+        for doc in collection.find({"id": {"$in": [d['id'] for d in docs]}}, {"_id": 0, "id": 1, HASH_FIELD: 1})
+    }
+    requests = []
+    inserted = []
+    updated = []
+    for doc in docs:
+        doc[HASH_FIELD] = content_hash(doc)
+        if doc['id'] not in stored:
+            inserted.append(doc['id'])
+        elif stored[doc['id']] != doc[HASH_FIELD]:
+            updated.append(doc['id'])
+        else:
+            continue
+        requests.append(ReplaceOne({"id": doc['id']}, doc, upsert=True))
+    if requests:
+        collection.bulk_write(requests, ordered=False)
+    catalog_changes.publish(collection_name, 'inserted', inserted)
+    catalog_changes.publish(collection_name, 'updated', updated)
+    return len(inserted), len(updated), len(docs) - len(requests)
+
+
+def delete_missing(collection_name, seen_ids, batch_size=BATCH_SIZE):
+    # Removes documents that are no longer in the source file
+    collection = _collection(collection_name)
+    missing = [
+        doc['id'] for doc in collection.find({}, {"_id": 0, "id": 1})
+        if doc.get('id') not in seen_ids
+    ]
+    for batch in _batches(missing, batch_size):
+        collection.delete_many({"id": {"$in": batch}})
+        catalog_changes.publish(collection_name, 'deleted', batch)
+    return len(missing)
+
+
+def _batches(docs, batch_size):
+    batch = []
+    for doc in docs:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def ingest(collection_name, path, batch_size=BATCH_SIZE, workers=WORKERS, progress=None, delete=False):
+    """Sync `collection_name` with the valid documents of `path`; returns counters.
+
+    With `delete`, documents missing from the file are removed as well, so
+    only pass it for complete dumps.
+    """
+    normalize = NORMALIZERS[collection_name]
+    stats = {"read": 0, "invalid": 0, "inserted": 0, "updated": 0, "unchanged": 0, "deleted": 0, "elapsed_s": 0.0}
+    seen_ids = set()
+    start = time.perf_counter()
+
+    def valid_docs():
+        for raw in iter_documents(path):
+            stats["read"] += 1
+            doc = normalize(raw) if isinstance(raw, dict) else None
+            if doc is None:
+                stats["invalid"] += 1
+                continue
+            if delete:
+                seen_ids.add(doc['id'])
+            yield doc
+
+    def collect(futures):
+        for future in futures:
+            inserted, updated, unchanged = future.result()
+            stats["inserted"] += inserted
+            stats["updated"] += updated
+            stats["unchanged"] += unchanged
+        stats["elapsed_s"] = round(time.perf_counter() - start, 2)
+        if progress:
+            progress(collection_name, stats)
+
+    # One single-threaded lane per worker: two batches holding the same id never
+    # run concurrently, where both could miss the stored hash and insert it twice
+    lanes = [ThreadPoolExecutor(max_workers=1, thread_name_prefix=f'catalog-ingest-{n}') for n in range(workers)]
+    batches = [[] for _ in range(workers)]
+    pending = set()
+
+    def submit(lane):
+        nonlocal pending
+        # Bounded in-flight batches keep memory flat on large files
+        if len(pending) >= workers * 2:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+        pending.add(lanes[lane].submit(_write_batch, collection_name, batches[lane]))
+        batches[lane] = []
+
+    try:
+        for doc in valid_docs():
+            lane = doc['id'] % workers
+            batches[lane].append(doc)
+            if len(batches[lane]) >= batch_size:
+                submit(lane)
+        for lane in range(workers):
+            if batches[lane]:
+                submit(lane)
+        collect(wait(pending).done)
+    finally:
+        for executor in lanes:
+            executor.shutdown()
+
+    if delete:
+        stats["deleted"] = delete_missing(collection_name, seen_ids, batch_size)
+    stats["elapsed_s"] = round(time.perf_counter() - start, 2)
+    return stats
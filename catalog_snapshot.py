@@ -0,0 +1,311 @@
+import json
+import os
+import shutil
+import threading
+import time
+import traceback
+from array import array
+from datetime import datetime
+from bson import ObjectId
+from database import db
+import catalog_changes
+
+# Versioned, columnar on-disk snapshot of the catalog and its derived indexes.
+#
+#   <SNAPSHOT_DIR>/CURRENT              name of the live version
+#   <SNAPSHOT_DIR>/<version>/manifest.json
+#   <SNAPSHOT_DIR>/<version>/<column>.npy
+#
+# Workers memory-map the columns read-only, so every process on a host shares
+# the same page cache. current() picks up a newly built version without a
+# restart; readers holding the previous Snapshot keep using it until they drop it.
+# A snapshot older than the latest catalog change is not served, so readers
+# fall back to Mongo until the next build.
+# Strings are stored as a utf-8 blob plus offsets, genres as indexes into the
+# manifest's vocabularies.
+# numpy is optional and only imported on first use, it would otherwise
+# dominate worker start-up.
+
+SNAPSHOT_DIR = os.environ.get('CATALOG_SNAPSHOT_DIR', 'snapshots')
+CHECK_INTERVAL = float(os.environ.get('CATALOG_SNAPSHOT_CHECK_S', '30'))
+KEEP_VERSIONS = 3
+FORMAT = 3
+
+MOVIE_SNAPSHOT_PROJECTION = {
+    "_id": 0, "id": 1, "title": 1, "original_title": 1, "vote_average": 1, "genres": 1,
+    "poster_path": 1, "cast_ids": 1, "director_id": 1
+}
+PERSON_SNAPSHOT_PROJECTION = {"_id": 0, "id": 1, "characters.movie": 1}
+SNAPSHOT_COLLECTIONS = ('movies', 'people')
+
+_swap_subscribers = []
+_lock = threading.Lock()
+_current = None
+_last_check = 0.0
+_snapshot_dir = SNAPSHOT_DIR
+# Whether a catalog change arrived since _current was last checked against them
+_changed = False
+_stale = False
+
+
+def available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# --- Build ---
+
+class _Vocabulary:
+    def __init__(self):
+        self.values = []
+        self._index = {}
+
+    def code(self, value):
+        if value not in self._index:
+            self._index[value] = len(self.values)
+            self.values.append(value)
+        return self._index[value]
+
+
+class _Strings:
+    def __init__(self):
+        self.blob = bytearray()
+        self.offsets = array('q', [0])
+
+    def append(self, value):
+        self.blob += (value or '').encode('utf-8')
+        self.offsets.append(len(self.blob))
+
+
+class _Ragged:
+    # CSR layout: values of row i are data[indptr[i]:indptr[i + 1]], and
+    # rows[j] is the row of data[j]
+    def __init__(self, typecode):
+        self.indptr = array('q', [0])
+        self.data = array(typecode)
+        self.rows = array('i')
+
+    def append(self, values):
+        start = len(self.data)
+        self.data.extend(values)
+        self.rows.extend([len(self.indptr) - 1] * (len(self.data) - start))
+        self.indptr.append(len(self.data))
+
+
+def _movie_columns(genres):
+    ids = array('q')
+    vote_average = array('d')
+    has_poster = array('b')
+    director_id = array('q')
+    genre_codes = _Ragged('h')
+    cast_ids = _Ragged('q')
+    titles = _Strings()
+    original_titles = _Strings()
+
+    cursor = db.get_movies_collection().find({"id": {"$type": "number"}}, MOVIE_SNAPSHOT_PROJECTION).sort("id", 1)
+    for movie in cursor:
+        ids.append(int(movie['id']))
+        # NaN marks a missing rating, which scores differently from a 0 rating
+        rating = movie.get('vote_average')
+        vote_average.append(float(rating) if rating is not None else float('nan'))
+        has_poster.append(1 if movie.get('poster_path') else 0)
+        director_id.append(int(movie.get('director_id') or 0))
+        genre_codes.append(genres.code(g) for g in movie.get('genres') or [] if isinstance(g, str))
+        cast_ids.append(int(c) for c in movie.get('cast_ids') or [])
+        titles.append(movie.get('title'))
+        original_titles.append(movie.get('original_title'))
+
+    return {
+        "movie_id": (ids, 'int64'),
+        "movie_vote_average": (vote_average, 'float64'),
+        "movie_has_poster": (has_poster, 'bool'),
+        "movie_director_id": (director_id, 'int64'),
+        "movie_genres_indptr": (genre_codes.indptr, 'int64'),
+        "movie_genres": (genre_codes.data, 'int16'),
+        "movie_genres_rows": (genre_codes.rows, 'int32'),
+        "movie_cast_indptr": (cast_ids.indptr, 'int64'),
+        "movie_cast": (cast_ids.data, 'int64'),
+        "movie_cast_rows": (cast_ids.rows, 'int32'),
+        "movie_title_offsets": (titles.offsets, 'int64'),
+        "movie_title_blob": (titles.blob, 'uint8'),
+        "movie_original_title_offsets": (original_titles.offsets, 'int64'),
+        "movie_original_title_blob": (original_titles.blob, 'uint8'),
+    }
+
+
+def _person_columns():
+    ids = array('q')
+    movie_count = array('i')
+
+    cursor = db.get_people_collection().find({"id": {"$type": "number"}}, PERSON_SNAPSHOT_PROJECTION).sort("id", 1)
+    for person in cursor:
+        ids.append(int(person['id']))
+        movie_count.append(len(person.get('characters') or []))
+
+    return {
+        "person_id": (ids, 'int64'),
+        "person_movie_count": (movie_count, 'int32'),
+        "person_by_movie_count": (array('i', sorted(range(len(ids)), key=lambda r: -movie_count[r])), 'int32'),
+    }
+
+
+def build(snapshot_dir=SNAPSHOT_DIR, keep=KEEP_VERSIONS):
+    """Write a new snapshot version from Mongo and make it current; returns its manifest."""
+    if not available():
+        raise RuntimeError("numpy is required to build catalog snapshots")
+    import numpy as np
+    # Read before the collections, so a change made during the build marks it stale
+    last_change = catalog_changes.latest_id(SNAPSHOT_COLLECTIONS)
+    genres = _Vocabulary()
+    columns = {**_movie_columns(genres), **_person_columns()}
+
+    version = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')
+    staging = os.path.join(snapshot_dir, f".{version}.tmp")
+    os.makedirs(staging)
+    for name, (values, dtype) in columns.items():
+        np.save(os.path.join(staging, f"{name}.npy"), np.frombuffer(values, dtype=dtype) if len(values) else np.zeros(0, dtype))
+    manifest = {
+        "format": FORMAT,
+        "version": version,
+        "created_at": datetime.utcnow().isoformat(),
+        "counts": {"movies": len(columns["movie_id"][0]), "people": len(columns["person_id"][0])},
+        "vocabularies": {"genres": genres.values},
+        "last_change_id": str(last_change) if last_change else None,
+        "columns": sorted(columns),
+    }
+    with open(os.path.join(staging, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    os.rename(staging, os.path.join(snapshot_dir, version))
+    pointer = os.path.join(snapshot_dir, '.CURRENT.tmp')
+    with open(pointer, 'w') as f:
+        f.write(version)
+    os.replace(pointer, os.path.join(snapshot_dir, 'CURRENT'))
+    _prune(snapshot_dir, keep, version)
+    return manifest
+
+
+def _prune(snapshot_dir, keep, current_version):
+    # Versions are timestamps, so name order is build order. Files still mapped
+    # by a running worker stay readable after removal.
+    versions = sorted(
+        name for name in os.listdir(snapshot_dir)
+        if not name.startswith('.') and os.path.isdir(os.path.join(snapshot_dir, name))
+    )
+    for name in versions[:-keep]:
+        if name != current_version:
+            shutil.rmtree(os.path.join(snapshot_dir, name), ignore_errors=True)
+
+
+# --- Load ---
+
+class Snapshot:
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, 'manifest.json')) as f:
+            self.manifest = json.load(f)
+        self.version = self.manifest['version']
+        self.vocabularies = self.manifest['vocabularies']
+        self._arrays = {}
+
+    def array(self, name):
+        column = self._arrays.get(name)
+        if column is None:
+            import numpy as np
+            column = np.load(os.path.join(self.path, f"{name}.npy"), mmap_mode='r')
+            self._arrays[name] = column
+        return column
+
+    def ragged(self, name, row):
+        indptr = self.array(f"{name}_indptr")
+        return self.array(name)[indptr[row]:indptr[row + 1]]
+
+    def string(self, name, row):
+        offsets = self.array(f"{name}_offsets")
+        return bytes(self.array(f"{name}_blob")[offsets[row]:offsets[row + 1]]).decode('utf-8')
+
+    def strings(self, name):
+        offsets = self.array(f"{name}_offsets")
+        blob = self.array(f"{name}_blob")
+        for row in range(len(offsets) - 1):
+            yield bytes(blob[offsets[row]:offsets[row + 1]]).decode('utf-8')
+
+
+def exists(snapshot_dir=SNAPSHOT_DIR):
+    return _read_pointer(snapshot_dir) is not None
+
+
+def _is_stale(snapshot):
+    # Changes expire oldest first, so only a newer one than the build saw counts
+    latest = catalog_changes.latest_id(SNAPSHOT_COLLECTIONS)
+    last_change = snapshot.manifest.get('last_change_id')
+    return latest is not None and (last_change is None or latest > ObjectId(last_change))
+
+
+@catalog_changes.subscribe
+def _on_catalog_change(collection, kind, ids):
+    # Rechecked on the next current() call
+    global _changed, _last_check
+    if collection in SNAPSHOT_COLLECTIONS:
+        _changed = True
+        _last_check = 0.0
+
+
+def on_swap(subscriber):
+    # subscriber(snapshot) runs whenever a new version becomes current
+    _swap_subscribers.append(subscriber)
+    return subscriber
+
+
+def _read_pointer(snapshot_dir):
+    try:
+        with open(os.path.join(snapshot_dir, 'CURRENT')) as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def load(snapshot_dir=None):
+    # Maps the current version (call before forking workers); returns None without a snapshot
+    global _current, _last_check, _snapshot_dir, _changed, _stale
+    if not available():
+        return None
+    with _lock:
+        snapshot_dir = _snapshot_dir = snapshot_dir or _snapshot_dir
+        _last_check = time.monotonic()
+        version = _read_pointer(snapshot_dir)
+        if version is None:
+            _current = None
+        elif _current is None or _current.version != version:
+            try:
+                snapshot = Snapshot(os.path.join(snapshot_dir, version))
+                if snapshot.manifest.get('format') != FORMAT:
+                    return _current
+            except Exception:
+                print(traceback.format_exc())
+                return _current
+            _current = snapshot
+            _changed = True
+            for subscriber in _swap_subscribers:
+                try:
+                    subscriber(snapshot)
+                except Exception:
+                    print(traceback.format_exc())
+        if _changed and _current is not None:
+            try:
+                _stale = _is_stale(_current)
+                _changed = False
+            except Exception:
+                print(traceback.format_exc())
+        return _current
+
+
+def current():
+    # The live snapshot, re-checking CURRENT at most every CHECK_INTERVAL seconds.
+    # None while the catalog has changed since it was built.
+    if time.monotonic() - _last_check >= CHECK_INTERVAL:
+        load()
+    return None if _stale else _current
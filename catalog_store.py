@@ -0,0 +1,70 @@
+import threading
+import catalog_snapshot
+
+# Compact read-only view of the catalog for hot paths, backed by the current
+# snapshot's memory-mapped columns, so there is one copy per host shared by
+# every worker instead of per-process dicts. Genres are interned as small ints.
+# The store is as fresh as the last `flask movies build-snapshot`.
+
+_lock = threading.Lock()
+_store = None
+
+
+class CatalogStore:
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.version = snapshot.version
+        self.movie_ids = snapshot.array('movie_id')
+        self.person_ids = snapshot.array('person_id')
+        self.genres = snapshot.vocabularies['genres']
+        self._genre_codes = {name: code for code, name in enumerate(self.genres)}
+
+    def genre_code(self, name):
+        return self._genre_codes.get(name)
+
+    def entry_rows(self, name):
+        # Row index of every entry of a ragged column, for vectorized per-row sums
+        return self.snapshot.array(f"{name}_rows")
+
+    def row_counts(self, name, values):
+        # Per-row number of entries of a ragged column that are in `values`
+        import numpy as np
+        column = self.snapshot.array(name)
+        hits = np.isin(column, np.asarray(list(values), dtype=column.dtype))
+        return np.bincount(self.entry_rows(name)[hits], minlength=len(self.movie_ids))
+
+    def titles(self):
+        # (movie id, title, original title) for every movie, in id order
+        for row, (title, original) in enumerate(zip(
+            self.snapshot.strings('movie_title'), self.snapshot.strings('movie_original_title')
+        )):
+            yield int(self.movie_ids[row]), title, original
+
+    def top_people(self, min_movies=1, limit=100):
+        # [(person id, movie count)] by filmography size
+        counts = self.snapshot.array('person_movie_count')
+        people = []
+        for row in self.snapshot.array('person_by_movie_count')[:limit]:
+            if counts[row] < min_movies:
+                break
+            people.append((int(self.person_ids[row]), int(counts[row])))
+        return people
+
+
+@catalog_snapshot.on_swap
+def _swap(snapshot):
+    global _store
+    with _lock:
+        _store = CatalogStore(snapshot)
+
+
+def get_store():
+    # None without a snapshot, callers fall back to querying Mongo
+    snapshot = catalog_snapshot.current()
+    if snapshot is None:
+        return None
+    store = _store
+    if store is None or store.version != snapshot.version:
+        _swap(snapshot)
+        store = _store
+    return store
@@ -0,0 +1,143 @@
+import os
+from flask import has_request_context, jsonify, request
+from pymongo import read_preferences
+from pymongo.errors import ExecutionTimeout, NetworkTimeout, ServerSelectionTimeoutError, WaitQueueTimeoutError
+
+# Connection pool, timeout and per-query budget settings for the Mongo clients.
+# `database` builds its MongoClient with client_options(), and queries on the
+# request path pass find_options()/aggregate_options() for their budget, so a
+# slow query or an exhausted pool fails fast instead of holding a worker.
+
+# --- Pool and timeouts ---
+MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', '50'))
+MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', '0'))
+MAX_IDLE_TIME_MS = int(os.environ.get('MONGO_MAX_IDLE_TIME_MS', '60000'))
+# How long a request waits for a free pooled connection
+WAIT_QUEUE_TIMEOUT_MS = int(os.environ.get('MONGO_WAIT_QUEUE_TIMEOUT_MS', '1000'))
+SERVER_SELECTION_TIMEOUT_MS = int(os.environ.get('MONGO_SERVER_SELECTION_TIMEOUT_MS', '5000'))
+CONNECT_TIMEOUT_MS = int(os.environ.get('MONGO_CONNECT_TIMEOUT_MS', '5000'))
+# Backstop only, queries are bounded by their maxTimeMS budget first
+SOCKET_TIMEOUT_MS = int(os.environ.get('MONGO_SOCKET_TIMEOUT_MS', '15000'))
+
+
+def client_options():
+    # Keyword arguments for MongoClient / AsyncIOMotorClient
+    return {
+        "maxPoolSize": MAX_POOL_SIZE,
+        "minPoolSize": MIN_POOL_SIZE,
+        "maxIdleTimeMS": MAX_IDLE_TIME_MS,
+        "waitQueueTimeoutMS": WAIT_QUEUE_TIMEOUT_MS,
+        "serverSelectionTimeoutMS": SERVER_SELECTION_TIMEOUT_MS,
+        "connectTimeoutMS": CONNECT_TIMEOUT_MS,
+        "socketTimeoutMS": SOCKET_TIMEOUT_MS
+    }
+
+
+# --- Per-query budgets ---
+DEFAULT_MAX_TIME_MS = int(os.environ.get('MONGO_DEFAULT_MAX_TIME_MS', '2000'))
+
+# name -> server-side time limit and cursor batch size. A batch size covering the
+# whole result saves getMore round trips; scans use large batches.
+# Each max_time_ms can be overridden with MONGO_MAX_TIME_MS_<NAME>, e.g.
+# MONGO_MAX_TIME_MS_LISTING_BY_GENRE=5000.
+QUERY_LIMITS = {
+    "listing": {"max_time_ms": 2000, "batch_size": 200},
+    "listing.by_genre": {"max_time_ms": 3000, "batch_size": 1000},
+    "detail": {"max_time_ms": 500},
+    "search": {"max_time_ms": 3000, "batch_size": 2000},
+    "people.popular": {"max_time_ms": 3000, "batch_size": 500},
+    "people.search": {"max_time_ms": 3000, "batch_size": 2000},
+    "recommendations.candidates": {"max_time_ms": 1000, "batch_size": 500},
+    "recommendations.content": {"max_time_ms": 1500, "batch_size": 1000},
+    "recommendations.co_liked": {"max_time_ms": 1000, "batch_size": 500},
+    "recommendations.profile": {"max_time_ms": 500, "batch_size": 200},
+    "cards": {"max_time_ms": 1000, "batch_size": 1000}
+}
+
+
+def query_limits(name):
+    limits = dict(QUERY_LIMITS.get(name, {}))
+    env_name = 'MONGO_MAX_TIME_MS_' + name.upper().replace('.', '_')
+    limits["max_time_ms"] = int(os.environ.get(env_name, limits.get("max_time_ms", DEFAULT_MAX_TIME_MS)))
+    return limits
+
+
+def find_options(name):
+    # Keyword arguments for find / find_one
+    limits = query_limits(name)
+    options = {"max_time_ms": limits["max_time_ms"]}
+    if limits.get("batch_size"):
+        options["batch_size"] = limits["batch_size"]
+    return options
+
+
+def aggregate_options(name):
+    # Keyword arguments for aggregate
+    limits = query_limits(name)
+    options = {"maxTimeMS": limits["max_time_ms"]}
+    if limits.get("batch_size"):
+        options["batchSize"] = limits["batch_size"]
+    return options
+
+
+# --- Read preference ---
+# Catalog and recommendation reads tolerate slight staleness, so they go to
+# secondaries when one is within MAX_STALENESS_S of the primary. User documents
+# (profiles, likes, watchlists) are read and written on the primary, which is
+# the client default, so a user always sees their own writes.
+CATALOG_READ_MODE = os.environ.get('MONGO_CATALOG_READ_PREFERENCE', 'secondaryPreferred')
+# The server rejects anything below 90 seconds
+MAX_STALENESS_S = max(90, int(os.environ.get('MONGO_MAX_STALENESS_S', '90')))
+
+# Flask endpoint -> read mode for that route's catalog reads, e.g. to keep a
+# route that must see fresh ingests on the primary. Extended from
+# MONGO_READ_PREFERENCE_ROUTES="movies.get_movie_details=primary,people.search_people=nearest".
+ROUTE_READ_MODES = {}
+for _override in filter(None, os.environ.get('MONGO_READ_PREFERENCE_ROUTES', '').split(',')):
+    _endpoint, _, _mode = _override.partition('=')
+    ROUTE_READ_MODES[_endpoint.strip()] = _mode.strip()
+
+_READ_MODES = {
+    "primary": read_preferences.Primary,
+    "primaryPreferred": read_preferences.PrimaryPreferred,
+    "secondary": read_preferences.Secondary,
+    "secondaryPreferred": read_preferences.SecondaryPreferred,
+    "nearest": read_preferences.Nearest
+}
+
+
+def read_preference(mode):
+    if mode not in _READ_MODES:
+        raise ValueError(f"Unknown read preference: {mode}")
+    if mode == 'primary':
+        return read_preferences.Primary()
+    return _READ_MODES[mode](max_staleness=MAX_STALENESS_S)
+
+
+# Fail at startup rather than on the first query
+for _mode in [CATALOG_READ_MODE, *ROUTE_READ_MODES.values()]:
+    read_preference(_mode)
+
+
+def catalog_read_mode(endpoint=None):
+    # Also resolved inside pipeline workers, which run in a copy of the request context.
+    # Async views pass the endpoint of their Flask counterpart.
+    if endpoint is None and has_request_context():
+        endpoint = request.endpoint
+    return ROUTE_READ_MODES.get(endpoint, CATALOG_READ_MODE)
+
+
+def catalog_reads(collection, endpoint=None):
+    # The collection with the read preference for catalog and recommendation reads
+    return collection.with_options(read_preference=read_preference(catalog_read_mode(endpoint)))
+
+
+# --- Overload ---
+# A query over its budget, no free pooled connection in time, or no reachable server
+OVERLOAD_ERRORS = (ExecutionTimeout, WaitQueueTimeoutError, ServerSelectionTimeoutError, NetworkTimeout)
+RETRY_AFTER_S = int(os.environ.get('MONGO_OVERLOAD_RETRY_AFTER_S', '1'))
+OVERLOADED_ERROR = {"error": "Service is busy, please retry"}
+
+
+def overloaded():
+    return jsonify(OVERLOADED_ERROR), 503, {"Retry-After": str(RETRY_AFTER_S)}
@@ -0,0 +1,85 @@
+import threading
+from array import array
+from bisect import bisect_left
+from cache import LRUCache
+from user_cache import USER_TTL, get_user, on_invalidate
+
+# Per-user dislikes, kept as sorted int arrays (8 bytes per id, O(log n) membership).
+# Entries are (user document, DislikeSet) and only count while that document is
+# still the cached user, so dislikes written by another worker show up as soon
+# as user_cache reloads the user.
+_dislikes = LRUCache('dislikes', maxsize=20000, ttl=USER_TTL)
+_lock = threading.Lock()
+
+# How many extra candidates to fetch so in-process exclusion still fills a page
+OVERSAMPLE_FACTOR = 2
+
+
+class DislikeSet:
+    __slots__ = ('_ids',)
+
+    def __init__(self, ids=()):
+        self._ids = array('q', sorted({int(i) for i in ids}))
+
+    def __contains__(self, movie_id):
+        i = bisect_left(self._ids, movie_id)
+        return i < len(self._ids) and self._ids[i] == movie_id
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def add(self, movie_id):
+        i = bisect_left(self._ids, movie_id)
+        if i == len(self._ids) or self._ids[i] != movie_id:
+            self._ids.insert(i, movie_id)
+
+    def discard(self, movie_id):
+        i = bisect_left(self._ids, movie_id)
+        if i < len(self._ids) and self._ids[i] == movie_id:
+            del self._ids[i]
+
+
+EMPTY = DislikeSet()
+
+
+def get_disliked_ids(user_id):
+    if not user_id:
+        return EMPTY
+    user = get_user(user_id)
+    if not user:
+        return EMPTY
+    entry = _dislikes.get(str(user_id))
+    if entry is not None and entry[0] is user:
+        return entry[1]
+    disliked = DislikeSet(user.get('disliked_movies', []))
+    _dislikes.set(str(user_id), (user, disliked))
+    return disliked
+
+
+def record_dislike(user_id, movie_id):
+    entry = _dislikes.get(str(user_id))
+    if entry is not None:
+        with _lock:
+            entry[1].add(movie_id)
+
+
+def record_undislike(user_id, movie_id):
+    entry = _dislikes.get(str(user_id))
+    if entry is not None:
+        with _lock:
+            entry[1].discard(movie_id)
+
+
+@on_invalidate
+def invalidate_dislikes(user_id):
+    _dislikes.delete(str(user_id))
+
+
+def exclude_disliked(movies, disliked, limit=None):
+    # In-process replacement for a {"id": {"$nin": [...]}} filter
+    if disliked:
+        movies = [m for m in movies if m['id'] not in disliked]
+    return movies[:limit] if limit is not None else movies
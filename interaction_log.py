@@ -0,0 +1,103 @@
+from datetime import datetime, timedelta
+from bson import ObjectId
+from database import db
+
+# Append-only log of interaction events, partitioned by month
+# (interaction_log_YYYYMM). Documents are never updated; consumers read
+# them in _id order and keep their position in interaction_log_checkpoints.
+
+PARTITION_PREFIX = 'interaction_log_'
+CHECKPOINTS = 'interaction_log_checkpoints'
+
+# ObjectIds from different processes are only ordered to the second, so readers
+# stay this far behind "now" to avoid skipping late inserts
+READ_LAG = timedelta(seconds=5)
+
+
+def _database():
+    return db.get_users_collection().database
+
+
+def _partition_name(when):
+    return f"{PARTITION_PREFIX}{when:%Y%m}"
+
+
+def _next_month(when):
+    return datetime(when.year + (when.month == 12), when.month % 12 + 1, 1)
+
+
+def append(user_id, events):
+    if not events:
+        return
+    now = datetime.utcnow()
+    _database()[_partition_name(now)].insert_many([
+        {
+            "user_id": str(user_id),
+            "type": event['type'],
+            "movie_id": event.get('movie_id'),
+            "profile_idx": event.get('profile_idx'),
+            "ts": event.get('ts') or now
+        }
+        for event in events
+    ], ordered=True)
+
+
+def read_since(after_id=None, batch_size=1000):
+    # Yields events with _id > after_id, oldest first, across monthly partitions
+    upper = ObjectId.from_datetime(datetime.utcnow() - READ_LAG)
+    database = _database()
+    if after_id is not None:
+        month = after_id.generation_time.replace(tzinfo=None)
+    else:
+        partitions = sorted(
+            name for name in database.list_collection_names() if name.startswith(PARTITION_PREFIX)
+        )
+        if not partitions:
+            return
+        month = datetime.strptime(partitions[0][len(PARTITION_PREFIX):], '%Y%m')
+    month = datetime(month.year, month.month, 1)
+    while month <= datetime.utcnow():
+        id_filter = {"$lt": upper}
+        if after_id is not None:
+            id_filter["$gt"] = after_id
+        cursor = database[_partition_name(month)].find(
+            {"_id": id_filter}
+        ).sort("_id", 1).batch_size(batch_size)
+        for event in cursor:
+            yield event
+        month = _next_month(month)
+
+
+def load_checkpoint(consumer):
+    checkpoint = _database()[CHECKPOINTS].find_one({"_id": consumer})
+    last_id = checkpoint.get('last_id') if checkpoint else None
+    # Checkpoints written by older exports hold the id as a string
+    return ObjectId(last_id) if last_id is not None else None
+
+
+def save_checkpoint(consumer, last_id):
+    _database()[CHECKPOINTS].update_one(
+        {"_id": consumer},
+        {"$set": {"last_id": last_id, "updated_at": datetime.utcnow()}},
+        upsert=True
+    )
+
+
+def stream(consumer, handler, batch_size=1000):
+    # Feeds new events to handler(batch) and checkpoints after every batch,
+    # so a crashed job resumes from the last completed batch
+    last_id = load_checkpoint(consumer)
+    batch = []
+    processed = 0
+    for event in read_since(last_id, batch_size):
+        batch.append(event)
+        if len(batch) >= batch_size:
+            handler(batch)
+            save_checkpoint(consumer, batch[-1]['_id'])
+            processed += len(batch)
+            batch = []
+    if batch:
+        handler(batch)
+        save_checkpoint(consumer, batch[-1]['_id'])
+        processed += len(batch)
+    return processed
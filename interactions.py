@@ -0,0 +1,133 @@
+import os
+import threading
+import time
+import traceback
+from datetime import datetime
+from bson import ObjectId
+import profile_mutations
+import interaction_log
+from user_cache import has_profile
+
+# Interaction events (likes, dislikes, watchlist toggles) are applied to the user
+# document and appended to the interaction log. Subscribers, e.g. the
+# recommendation caches, are fed from the log by poll(), so every worker process
+# sees every worker's events.
+# An event is a dict: {"type", "movie_id", "profile_idx" (watchlist only), "ts"}
+# A subscriber is called as subscriber(user_id, events).
+
+EVENT_TYPES = {"like", "unlike", "dislike", "watchlist_add", "watchlist_remove"}
+POLL_INTERVAL = float(os.environ.get('INTERACTION_POLL_S', '5'))
+
+_subscribers = []
+_poll_lock = threading.Lock()
+_last_poll = 0.0
+_last_seen_id = None
+
+
+def subscribe(subscriber):
+    _subscribers.append(subscriber)
+    return subscriber
+
+
+def _notify(user_id, events):
+    for subscriber in _subscribers:
+        try:
+            subscriber(user_id, events)
+        except Exception:
+            print(traceback.format_exc())
+
+
+def publish(user_id, events):
+    try:
+        interaction_log.append(user_id, events)
+    except Exception:
+        print(traceback.format_exc())
+
+
+def poll():
+    # Feeds events logged since the last poll to subscribers, consecutive events
+    # of one user together. The first poll only records the current position.
+    global _last_seen_id
+    if _last_seen_id is None:
+        _last_seen_id = ObjectId.from_datetime(datetime.utcnow() - interaction_log.READ_LAG)
+        return 0
+    count = 0
+    user_id, batch = None, []
+    for event in interaction_log.read_since(_last_seen_id):
+        if batch and event['user_id'] != user_id:
+            _notify(user_id, batch)
+            batch = []
+        user_id = event['user_id']
+        batch.append(event)
+        _last_seen_id = event['_id']
+        count += 1
+    if batch:
+        _notify(user_id, batch)
+    return count
+
+
+def _maybe_poll():
+    global _last_poll
+    now = time.monotonic()
+    if now - _last_poll < POLL_INTERVAL or not _poll_lock.acquire(blocking=False):
+        return
+    try:
+        _last_poll = now
+        poll()
+    except Exception:
+        print(traceback.format_exc())
+    finally:
+        _poll_lock.release()
+
+
+def init_app(app):
+    # Checks the interaction log at most every POLL_INTERVAL seconds, on whichever request comes first
+    app.before_request(_maybe_poll)
+
+
+def normalize_events(events):
+    if not isinstance(events, list) or not events:
+        raise ValueError("events must be a non-empty array")
+    received_at = datetime.utcnow()
+    normalized = []
+    for event in events:
+        if not isinstance(event, dict) or event.get('type') not in EVENT_TYPES:
+            raise ValueError(f"Unknown event type: {event.get('type') if isinstance(event, dict) else event}")
+        normalized.append({
+            "type": event['type'],
+            "movie_id": event.get('movie_id'),
+            "profile_idx": event.get('profile_idx'),
+            "ts": received_at
+        })
+    return normalized
+
+
+def _op_matched(user_id, op):
+    # Called once some op matched, so the user exists; profile-indexed ops
+    # only match when that profile does
+    needs_profile = profile_mutations.BULK_OPERATIONS[op['op']][1]
+    return not needs_profile or has_profile(user_id, op['profile_idx'])
+
+
+def ingest(user_id, events):
+    # One bulk_write for the whole batch, then fan out the events whose write
+    # matched, so ops on a missing user or profile never reach the log
+    events = normalize_events(events)
+    ops = [
+        {"op": e['type'], "movie_id": e['movie_id'], "profile_idx": e['profile_idx']}
+        for e in events
+    ]
+    matched, modified = profile_mutations.apply_bulk_ops(user_id, ops)
+    if matched:
+        publish(user_id, [event for event, op in zip(events, ops) if _op_matched(user_id, op)])
+    return len(events), matched, modified
+
+
+def record(user_id, event_type, movie_id, profile_idx=None):
+    # Publishes a single event for routes that already performed the write
+    publish(user_id, [{
+        "type": event_type,
+        "movie_id": movie_id,
+        "profile_idx": profile_idx,
+        "ts": datetime.utcnow()
+    }])
@@ -0,0 +1,292 @@
+import contextvars
+import os
+import threading
+import time
+from flask import Blueprint, Response, g, request
+from pymongo import monitoring
+from cache import CACHES
+import db_settings
+import password_hashing
+
+# Per-route latency, per-request Mongo command accounting and cache hit ratios,
+# exposed in Prometheus text format on /metrics.
+#
+# The command and pool listeners are registered globally, so this module must be
+# imported before the MongoClient in `database` is created.
+
+SLOW_REQUEST_MS = float(os.environ.get('SLOW_REQUEST_MS', '500'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+metrics_routes = Blueprint('metrics', __name__)
+
+_lock = threading.Lock()
+_request_stats = contextvars.ContextVar('request_stats', default=None)
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.sum += value
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+
+
+# (endpoint, method, status) -> Histogram of request seconds
+route_latency = {}
+# (endpoint, command) -> Histogram of Mongo command seconds, issued while serving endpoint
+mongo_latency = {}
+# (endpoint, command) -> documents returned
+mongo_documents = {}
+mongo_failures = {}
+# (endpoint, server address) -> commands, shows where read preferences sent each route's reads
+mongo_servers = {}
+
+
+def _current_endpoint():
+    stats = _request_stats.get()
+    return stats["endpoint"] if stats else "background"
+
+
+def record_stage(name, elapsed_ms):
+    # Lets request code (e.g. recommendation pipelines) add stages to the slow-request breakdown
+    stats = _request_stats.get()
+    if stats is not None:
+        with _lock:
+            stats["stages"][name] = round(stats["stages"].get(name, 0) + elapsed_ms, 2)
+
+
+def _returned_documents(reply):
+    cursor = reply.get('cursor')
+    if isinstance(cursor, dict):
+        return len(cursor.get('firstBatch', cursor.get('nextBatch', [])))
+    return reply.get('n', 0) if isinstance(reply.get('n'), int) else 0
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self._record(event, _returned_documents(event.reply))
+
+    def failed(self, event):
+        key = (_current_endpoint(), event.command_name)
+        with _lock:
+            mongo_failures[key] = mongo_failures.get(key, 0) + 1
+        self._record(event, 0)
+
+    def _record(self, event, documents):
+        seconds = event.duration_micros / 1e6
+        key = (_current_endpoint(), event.command_name)
+        server_key = (key[0], _address(event.connection_id))
+        with _lock:
+            mongo_latency.setdefault(key, Histogram()).observe(seconds)
+            mongo_documents[key] = mongo_documents.get(key, 0) + documents
+            mongo_servers[server_key] = mongo_servers.get(server_key, 0) + 1
+            stats = _request_stats.get()
+            if stats is not None:
+                stats["mongo_commands"] += 1
+                stats["mongo_ms"] += seconds * 1000
+                stats["documents"] += documents
+
+
+monitoring.register(MongoCommandMetrics())
+
+
+# server address -> connection pool state
+pool_stats = {}
+# Histogram of seconds spent waiting for a pooled connection
+pool_wait = Histogram()
+
+
+def _address(address):
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else str(address)
+
+
+def _pool(address):
+    return pool_stats.setdefault(_address(address), {
+        "open": 0, "checked_out": 0, "waiting": 0, "checkout_failures": {}, "cleared": 0
+    })
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    # Checked-out connections against maxPoolSize, callers queued for one, and
+    # check-outs that gave up (e.g. after waitQueueTimeoutMS)
+    def pool_created(self, event):
+        with _lock:
+            _pool(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with _lock:
+            _pool(event.address)["cleared"] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with _lock:
+            _pool(event.address)["open"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with _lock:
+            _pool(event.address)["open"] -= 1
+
+    def connection_check_out_started(self, event):
+        with _lock:
+            _pool(event.address)["waiting"] += 1
+
+    def connection_check_out_failed(self, event):
+        with _lock:
+            pool = _pool(event.address)
+            pool["waiting"] -= 1
+            reason = str(event.reason)
+            pool["checkout_failures"][reason] = pool["checkout_failures"].get(reason, 0) + 1
+            if getattr(event, 'duration', None) is not None:
+                pool_wait.observe(event.duration)
+
+    def connection_checked_out(self, event):
+        with _lock:
+            pool = _pool(event.address)
+            pool["waiting"] -= 1
+            pool["checked_out"] += 1
+            if getattr(event, 'duration', None) is not None:
+                pool_wait.observe(event.duration)
+
+    def connection_checked_in(self, event):
+        with _lock:
+            _pool(event.address)["checked_out"] -= 1
+
+
+monitoring.register(MongoPoolMetrics())
+
+
+def _before_request():
+    g._metrics_start = time.perf_counter()
+    _request_stats.set({
+        "endpoint": request.endpoint or "unmatched",
+        "mongo_commands": 0,
+        "mongo_ms": 0.0,
+        "documents": 0,
+        "stages": {}
+    })
+
+
+def _after_request(response):
+    start = getattr(g, '_metrics_start', None)
+    stats = _request_stats.get()
+    if start is None or stats is None:
+        return response
+    elapsed = time.perf_counter() - start
+    key = (stats["endpoint"], request.method, response.status_code)
+    with _lock:
+        route_latency.setdefault(key, Histogram()).observe(elapsed)
+    if elapsed * 1000 >= SLOW_REQUEST_MS:
+        print(
+            f"[slow request] {request.method} {request.path} {response.status_code} "
+            f"{elapsed * 1000:.1f}ms mongo={stats['mongo_commands']} cmds/{stats['mongo_ms']:.1f}ms "
+            f"docs={stats['documents']} stages={stats['stages']}"
+        )
+    return response
+
+
+def init_app(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.register_blueprint(metrics_routes)
+
+
+def _labels(**labels):
+    return ",".join(f'{name}="{value}"' for name, value in labels.items())
+
+
+def _histogram_lines(name, histogram, labels):
+    lines = []
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {count}')
+    lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f'{name}_sum{{{labels}}} {histogram.sum:.6f}')
+    lines.append(f'{name}_count{{{labels}}} {histogram.count}')
+    return lines
+
+
+def render():
+    lines = []
+    with _lock:
+        lines.append("# TYPE cinescope_request_seconds histogram")
+        for (endpoint, method, status), histogram in sorted(route_latency.items()):
+            lines += _histogram_lines(
+                "cinescope_request_seconds", histogram,
+                _labels(endpoint=endpoint, method=method, status=status)
+            )
+        lines.append("# TYPE cinescope_mongo_command_seconds histogram")
+        for (endpoint, command), histogram in sorted(mongo_latency.items()):
+            lines += _histogram_lines(
+                "cinescope_mongo_command_seconds", histogram,
+                _labels(endpoint=endpoint, command=command)
+            )
+        lines.append("# TYPE cinescope_mongo_documents_returned_total counter")
+        for (endpoint, command), documents in sorted(mongo_documents.items()):
+            lines.append(f'cinescope_mongo_documents_returned_total{{{_labels(endpoint=endpoint, command=command)}}} {documents}')
+        lines.append("# TYPE cinescope_mongo_command_failures_total counter")
+        for (endpoint, command), failures in sorted(mongo_failures.items()):
+            lines.append(f'cinescope_mongo_command_failures_total{{{_labels(endpoint=endpoint, command=command)}}} {failures}')
+        lines.append("# TYPE cinescope_mongo_commands_by_server_total counter")
+        for (endpoint, server), commands in sorted(mongo_servers.items()):
+            lines.append(f'cinescope_mongo_commands_by_server_total{{{_labels(endpoint=endpoint, server=server)}}} {commands}')
+        lines.append("# TYPE cinescope_mongo_pool_checked_out gauge")
+        for address, pool in sorted(pool_stats.items()):
+            labels = _labels(address=address)
+            lines.append(f'cinescope_mongo_pool_max_size{{{labels}}} {db_settings.MAX_POOL_SIZE}')
+            lines.append(f'cinescope_mongo_pool_open{{{labels}}} {pool["open"]}')
+            lines.append(f'cinescope_mongo_pool_checked_out{{{labels}}} {pool["checked_out"]}')
+            lines.append(f'cinescope_mongo_pool_saturation{{{labels}}} {pool["checked_out"] / db_settings.MAX_POOL_SIZE:.4f}')
+            lines.append(f'cinescope_mongo_pool_waiting{{{labels}}} {pool["waiting"]}')
+            lines.append(f'cinescope_mongo_pool_cleared_total{{{labels}}} {pool["cleared"]}')
+            for reason, count in sorted(pool["checkout_failures"].items()):
+                lines.append(f'cinescope_mongo_pool_checkout_failures_total{{{_labels(address=address, reason=reason)}}} {count}')
+        lines.append("# TYPE cinescope_mongo_pool_wait_seconds histogram")
+        lines += _histogram_lines("cinescope_mongo_pool_wait_seconds", pool_wait, _labels(pool="all"))
+
+    # Imported here: the pipeline module reports stages through this one
+    import rec_pipeline
+    lines.append("# TYPE cinescope_pipeline_stage_ms_total counter")
+    for pipeline, stages in sorted(rec_pipeline.stage_stats_snapshot().items()):
+        for stage, stats in sorted(stages.items()):
+            labels = _labels(pipeline=pipeline, stage=stage)
+            lines.append(f'cinescope_pipeline_stage_ms_total{{{labels}}} {stats["total_ms"]:.2f}')
+            lines.append(f'cinescope_pipeline_stage_runs_total{{{labels}}} {stats["count"]}')
+            lines.append(f'cinescope_pipeline_stage_over_budget_total{{{labels}}} {stats["over_budget"]}')
+            lines.append(f'cinescope_pipeline_stage_dropped_total{{{labels}}} {stats["dropped"]}')
+
+    lines.append("# TYPE cinescope_password_hash_queue_depth gauge")
+    lines.append(f'cinescope_password_hash_queue_depth {password_hashing.stats["queue_depth"]}')
+    lines.append(f'cinescope_password_hash_rejected_total {password_hashing.stats["rejected"]}')
+
+    lines.append("# TYPE cinescope_cache_hit_ratio gauge")
+    for name, cache in sorted(CACHES.items()):
+        stats = cache.stats()
+        lines.append(f'cinescope_cache_hit_ratio{{cache="{name}"}} {stats["hit_ratio"]:.4f}')
+        lines.append(f'cinescope_cache_hits_total{{cache="{name}"}} {stats["hits"]}')
+        lines.append(f'cinescope_cache_misses_total{{cache="{name}"}} {stats["misses"]}')
+        lines.append(f'cinescope_cache_stale_hits_total{{cache="{name}"}} {stats["stale_hits"]}')
+        lines.append(f'cinescope_cache_coalesced_total{{cache="{name}"}} {stats["coalesced"]}')
+        lines.append(f'cinescope_cache_entries{{cache="{name}"}} {stats["size"]}')
+    return "\n".join(lines) + "\n"
+
+
+@metrics_routes.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,120 @@
+from database import db
+from db_settings import catalog_reads, find_options
+from cache import LRUCache
+from rec_pipeline import MOVIE_CARD_FIELDS, MOVIE_CARD_PROJECTION
+import catalog_changes
+import serialization
+
+# Field sets a client can ask for with ?fields=<name>
+FIELD_SETS = {
+    "card": ["id", "title", "poster_path", "release_year", "vote_average"],
+    "listing": ["id", "title", "poster_path", "release_year", "vote_average", "vote_count", "backdrop_path"],
+    "rec": MOVIE_CARD_FIELDS,
+}
+DEFAULT_FIELD_SET = "card"
+
+# One entry per movie id holding the widest card; narrower sets are sliced from it
+_cards = LRUCache('movie_cards', maxsize=20000)
+
+# Serialized cards: (movie id, version, field set name) -> (bytes, has poster).
+# A catalog change bumps the movie's version, so older fragments are never
+# served again and age out of the LRU.
+_fragments = LRUCache('card_fragments', maxsize=60000)
+_versions = {}
+
+
+def field_set_name(name, default=DEFAULT_FIELD_SET):
+    return name if name in FIELD_SETS else default
+
+
+def field_set(name, default=DEFAULT_FIELD_SET):
+    return FIELD_SETS[field_set_name(name, default)]
+
+
+def project(movie, fields):
+    return {field: movie[field] for field in fields if field in movie}
+
+
+def prime(movies):
+    # Stores cards for documents another query already fetched with MOVIE_CARD_PROJECTION
+    for movie in movies:
+        if 'id' in movie:
+            _cards.set(movie['id'], project(movie, MOVIE_CARD_FIELDS))
+
+
+def invalidate(movie_ids):
+    for movie_id in movie_ids:
+        _cards.delete(movie_id)
+        _versions[movie_id] = _versions.get(movie_id, 0) + 1
+
+
+@catalog_changes.subscribe
+def _on_catalog_change(collection, kind, ids):
+    if collection == 'movies':
+        invalidate(ids)
+
+
+def get_cards(movie_ids):
+    # {id: widest card} for the given ids, fetching all cache misses with one $in
+    cards = {}
+    missing = []
+    for movie_id in movie_ids:
+        card = _cards.get(movie_id)
+        if card is None:
+            missing.append(movie_id)
+        else:
+            cards[movie_id] = card
+    if missing:
+        cursor = catalog_reads(db.get_movies_collection()).find(
+            {"id": {"$in": missing}}, MOVIE_CARD_PROJECTION, **find_options('cards')
+        )
+        for movie in cursor:
+            card = project(movie, MOVIE_CARD_FIELDS)
+            _cards.set(movie['id'], card)
+            cards[movie['id']] = card
+    return cards
+
+
+def hydrate(movie_ids, fields=None, require_poster=False):
+    # Cards in the order of movie_ids; unknown ids are skipped
+    fields = fields or field_set(None)
+    cards = get_cards(movie_ids)
+    results = []
+    for movie_id in movie_ids:
+        card = cards.get(movie_id)
+        if card is None or (require_poster and 'poster_path' not in card):
+            continue
+        results.append(project(card, fields))
+    return results
+
+
+def fragment_map(movie_ids, name):
+    # {id: (serialized card of field set `name`, has poster)}, building misses from get_cards
+    keys = {movie_id: (movie_id, _versions.get(movie_id, 0), name) for movie_id in movie_ids}
+    found = {}
+    missing = []
+    for movie_id, key in keys.items():
+        entry = _fragments.get(key)
+        if entry is None:
+            missing.append(movie_id)
+        else:
+            found[movie_id] = entry
+    if missing:
+        fields = FIELD_SETS[name]
+        for movie_id, card in get_cards(missing).items():
+            entry = (serialization.dumps(project(card, fields)), 'poster_path' in card)
+            _fragments.set(keys[movie_id], entry)
+            found[movie_id] = entry
+    return found
+
+
+def fragments(movie_ids, name, require_poster=False):
+    # Like hydrate, as serialized cards for serialization.list_body
+    found = fragment_map(movie_ids, name)
+    results = []
+    for movie_id in movie_ids:
+        entry = found.get(movie_id)
+        if entry is None or (require_poster and not entry[1]):
+            continue
+        results.append(entry[0])
+    return results
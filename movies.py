@@ -1,35 +1,125 @@
 from flask import Blueprint, jsonify, request
 from database import db
-from fuzzywuzzy import fuzz
 from datetime import datetime
+import click
+import os
+import catalog_changes
+import catalog_ingest
+import catalog_snapshot
+from cache import LRUCache
+from catalog_store import get_store
+from db_settings import OVERLOAD_ERRORS, aggregate_options, catalog_reads, find_options, overloaded
+from serialization import dumps, raw_response
 
 movie_routes = Blueprint('movies', __name__)
 
+CAST_PROJECTION = {"_id": 0, "id": 1, "name": 1, "profile_path": 1, "characters": 1}
+CREW_PROJECTION = {"_id": 0, "id": 1, "name": 1, "profile_path": 1}
+SEARCH_PROJECTION = {
+    "_id": 0, "id": 1, "title": 1, "original_title": 1, "poster_path": 1, "release_year": 1, "vote_average": 1
+}
+
+# URL slug -> genre name stored on movies
+GENRE_MAPPING = {
+    'action': 'Action',
+    'adventure': 'Adventure',
+    'animation': 'Animation',
+    'comedy': 'Comedy',
+    'crime': 'Crime',
+    'documentary': 'Documentary',
+    'drama': 'Drama',
+    'family': 'Family',
+    'fantasy': 'Fantasy',
+    'history': 'History',
+    'horror': 'Horror',
+    'music': 'Music',
+    'mystery': 'Mystery',
+    'romance': 'Romance',
+    'scifi': 'Science Fiction',
+    'thriller': 'Thriller',
+    'war': 'War',
+    'western': 'Western'
+}
+
+# Serialized listing responses, shared across requests. Past LISTING_TTL an entry is
+# still served for LISTING_STALE_TTL seconds while one background query refreshes it.
+LISTING_TTL = float(os.environ.get('LISTING_CACHE_TTL_S', '60'))
+LISTING_STALE_TTL = float(os.environ.get('LISTING_CACHE_STALE_TTL_S', '300'))
+_listings = LRUCache('movie_listings', maxsize=512, ttl=LISTING_TTL, stale_ttl=LISTING_STALE_TTL)
+
+
+@catalog_changes.subscribe
+def _on_catalog_change(collection, kind, ids):
+    if collection == 'movies':
+        _listings.clear()
+
+
+def cast_entry(person, movie_title):
+    character = next(
+        (c['name'] for c in person.get('characters', [])
+        if c['movie'] == movie_title),
+        'Unknown'
+    )
+    return {
+        "id": person['id'],
+        "name": person['name'],
+        "profile_path": person['profile_path'],
+        "character": character
+    }
+
+
+@movie_routes.cli.command('ingest')
+@click.option('--movies', 'movies_path', type=click.Path(exists=True, dir_okay=False), help="movies.json (array or JSON lines)")
+@click.option('--people', 'people_path', type=click.Path(exists=True, dir_okay=False), help="people.json (array or JSON lines)")
+@click.option('--batch-size', default=catalog_ingest.BATCH_SIZE, show_default=True)
+@click.option('--workers', default=catalog_ingest.WORKERS, show_default=True)
+@click.option('--delete-missing', is_flag=True, help="remove documents missing from the file (complete dumps only)")
+@click.option('--snapshot/--no-snapshot', 'rebuild_snapshot', default=True, show_default=True,
+              help="rebuild the catalog snapshot afterwards, if one exists")
+def ingest_catalog(movies_path, people_path, batch_size, workers, delete_missing, rebuild_snapshot):
+    """Sync movies and people with TMDB-style JSON dumps, writing only changed documents."""
+    def progress(collection, stats):
+        rate = stats["read"] / stats["elapsed_s"] if stats["elapsed_s"] else 0
+        click.echo(
+            f"\r{collection}: {stats['read']} read, {stats['inserted']} inserted, "
+            f"{stats['updated']} updated, {stats['unchanged']} unchanged, {stats['invalid']} invalid "
+            f"({rate:.0f} docs/s)",
+            nl=False
+        )
+
+    changed = False
+    for collection, path in (("movies", movies_path), ("people", people_path)):
+        if not path:
+            continue
+        stats = catalog_ingest.ingest(
+            collection, path, batch_size=batch_size, workers=workers, progress=progress, delete=delete_missing
+        )
+        click.echo(f"\n{collection}: {stats['deleted']} deleted, done in {stats['elapsed_s']}s")
+        changed = changed or stats['inserted'] or stats['updated'] or stats['deleted']
+
+    # Workers stop serving a snapshot older than the change, until this one is current
+    if changed and rebuild_snapshot and catalog_snapshot.exists():
+        manifest = catalog_snapshot.build()
+        click.echo(f"Snapshot {manifest['version']} built")
+
+
+@movie_routes.cli.command('build-snapshot')
+@click.option('--dir', 'snapshot_dir', default=catalog_snapshot.SNAPSHOT_DIR, show_default=True)
+@click.option('--keep', default=catalog_snapshot.KEEP_VERSIONS, show_default=True, help="versions to keep on disk")
+def build_snapshot(snapshot_dir, keep):
+    """Write a new columnar catalog snapshot and make it current."""
+    manifest = catalog_snapshot.build(snapshot_dir, keep)
+    click.echo(
+        f"Snapshot {manifest['version']}: {manifest['counts']['movies']} movies, "
+        f"{manifest['counts']['people']} people"
+    )
+
+
 @movie_routes.route('/by-genre/<genre>', methods=['GET'])
 def get_movies_by_genre(genre):
-    movies_collection = db.get_movies_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
     try:
-        genre_mapping = {
-            'action': 'Action',
-            'adventure': 'Adventure',
-            'animation': 'Animation',
-            'comedy': 'Comedy',
-            'crime': 'Crime',
-            'documentary': 'Documentary',
-            'drama': 'Drama',
-            'family': 'Family',
-            'fantasy': 'Fantasy',
-            'history': 'History',
-            'horror': 'Horror',
-            'music': 'Music',
-            'mystery': 'Mystery',
-            'romance': 'Romance',
-            'scifi': 'Science Fiction',
-            'thriller': 'Thriller',
-            'war': 'War',
-            'western': 'Western'
-        }
-        normalized_genre = genre_mapping.get(genre.lower(), genre)
+        normalized_genre = GENRE_MAPPING.get(genre.lower(), genre)
         pipeline = [
             {
                 "$match": {
@@ -76,18 +166,20 @@ def get_movies_by_genre(genre):
                 }
             }
         ]
-        movies = list(movies_collection.aggregate(pipeline))
-        if not movies:
+        body = _listings.get_or_compute(('by-genre', normalized_genre), lambda: dumps(list(movies_collection.aggregate(pipeline, **aggregate_options('listing.by_genre')))))
+        if body == b"[]":
             return jsonify({"error": f"No {normalized_genre} movies found"}), 404
-        return jsonify(movies)
+        return raw_response(body)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @movie_routes.route('/popular', methods=['GET'])
 def get_popular_movies():
-    movies_collection = db.get_movies_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
     try:
-        movies = list(movies_collection.find(
+        body = _listings.get_or_compute(('popular',), lambda: dumps(list(movies_collection.find(
             {
                 "vote_count": {"$gt": 75},
                 "release_year": {"$regex": "^(200|201|202)"},
@@ -104,11 +196,14 @@ def get_popular_movies():
                 "vote_average": 1,
                 "vote_count": 1,
                 "backdrop_path": 1
-            }
-        ).sort("vote_count", -1).limit(150))
-        if not movies:
+            },
+            **find_options('listing')
+        ).sort("vote_count", -1).limit(150))))
+        if body == b"[]":
             return jsonify({"error": "No popular movies found"}), 404
-        return jsonify(movies)
+        return raw_response(body)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -118,9 +213,9 @@ def get_movies_by_genre_language():
     language = request.args.get('language')
     if not genre or not language:
         return jsonify({"error": "Genre and language required"}), 400
-    movies_collection = db.get_movies_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
     try:
-        movies = list(movies_collection.find(
+        body = _listings.get_or_compute(('by-genre-language', genre, language.lower()), lambda: dumps(list(movies_collection.find(
             {
                 "genres": genre,
                 "language": {"$regex": f"^{language}$", "$options": "i"},
@@ -138,19 +233,22 @@ def get_movies_by_genre_language():
                 "vote_count": 1,
                 "backdrop_path": 1,
                 "language": 1
-            }
-        ).sort("vote_count", -1).limit(100))
-        return jsonify(movies)
+            },
+            **find_options('listing')
+        ).sort("vote_count", -1).limit(100))))
+        return raw_response(body)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @movie_routes.route('/by-decade/<decade>', methods=['GET'])
 def get_movies_by_decade(decade):
-    movies_collection = db.get_movies_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
     try:
         start_year = int(decade)
         end_year = start_year + 9
-        movies = list(movies_collection.find(
+        body = _listings.get_or_compute(('by-decade', start_year), lambda: dumps(list(movies_collection.find(
             {
                 "release_year": {"$gte": str(start_year), "$lte": str(end_year)},
                 "poster_path": {"$exists": True},
@@ -166,19 +264,22 @@ def get_movies_by_decade(decade):
                 "vote_average": 1,
                 "vote_count": 1,
                 "backdrop_path": 1
-            }
-        ).sort("vote_count", -1).limit(30))
-        return jsonify(movies)
+            },
+            **find_options('listing')
+        ).sort("vote_count", -1).limit(30))))
+        return raw_response(body)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @movie_routes.route('/by-decade-language/<decade>/<language>', methods=['GET'])
 def get_movies_by_decade_language(decade, language):
-    movies_collection = db.get_movies_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
     try:
         start_year = int(decade)
         end_year = start_year + 9
-        movies = list(movies_collection.find(
+        body = _listings.get_or_compute(('by-decade-language', start_year, language.lower()), lambda: dumps(list(movies_collection.find(
             {
                 "release_year": {"$gte": str(start_year), "$lte": str(end_year)},
                 "language": {"$regex": f"^{language}$", "$options": "i"},
@@ -196,28 +297,41 @@ def get_movies_by_decade_language(decade, language):
                 "vote_count": 1,
                 "backdrop_path": 1,
                 "language": 1
-            }
-        ).sort("vote_count", -1).limit(30))
-        return jsonify(movies)
+            },
+            **find_options('listing')
+        ).sort("vote_count", -1).limit(30))))
+        return raw_response(body)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+def _search_store(store, query, movies_collection):
+    # Titles are matched from the shared catalog store, only the 30 best are read from Mongo
+    from fuzzywuzzy import fuzz
+    matches = []
+    for movie_id, title, original_title in store.titles():
+        score = max(fuzz.token_set_ratio(query, title.lower()), fuzz.token_set_ratio(query, original_title.lower()))
+        if score > 60:
+            matches.append((score, movie_id))
+    matches.sort(key=lambda x: x[0], reverse=True)
+    ids = [movie_id for _, movie_id in matches[:30]]
+    movies = {m['id']: m for m in movies_collection.find({"id": {"$in": ids}}, SEARCH_PROJECTION, **find_options('search'))}
+    return [movies[movie_id] for movie_id in ids if movie_id in movies]
+
+
 @movie_routes.route('/search', methods=['GET'])
 def search_movies():
-    movies_collection = db.get_movies_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
     query = request.args.get('q', '').strip().lower()
     if not query:
         return jsonify([])
     try:
-        all_movies = list(movies_collection.find({}, {
-            "_id": 0,
-            "id": 1,
-            "title": 1,
-            "original_title": 1,
-            "poster_path": 1,
-            "release_year": 1,
-            "vote_average": 1
-        }))
+        store = get_store()
+        if store is not None:
+            return jsonify(_search_store(store, query, movies_collection))
+        from fuzzywuzzy import fuzz
+        all_movies = list(movies_collection.find({}, SEARCH_PROJECTION, **find_options('search')))
         matched_movies = []
         for movie in all_movies:
             title_score = fuzz.token_set_ratio(query, movie.get('title', '').lower())
@@ -233,14 +347,16 @@ def search_movies():
             movie.pop('match_score', None)
             results.append(movie)
         return jsonify(results)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @movie_routes.route('/by-language/<language>', methods=['GET'])
 def get_movies_by_language(language):
-    movies_collection = db.get_movies_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
     try:
-        movies = list(movies_collection.find(
+        body = _listings.get_or_compute(('by-language', language.lower()), lambda: dumps(list(movies_collection.find(
             {"language": {"$regex": f"^{language}$", "$options": "i"}},
             {
                 "_id": 0,
@@ -251,65 +367,67 @@ def get_movies_by_language(language):
                 "vote_average": 1,
                 "vote_count": 1,
                 "backdrop_path": 1
-            }
-        ).sort("vote_count", -1).limit(100))
-        return jsonify(movies)
+            },
+            **find_options('listing')
+        ).sort("vote_count", -1).limit(100))))
+        return raw_response(body)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @movie_routes.route('/<int:movie_id>', methods=['GET'])
 def get_movie_details(movie_id):
-    movies_collection = db.get_movies_collection()
-    people_collection = db.get_people_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
+    people_collection = catalog_reads(db.get_people_collection())
     try:
         movie = movies_collection.find_one(
             {"id": movie_id},
-            {"_id": 0}
+            {"_id": 0, "content_hash": 0},
+            **find_options('detail')
         )
         if not movie:
             return jsonify({"error": "Movie not found"}), 404
-        cast = []
-        for cast_id in movie.get('cast_ids', []):
-            person = people_collection.find_one(
-                {"id": cast_id},
-                {"_id": 0, "id": 1, "name": 1, "profile_path": 1, "characters": 1}
-            )
-            if person:
-                character = next(
-                    (c['name'] for c in person.get('characters', []) 
-                    if c['movie'] == movie['title']), 
-                    'Unknown'
-                )
-                cast.append({
-                    "id": person['id'],
-                    "name": person['name'],
-                    "profile_path": person['profile_path'],
-                    "character": character
-                })
-        movie['cast'] = cast
+        # One query for the whole cast, listed in cast_ids order
+        cast_ids = movie.get('cast_ids', [])
+        people_by_id = {}
+        if cast_ids:
+            people_by_id = {p['id']: p for p in people_collection.find(
+                {"id": {"$in": cast_ids}},
+                CAST_PROJECTION,
+                **find_options('detail')
+            )}
+        movie['cast'] = [
+            cast_entry(people_by_id[cast_id], movie['title'])
+            for cast_id in cast_ids if cast_id in people_by_id
+        ]
         if 'director_id' in movie:
             director = people_collection.find_one(
                 {"id": movie['director_id']},
-                {"_id": 0, "id": 1, "name": 1, "profile_path": 1}
+                CREW_PROJECTION,
+                **find_options('detail')
             )
             if director:
                 movie['director'] = director
         if 'producer_ids' in movie:
             producers = list(people_collection.find(
                 {"id": {"$in": movie['producer_ids']}},
-                {"_id": 0, "id": 1, "name": 1, "profile_path": 1}
+                CREW_PROJECTION,
+                **find_options('detail')
             ))
             if producers:
                 movie['producers'] = producers
         return jsonify(movie)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @movie_routes.route('/free', methods=['GET'])
 def get_free_movies():
-    movies_collection = db.get_movies_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
     try:
-        movies = list(movies_collection.find(
+        body = _listings.get_or_compute(('free',), lambda: dumps(list(movies_collection.find(
             {
                 "movie_url": {"$exists": True, "$ne": ""},
                 "poster_path": {"$exists": True},
@@ -326,18 +444,21 @@ def get_free_movies():
                 "vote_count": 1,
                 "backdrop_path": 1,
                 "movie_url": 1
-            }
-        ).sort("vote_count", -1).limit(30))
-        return jsonify(movies)
+            },
+            **find_options('listing')
+        ).sort("vote_count", -1).limit(30))))
+        return raw_response(body)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @movie_routes.route('/new-releases', methods=['GET'])
 def get_new_releases():
-    movies_collection = db.get_movies_collection()
+    movies_collection = catalog_reads(db.get_movies_collection())
     current_year = str(datetime.now().year)
     try:
-        movies = list(movies_collection.find(
+        body = _listings.get_or_compute(('new-releases', current_year), lambda: dumps(list(movies_collection.find(
             {
                 "release_year": current_year,
                 "poster_path": {"$exists": True},
@@ -353,8 +474,11 @@ def get_new_releases():
                 "vote_average": 1,
                 "vote_count": 1,
                 "backdrop_path": 1
-            }
-        ).sort("vote_count", -1).limit(20))
-        return jsonify(movies)
+            },
+            **find_options('listing')
+        ).sort("vote_count", -1).limit(20))))
+        return raw_response(body)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
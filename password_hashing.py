@@ -0,0 +1,105 @@
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, generate_password_hash, check_password_hash
+
+# Password hashing runs on a bounded process pool so slow, CPU-heavy hashes do
+# not starve request threads. Method and cost come from the environment, e.g.
+#   PASSWORD_HASH_METHOD=scrypt:32768:8:1  or  pbkdf2:sha256:600000
+HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+SALT_LENGTH = int(os.environ.get('PASSWORD_SALT_LENGTH', '16'))
+# Every server worker has its own pool, so by default they split the CPUs
+SERVER_WORKERS = max(1, int(os.environ.get('WEB_CONCURRENCY', '1')))
+POOL_SIZE = int(os.environ.get('PASSWORD_HASH_WORKERS', str(max(1, (os.cpu_count() or 2) // SERVER_WORKERS))))
+MAX_QUEUE = int(os.environ.get('PASSWORD_HASH_MAX_QUEUE', '64'))
+
+
+class HashingOverloaded(Exception):
+    pass
+
+
+def _method_prefix(method):
+    # The method string werkzeug stores in front of the salt, with its defaults
+    # filled in. Rejects anything werkzeug would only refuse when hashing.
+    name, *args = method.split(':')
+    try:
+        if name == 'scrypt' and len(args) in (0, 3):
+            return 'scrypt:' + ':'.join(str(int(arg)) for arg in args or [32768, 8, 1])
+        if name == 'pbkdf2' and len(args) <= 2:
+            hash_name = args[0] if args else 'sha256'
+            hashlib.pbkdf2_hmac(hash_name, b'', b'', 1)
+            iterations = int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS
+            return f"pbkdf2:{hash_name}:{iterations}"
+    except ValueError:
+        pass
+    raise ValueError(
+        f"Invalid hash method: {method} (use scrypt[:n:r:p] or pbkdf2[:hash_name[:iterations]])"
+    )
+
+
+# Fails at startup on an unsupported or incomplete PASSWORD_HASH_METHOD
+METHOD_PREFIX = _method_prefix(HASH_METHOD)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+# Queue-depth metrics for the hashing pool
+stats = {"queue_depth": 0, "max_queue_depth": 0, "submitted": 0, "rejected": 0}
+_stats_lock = threading.Lock()
+
+
+def _mp_context():
+    # Hashing processes start from a clean interpreter rather than a fork of a
+    # threaded server worker, which can inherit locks held by other threads
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def _get_pool():
+    # Created lazily so each forked worker gets its own pool
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=POOL_SIZE, mp_context=_mp_context())
+    return _pool
+
+
+def _run(fn, *args):
+    with _stats_lock:
+        if stats["queue_depth"] >= MAX_QUEUE:
+            stats["rejected"] += 1
+            raise HashingOverloaded("Password hashing queue is full")
+        stats["queue_depth"] += 1
+        stats["submitted"] += 1
+        stats["max_queue_depth"] = max(stats["max_queue_depth"], stats["queue_depth"])
+    try:
+        try:
+            future = _get_pool().submit(fn, *args)
+        except (OSError, RuntimeError):
+            # No process pool available (e.g. restricted sandbox): hash inline
+            return fn(*args)
+        return future.result()
+    finally:
+        with _stats_lock:
+            stats["queue_depth"] -= 1
+
+
+def queue_depth():
+    return stats["queue_depth"]
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, HASH_METHOD, SALT_LENGTH)
+
+
+def verify_password(pwhash, password):
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash):
+    # True when a stored hash was made with a different method or cost than configured
+    return pwhash.split('$', 1)[0] != METHOD_PREFIX
@@ -1,89 +1,130 @@
+import os
 from flask import Blueprint, jsonify, request
 from database import db
+import catalog_changes
+from cache import LRUCache
+from catalog_store import get_store
+from serialization import dumps, raw_response
+from db_settings import OVERLOAD_ERRORS, aggregate_options, catalog_reads, find_options, overloaded
 
 people_routes = Blueprint('people', __name__)
 
+POPULAR_PEOPLE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "name": 1,
+    "profile_path": 1,
+    "known_for": 1,
+    "biography": 1,
+    "birthday": 1,
+    "place_of_birth": 1,
+    "popularity": 1
+}
+POPULAR_PEOPLE_LIMIT = 102
+
+POPULAR_PEOPLE_PIPELINE = [
+    {
+        "$match": {
+            "characters.4": {"$exists": True}
+        }
+    },
+    {
+        "$addFields": {
+            "movie_count": {"$size": "$characters"}
+        }
+    },
+    {
+        "$sort": {"movie_count": -1}
+    },
+    {
+        "$limit": POPULAR_PEOPLE_LIMIT
+    },
+    {
+        "$project": {**POPULAR_PEOPLE_PROJECTION, "movie_count": 1}
+    }
+]
+
+PERSON_MOVIE_PROJECTION = {"_id": 0, "id": 1, "title": 1, "poster_path": 1, "release_year": 1}
+
+# The serialized popular-people page with filmographies; served stale while one refresh runs
+POPULAR_PEOPLE_TTL = float(os.environ.get('POPULAR_PEOPLE_CACHE_TTL_S', '300'))
+POPULAR_PEOPLE_STALE_TTL = float(os.environ.get('POPULAR_PEOPLE_CACHE_STALE_TTL_S', '900'))
+_popular = LRUCache('popular_people', maxsize=1, ttl=POPULAR_PEOPLE_TTL, stale_ttl=POPULAR_PEOPLE_STALE_TTL)
+
+
+@catalog_changes.subscribe
+def _on_catalog_change(collection, kind, ids):
+    if collection in ('people', 'movies'):
+        _popular.clear()
+
+
+def popular_people_from_store(store, people_collection):
+    # Same ranking as POPULAR_PEOPLE_PIPELINE, read from the shared catalog store
+    # instead of sizing every person's characters array
+    top = store.top_people(min_movies=5, limit=POPULAR_PEOPLE_LIMIT)
+    people = {
+        p['id']: p for p in people_collection.find(
+            {"id": {"$in": [person_id for person_id, _ in top]}}, POPULAR_PEOPLE_PROJECTION,
+            **find_options('people.popular')
+        )
+    }
+    return [
+        {**people[person_id], "movie_count": movie_count}
+        for person_id, movie_count in top if person_id in people
+    ]
+
+
+def cached_popular_body(compute):
+    # The serialized page from _popular, shared with the async view
+    return _popular.get_or_compute('popular', compute)
+
+
+def person_movie_queries(person):
+    # (job, movies filter) pairs for a person's filmography on listing pages
+    queries = []
+    if person.get('known_for') == 'acting' or 'characters' in person:
+        movie_titles = [c['movie'] for c in person.get('characters', [])]
+        queries.append(('Actor', {"title": {"$in": movie_titles}}))
+    if person.get('known_for') == 'directing':
+        queries.append(('Director', {"director_id": person['id']}))
+    if person.get('known_for') == 'production':
+        queries.append(('Producer', {"producer_ids": person['id']}))
+    return queries
+
+
+def popular_people(people_collection, movies_collection):
+    store = get_store()
+    if store is not None:
+        people = popular_people_from_store(store, people_collection)
+    else:
+        people = list(people_collection.aggregate(POPULAR_PEOPLE_PIPELINE, **aggregate_options('people.popular')))
+
+    for person in people:
+        movies = []
+        for job, movie_filter in person_movie_queries(person):
+            job_movies = list(movies_collection.find(movie_filter, PERSON_MOVIE_PROJECTION, **find_options('people.popular')))
+            for movie in job_movies:
+                movie['job'] = job
+            movies.extend(job_movies)
+        person['movies'] = movies
+    return people
+
+
 @people_routes.route('/popular', methods=['GET'])
 def get_popular_people():
-    people_collection = db.get_people_collection()
-    movies_collection = db.get_movies_collection()
-    # ... (rest of the function remains exactly the same as original)
+    people_collection = catalog_reads(db.get_people_collection())
+    movies_collection = catalog_reads(db.get_movies_collection())
     try:
-        pipeline = [
-            {
-                "$match": {
-                    "characters.4": {"$exists": True}
-                }
-            },
-            {
-                "$addFields": {
-                    "movie_count": {"$size": "$characters"}
-                }
-            },
-            {
-                "$sort": {"movie_count": -1}
-            },
-            {
-                "$limit": 102
-            },
-            {
-                "$project": {
-                    "_id": 0,
-                    "id": 1,
-                    "name": 1,
-                    "profile_path": 1,
-                    "known_for": 1,
-                    "biography": 1,
-                    "birthday": 1,
-                    "place_of_birth": 1,
-                    "popularity": 1,
-                    "movie_count": 1
-                }
-            }
-        ]
-
-        people = list(people_collection.aggregate(pipeline))
-
-        for person in people:
-            movies = []
-
-            if person.get('known_for') == 'acting' or 'characters' in person:
-                movie_titles = [c['movie'] for c in person.get('characters', [])]
-                actor_movies = list(movies_collection.find(
-                    {"title": {"$in": movie_titles}},
-                    {"_id": 0, "id": 1, "title": 1, "poster_path": 1, "release_year": 1}
-                ))
-                for movie in actor_movies:
-                    movie['job'] = 'Actor'
-                movies.extend(actor_movies)
-
-            if person.get('known_for') == 'directing':
-                director_movies = list(movies_collection.find(
-                    {"director_id": person['id']},
-                    {"_id": 0, "id": 1, "title": 1, "poster_path": 1, "release_year": 1}
-                ))
-                for movie in director_movies:
-                    movie['job'] = 'Director'
-                movies.extend(director_movies)
-
-            if person.get('known_for') == 'production':
-                producer_movies = list(movies_collection.find(
-                    {"producer_ids": person['id']},
-                    {"_id": 0, "id": 1, "title": 1, "poster_path": 1, "release_year": 1}
-                ))
-                for movie in producer_movies:
-                    movie['job'] = 'Producer'
-                movies.extend(producer_movies)
-
-            person['movies'] = movies
-
-        return jsonify(people)
+        body = cached_popular_body(lambda: dumps(popular_people(people_collection, movies_collection)))
+        return raw_response(body)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @people_routes.route('/search', methods=['GET'])
 def search_people():
-    people_collection = db.get_people_collection()
+    people_collection = catalog_reads(db.get_people_collection())
     try:
         query = request.args.get('q', '').strip()
         if not query:
@@ -104,7 +145,8 @@ def search_people():
                 "place_of_birth": 1,
                 "popularity": 1,
                 "characters": 1
-            }
+            },
+            **find_options('people.search')
         ).limit(100))
 
         for person in people:
@@ -112,17 +154,20 @@ def search_people():
             person.pop('characters', None)
 
         return jsonify(people)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @people_routes.route('/<int:person_id>', methods=['GET'])
 def get_person_details(person_id):
-    people_collection = db.get_people_collection()
-    movies_collection = db.get_movies_collection()
+    people_collection = catalog_reads(db.get_people_collection())
+    movies_collection = catalog_reads(db.get_movies_collection())
     try:
         person = people_collection.find_one(
             {"id": person_id},
-            {"_id": 0}
+            {"_id": 0, "content_hash": 0},
+            **find_options('detail')
         )
 
         if not person:
@@ -146,7 +191,8 @@ def get_person_details(person_id):
                     "poster_path": 1,
                     "release_year": 1,
                     "language": 1
-                }
+                },
+                **find_options('detail')
             ))
 
             # Assign role by matching both title and language
@@ -170,7 +216,8 @@ def get_person_details(person_id):
                     "title": 1,
                     "poster_path": 1,
                     "release_year": 1
-                }
+                },
+                **find_options('detail')
             ))
             for movie in director_movies:
                 movie['job'] = 'Director'
@@ -186,7 +233,8 @@ def get_person_details(person_id):
                     "title": 1,
                     "poster_path": 1,
                     "release_year": 1
-                }
+                },
+                **find_options('detail')
             ))
             for movie in producer_movies:
                 movie['job'] = 'Producer'
@@ -207,5 +255,7 @@ def get_person_details(person_id):
         }
 
         return jsonify(response)
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -0,0 +1,104 @@
+from pymongo import UpdateOne
+from bson import ObjectId
+from database import db
+from user_cache import invalidate_user
+from dislikes import record_dislike, record_undislike
+
+# Mutations on profile-indexed fields as single conditional writes: the filter
+# only matches when profiles.<idx> exists, so matched_count doubles as the
+# "profile not found" check and there is no read-then-write race.
+
+MAX_BULK_OPS = 200
+
+
+def profile_filter(user_id, profile_idx):
+    return {"_id": ObjectId(user_id), f"profiles.{profile_idx}": {"$exists": True}}
+
+
+def update_profile_at(user_id, profile_idx, update):
+    result = db.get_users_collection().update_one(profile_filter(user_id, profile_idx), update)
+    if result.matched_count:
+        invalidate_user(user_id)
+    return result.matched_count > 0
+
+
+def set_profile_fields(user_id, profile_idx, fields):
+    return update_profile_at(user_id, profile_idx, {"$set": {
+        f"profiles.{profile_idx}.{field}": value for field, value in fields.items()
+    }})
+
+
+def add_to_watchlist(user_id, profile_idx, movie_id):
+    return update_profile_at(user_id, profile_idx, {"$addToSet": {f"profiles.{profile_idx}.watchlist": movie_id}})
+
+
+def remove_from_watchlist(user_id, profile_idx, movie_id):
+    return update_profile_at(user_id, profile_idx, {"$pull": {f"profiles.{profile_idx}.watchlist": movie_id}})
+
+
+# --- Bulk operations ---
+def _watchlist_add(user_id, op):
+    idx = op['profile_idx']
+    return UpdateOne(profile_filter(user_id, idx), {"$addToSet": {f"profiles.{idx}.watchlist": op['movie_id']}})
+
+
+def _watchlist_remove(user_id, op):
+    idx = op['profile_idx']
+    return UpdateOne(profile_filter(user_id, idx), {"$pull": {f"profiles.{idx}.watchlist": op['movie_id']}})
+
+
+def _like(user_id, op):
+    return UpdateOne(
+        {"_id": ObjectId(user_id)},
+        {"$addToSet": {"liked_movies": op['movie_id']}, "$pull": {"disliked_movies": op['movie_id']}}
+    )
+
+
+def _unlike(user_id, op):
+    return UpdateOne({"_id": ObjectId(user_id)}, {"$pull": {"liked_movies": op['movie_id']}})
+
+
+def _dislike(user_id, op):
+    return UpdateOne(
+        {"_id": ObjectId(user_id)},
+        {"$pull": {"liked_movies": op['movie_id']}, "$addToSet": {"disliked_movies": op['movie_id']}}
+    )
+
+
+BULK_OPERATIONS = {
+    "watchlist_add": (_watchlist_add, True),
+    "watchlist_remove": (_watchlist_remove, True),
+    "like": (_like, False),
+    "unlike": (_unlike, False),
+    "dislike": (_dislike, False),
+}
+
+
+def validate_ops(ops):
+    if not isinstance(ops, list) or not ops:
+        raise ValueError("ops must be a non-empty array")
+    if len(ops) > MAX_BULK_OPS:
+        raise ValueError(f"At most {MAX_BULK_OPS} operations per request")
+    for op in ops:
+        if not isinstance(op, dict) or op.get('op') not in BULK_OPERATIONS:
+            raise ValueError(f"Unknown operation: {op.get('op') if isinstance(op, dict) else op}")
+        if not isinstance(op.get('movie_id'), int):
+            raise ValueError("movie_id must be an integer")
+        if BULK_OPERATIONS[op['op']][1]:
+            idx = op.get('profile_idx')
+            if not isinstance(idx, int) or idx < 0:
+                raise ValueError("profile_idx must be a non-negative integer")
+
+
+def apply_bulk_ops(user_id, ops):
+    # Applies every operation in one ordered bulk_write, returns (matched, modified)
+    validate_ops(ops)
+    requests = [BULK_OPERATIONS[op['op']][0](user_id, op) for op in ops]
+    result = db.get_users_collection().bulk_write(requests, ordered=True)
+    for op in ops:
+        if op['op'] == 'like':
+            record_undislike(user_id, op['movie_id'])
+        elif op['op'] == 'dislike':
+            record_dislike(user_id, op['movie_id'])
+    invalidate_user(user_id)
+    return result.matched_count, result.modified_count
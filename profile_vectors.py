@@ -0,0 +1,117 @@
+from collections import Counter
+from database import db
+from db_settings import catalog_reads, find_options
+from cache import LRUCache
+from user_cache import USER_TTL, get_user, on_invalidate
+
+# Per-user cache of profile feature vectors: {user_id: (user document, {profile_idx: vector})}.
+# An entry only counts while its document is still the cached user, so preference
+# and like changes made on another worker are picked up when user_cache reloads.
+_vectors = LRUCache('profile_vectors', maxsize=5000, ttl=USER_TTL)
+
+# Only the most recent likes feed the centroid, so a rebuild stays cheap
+MAX_CENTROID_LIKES = 200
+
+# Weights of each personalization term when re-ranking
+PREFERRED_GENRE_WEIGHT = 15
+PREFERRED_LANGUAGE_WEIGHT = 10
+CENTROID_GENRE_WEIGHT = 10
+CENTROID_LANGUAGE_WEIGHT = 5
+
+
+def _normalize(counts):
+    total = sum(counts.values())
+    if not total:
+        return {}
+    return {key: value / total for key, value in counts.items()}
+
+
+def _build_vector(user, profile_idx):
+    profiles = user.get('profiles') or []
+    profile = profiles[profile_idx] if 0 <= profile_idx < len(profiles) else {}
+
+    genre_weights = _normalize(Counter(
+        g.lower() for g in profile.get('preferred_genres', []) if isinstance(g, str)
+    ))
+    language_weights = _normalize(Counter(
+        l.lower() for l in profile.get('preferred_languages', []) if isinstance(l, str)
+    ))
+
+    # --- Liked-movie centroid (genre and language distribution) ---
+    liked_ids = user.get('liked_movies', [])[-MAX_CENTROID_LIKES:]
+    centroid_genres = Counter()
+    centroid_languages = Counter()
+    if liked_ids:
+        liked = catalog_reads(db.get_movies_collection()).find(
+            {"id": {"$in": liked_ids}},
+            {"_id": 0, "genres": 1, "original_language": 1},
+            **find_options('recommendations.profile')
+        )
+        for movie in liked:
+            for genre in movie.get('genres', []):
+                centroid_genres[genre.lower()] += 1
+            if movie.get('original_language'):
+                centroid_languages[movie['original_language'].lower()] += 1
+
+    return {
+        "genres": genre_weights,
+        "languages": language_weights,
+        "centroid_genres": _normalize(centroid_genres),
+        "centroid_languages": _normalize(centroid_languages)
+    }
+
+
+def get_profile_vector(user_id, profile_idx=0):
+    if not user_id:
+        return None
+    user = get_user(user_id)
+    if not user:
+        return None
+    entry = _vectors.get(str(user_id))
+    vectors = entry[1] if entry is not None and entry[0] is user else {}
+    if profile_idx in vectors:
+        return vectors[profile_idx]
+    try:
+        vector = _build_vector(user, profile_idx)
+    except Exception:
+        return None
+    vectors = dict(vectors)
+    vectors[profile_idx] = vector
+    _vectors.set(str(user_id), (user, vectors))
+    return vector
+
+
+@on_invalidate
+def invalidate_profile_vector(user_id):
+    _vectors.delete(str(user_id))
+
+
+def profile_score(vector, movie):
+    if not vector:
+        return 0
+    genres = [g.lower() for g in movie.get('genres', [])]
+    languages = {
+        (movie.get('original_language') or '').lower(),
+        (movie.get('language') or '').lower()
+    }
+    score = 0
+    score += sum(vector['genres'].get(g, 0) for g in genres) * PREFERRED_GENRE_WEIGHT
+    score += max((vector['languages'].get(l, 0) for l in languages), default=0) * PREFERRED_LANGUAGE_WEIGHT
+    score += sum(vector['centroid_genres'].get(g, 0) for g in genres) * CENTROID_GENRE_WEIGHT
+    score += max((vector['centroid_languages'].get(l, 0) for l in languages), default=0) * CENTROID_LANGUAGE_WEIGHT
+    return score
+
+
+def rerank(movies, vector, score_key='score'):
+    # Adds the personalization term to each movie's score and re-sorts in place.
+    # Movies without a score get a positional prior so the incoming order still counts.
+    if not vector or not movies:
+        return movies
+    count = len(movies)
+    for position, movie in enumerate(movies):
+        base = movie.get(score_key)
+        if base is None:
+            base = (count - position) / count * 10
+        movie[score_key] = round(base + profile_score(vector, movie), 2)
+    movies.sort(key=lambda m: m[score_key], reverse=True)
+    return movies
@@ -0,0 +1,120 @@
+import contextvars
+import cProfile
+import functools
+import json
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from flask import request
+
+# Opt-in profiling for the recommendation hot paths. A request is profiled when
+#   - it carries `X-CineScope-Profile: <PROFILE_TOKEN>` (only if PROFILE_TOKEN is set), or
+#   - it is picked by PROFILE_SAMPLE_RATE (0.0 - 1.0, default off).
+# Profiled requests record per-stage timers and a cProfile (or pyinstrument,
+# with PROFILER=pyinstrument) trace of the request thread into PROFILE_DIR.
+
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '0'))
+PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+PROFILER = os.environ.get('PROFILER', 'cprofile')
+PROFILE_HEADER = 'X-CineScope-Profile'
+
+_stages = contextvars.ContextVar('profile_stages', default=None)
+_last_lap = contextvars.ContextVar('profile_last_lap', default=None)
+
+
+def _should_profile():
+    if PROFILE_TOKEN and request.headers.get(PROFILE_HEADER) == PROFILE_TOKEN:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def record_stage(name, elapsed_ms):
+    stages = _stages.get()
+    if stages is not None:
+        stages.append({"stage": name, "ms": round(elapsed_ms, 2)})
+
+
+@contextmanager
+def stage(name):
+    # Near-free when the current request is not being profiled
+    if _stages.get() is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, (time.perf_counter() - start) * 1000)
+
+
+def lap(name):
+    # Records the time since the previous lap (or the start of the request) as a stage,
+    # for long straight-line views where a `with stage()` block would not fit
+    last = _last_lap.get()
+    if last is None:
+        return
+    now = time.perf_counter()
+    record_stage(name, (now - last) * 1000)
+    _last_lap.set(now)
+
+
+def _start_profiler():
+    if PROFILER == 'pyinstrument':
+        try:
+            from pyinstrument import Profiler
+        except ImportError:
+            pass
+        else:
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _write_trace(name, profiler, stages, elapsed_ms):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    base = os.path.join(PROFILE_DIR, f"{name}-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}")
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        profiler.dump_stats(base + '.prof')
+    else:
+        profiler.stop()
+        with open(base + '.html', 'w') as f:
+            f.write(profiler.output_html())
+    with open(base + '.json', 'w') as f:
+        json.dump({
+            "route": name,
+            "path": request.full_path,
+            "elapsed_ms": round(elapsed_ms, 2),
+            "stages": stages
+        }, f, indent=2)
+
+
+def profiled(name):
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not _should_profile():
+                return view(*args, **kwargs)
+            stages = []
+            token = _stages.set(stages)
+            profiler = _start_profiler()
+            start = time.perf_counter()
+            lap_token = _last_lap.set(start)
+            try:
+                return view(*args, **kwargs)
+            finally:
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                _stages.reset(token)
+                _last_lap.reset(lap_token)
+                try:
+                    _write_trace(name, profiler, stages, elapsed_ms)
+                except Exception as e:
+                    print(f"Failed to write profile for {name}: {e}")
+        return wrapper
+    return decorator
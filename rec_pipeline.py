@@ -0,0 +1,187 @@
+import contextvars
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, wait
+import metrics
+import profiling
+
+# Fields every recommendation card carries
+MOVIE_CARD_FIELDS = [
+    "id", "title", "poster_path", "backdrop_path", "release_year", "vote_average",
+    "vote_count", "genres", "overview", "trailer_url", "original_language"
+]
+MOVIE_CARD_PROJECTION = {"_id": 0, **{field: 1 for field in MOVIE_CARD_FIELDS}}
+
+# Shared, bounded pool for candidate generation across all requests, created on
+# first use and again in every forked worker: a pool started before the fork
+# (e.g. by an eager warm-up with --preload) has no threads in the child
+EXECUTOR_WORKERS = int(os.environ.get('REC_EXECUTOR_WORKERS', '16'))
+_executor = None
+_executor_lock = threading.Lock()
+
+# Default per-request deadline for candidate generation
+DEFAULT_DEADLINE_MS = int(os.environ.get('REC_DEADLINE_MS', '2000'))
+
+# Deadline of the pipeline run a generator works for, None outside one
+_deadline = contextvars.ContextVar('rec_deadline', default=None)
+
+# Aggregated per-stage timings: {pipeline: {stage: {"count", "total_ms", "max_ms", "over_budget"}}}
+STAGE_STATS = {}
+_stats_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXECUTOR_WORKERS, thread_name_prefix='rec-candidates')
+        return _executor
+
+
+def _reset_executor():
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_executor)
+
+
+def _record(pipeline, stage, elapsed_ms, budget_ms):
+    with _stats_lock:
+        stats = STAGE_STATS.setdefault(pipeline, {}).setdefault(
+            stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "over_budget": 0, "dropped": 0}
+        )
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        if budget_ms is not None and elapsed_ms > budget_ms:
+            stats["over_budget"] += 1
+
+
+def stage_stats_snapshot():
+    with _stats_lock:
+        return {
+            pipeline: {stage: dict(stats) for stage, stats in stages.items()}
+            for pipeline, stages in STAGE_STATS.items()
+        }
+
+
+def remaining_s():
+    # Seconds left before the current run's deadline (None outside a pipeline), so
+    # generators can bound blocking waits such as a coalesced cache miss
+    deadline = _deadline.get()
+    return None if deadline is None else max(0.0, deadline - time.monotonic())
+
+
+class CandidateGenerator:
+    def __init__(self, name, fn, budget_ms=None):
+        self.name = name
+        self.fn = fn
+        self.budget_ms = budget_ms
+
+
+def _record_dropped(pipeline, stage):
+    with _stats_lock:
+        stats = STAGE_STATS.setdefault(pipeline, {}).setdefault(
+            stage, {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "over_budget": 0, "dropped": 0}
+        )
+        stats["dropped"] += 1
+
+
+class PipelineResult:
+    def __init__(self, results, sources, timings, used_fallback=False, dropped=()):
+        self.results = results
+        self.sources = sources
+        self.timings = timings
+        self.used_fallback = used_fallback
+        self.dropped = list(dropped)
+
+
+class RecommendationPipeline:
+    # Stages: generate (concurrently) -> merge -> score -> hydrate.
+    # Every stage is a plain callable taking the request context dict.
+    # Generators that miss the request deadline are dropped, the fallback
+    # only runs when every source came back empty.
+    def __init__(self, name, generators, merger, scorer, hydrator,
+                 fallback=None, budgets=None, deadline_ms=DEFAULT_DEADLINE_MS):
+        self.name = name
+        self.generators = generators
+        self.merger = merger
+        self.scorer = scorer
+        self.hydrator = hydrator
+        self.fallback = fallback
+        self.budgets = budgets or {}
+        self.deadline_ms = deadline_ms
+
+    def _timed(self, stage, timings, fn, *args, budget_ms=None):
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            timings[stage] = round(elapsed_ms, 2)
+            _record(self.name, stage, elapsed_ms, budget_ms)
+            metrics.record_stage(f"{self.name}.{stage}", elapsed_ms)
+            profiling.record_stage(stage, elapsed_ms)
+
+    def _generate(self, ctx, timings, deadline, dropped):
+        # Each generator runs in a copy of the request's context so per-request
+        # accounting (e.g. Mongo command metrics) and the deadline still see it
+        executor = _get_executor()
+        token = _deadline.set(deadline)
+        try:
+            futures = {
+                executor.submit(
+                    contextvars.copy_context().run,
+                    self._timed, f"generate.{g.name}", timings, g.fn, ctx, budget_ms=g.budget_ms
+                ): g.name
+                for g in self.generators
+            }
+        finally:
+            _deadline.reset(token)
+        done, not_done = wait(futures, timeout=max(0, deadline - time.monotonic()))
+        sources = {}
+        for future in not_done:
+            # Late results are discarded. Queued generators never start; running ones
+            # are bounded by their query budgets and by remaining_s() for cache waits.
+            future.cancel()
+            name = futures[future]
+            dropped.append(name)
+            _record_dropped(self.name, f"generate.{name}")
+            sources[name] = []
+        for future in done:
+            name = futures[future]
+            try:
+                sources[name] = future.result() or []
+            except TimeoutError:
+                # Gave up waiting on another request's computation at the deadline
+                dropped.append(name)
+                _record_dropped(self.name, f"generate.{name}")
+                sources[name] = []
+            except Exception:
+                print(traceback.format_exc())
+                sources[name] = []
+        return sources
+
+    def run(self, ctx, deadline_ms=None):
+        timings = {}
+        dropped = []
+        deadline = time.monotonic() + (deadline_ms or self.deadline_ms) / 1000
+        sources = self._timed("generate", timings, self._generate, ctx, timings, deadline, dropped,
+                              budget_ms=self.budgets.get("generate"))
+        merged = self._timed("merge", timings, self.merger, ctx, sources,
+                             budget_ms=self.budgets.get("merge"))
+        used_fallback = False
+        if not merged and self.fallback is not None:
+            merged = self._timed("fallback", timings, self.fallback, ctx,
+                                 budget_ms=self.budgets.get("fallback"))
+            used_fallback = True
+        ctx['used_fallback'] = used_fallback
+        ranked = self._timed("score", timings, self.scorer, ctx, merged,
+                             budget_ms=self.budgets.get("score"))
+        results = self._timed("hydrate", timings, self.hydrator, ctx, ranked,
+                              budget_ms=self.budgets.get("hydrate"))
+        return PipelineResult(results, sources, timings, used_fallback, dropped)
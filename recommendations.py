@@ -1,7 +1,25 @@
+import os
 from flask import Blueprint, request, jsonify
+import click
 from database import db
-from fuzzywuzzy import fuzz
 from flask_jwt_extended import get_jwt_identity, jwt_required
+from bson import ObjectId
+from profile_vectors import get_profile_vector, rerank
+from dislikes import get_disliked_ids, exclude_disliked, OVERSAMPLE_FACTOR
+from user_cache import get_liked_ids
+from cache import LRUCache
+import interactions
+import catalog_changes
+import movie_cards
+from profiling import profiled, stage, lap
+import interaction_log
+import json
+from catalog_store import get_store
+from db_settings import OVERLOAD_ERRORS, catalog_reads, find_options, overloaded
+from serialization import dumps, extend_object, list_body, raw_response
+from rec_pipeline import (
+    CandidateGenerator, RecommendationPipeline, MOVIE_CARD_PROJECTION, remaining_s
+)
 
 rec_routes = Blueprint('recommendations', __name__)
 
@@ -86,160 +104,418 @@ def check_general_qa(query):
                 return qa["response"]
     return None
 
+# --- More-like-this pipeline ---
+SCORING_PROJECTION = {**MOVIE_CARD_PROJECTION, "cast_ids": 1, "director_id": 1}
+
+
+def content_similarity(current_movie, movie):
+    from fuzzywuzzy import fuzz
+    score = 0
+    # Genre similarity (Jaccard)
+    if 'genres' in current_movie and 'genres' in movie:
+        set1 = set(current_movie['genres'])
+        set2 = set(movie['genres'])
+        intersection = set1 & set2
+        union = set1 | set2
+        genre_score = (len(intersection) / len(union)) * 40 if union else 0
+        score += genre_score
+    # Director match
+    if current_movie.get('director_id') and movie.get('director_id'):
+        if current_movie['director_id'] == movie['director_id']:
+            score += 20
+    # Cast similarity
+    if 'cast_ids' in current_movie and 'cast_ids' in movie:
+        common_cast = set(current_movie['cast_ids']) & set(movie['cast_ids'])
+        score += min(len(common_cast), 5) * 4
+    # Rating similarity
+    if 'vote_average' in current_movie and 'vote_average' in movie:
+        rating_diff = abs(current_movie['vote_average'] - movie['vote_average'])
+        score += max(0, 10 - rating_diff)
+    # Title similarity
+    title_sim = fuzz.token_set_ratio(current_movie.get('title', ''), movie.get('title', ''))
+    score += (title_sim / 100) * 10
+    # Overview similarity
+    overview_sim = fuzz.token_set_ratio(current_movie.get('overview', ''), movie.get('overview', ''))
+    score += (overview_sim / 100) * 5
+    # Recency bonus
+    try:
+        if abs(int(movie.get('release_year', 0)) - int(current_movie.get('release_year', 0))) <= 3:
+            score += 3
+    except Exception:
+        pass
+    return score
+
+
+# Content candidates that can still reach the head `_score_similar` keeps
+SHORTLIST_SIZE = 100
+# Most the title (10), overview (5) and recency (3) terms can add
+TEXT_SCORE_SLACK = 18
+
+
+# Per-movie content head. It only depends on the catalog, so it is shared by every
+# user and kept until catalog changes, then served stale while one scan refreshes it.
+SIMILAR_CONTENT_TTL = float(os.environ.get('SIMILAR_CONTENT_CACHE_TTL_S', '600'))
+SIMILAR_CONTENT_STALE_TTL = float(os.environ.get('SIMILAR_CONTENT_CACHE_STALE_TTL_S', '1800'))
+_similar_content = LRUCache(
+    'similar_content', maxsize=2000, ttl=SIMILAR_CONTENT_TTL, stale_ttl=SIMILAR_CONTENT_STALE_TTL
+)
+
+
+@catalog_changes.subscribe
+def _on_catalog_change(collection, kind, ids):
+    if collection == 'movies':
+        _similar_content.clear()
+
+
+def _content_shortlist(store, current_movie, movie_id):
+    # The genre, director, cast and rating terms of content_similarity are computed
+    # for the whole catalog from the store. A movie more than TEXT_SCORE_SLACK below
+    # the SHORTLIST_SIZE-th best of those can never make the head, so only the rest
+    # are read and fully scored.
+    import numpy as np
+    snapshot = store.snapshot
+    count = len(store.movie_ids)
+    eligible = snapshot.array('movie_has_poster') & (store.movie_ids != movie_id)
+    if int(eligible.sum()) <= SHORTLIST_SIZE:
+        return None
+
+    score = np.zeros(count)
+    if 'genres' in current_movie:
+        genres = set(current_movie['genres'])
+        codes = {store.genre_code(g) for g in genres} - {None}
+        common = store.row_counts('movie_genres', codes) if codes else np.zeros(count)
+        union = len(genres) + np.diff(snapshot.array('movie_genres_indptr')) - common
+        score += np.where(union > 0, common / np.maximum(union, 1) * 40, 0)
+    if current_movie.get('director_id'):
+        score += (snapshot.array('movie_director_id') == current_movie['director_id']) * 20
+    if current_movie.get('cast_ids'):
+        score += np.minimum(store.row_counts('movie_cast', set(current_movie['cast_ids'])), 5) * 4
+    if current_movie.get('vote_average') is not None:
+        ratings = snapshot.array('movie_vote_average')
+        rating_score = np.maximum(0, 10 - np.abs(ratings - current_movie['vote_average']))
+        score += np.where(np.isnan(ratings), 0, rating_score)
+
+    score[~eligible] = -np.inf
+    threshold = np.partition(score, -SHORTLIST_SIZE)[-SHORTLIST_SIZE]
+    shortlist = set(store.movie_ids[score + TEXT_SCORE_SLACK >= threshold].tolist())
+    shortlist.discard(movie_id)
+    return list(shortlist)
+
+
+def _scored_content(current_movie, movies):
+    candidates = []
+    for movie in movies:
+        score = content_similarity(current_movie, movie)
+        if score > 0:
+            movie['score'] = round(score, 2)
+            movie['common_genres'] = list(set(current_movie.get('genres', [])) & set(movie.get('genres', [])))
+            movie['common_cast'] = len(set(current_movie.get('cast_ids', [])) & set(movie.get('cast_ids', [])))
+            candidates.append(movie)
+    return candidates
+
+
+def _content_head(current_movie, movie_id):
+    movie_filter = {"id": {"$ne": movie_id}, "poster_path": {"$exists": True}}
+    store = get_store()
+    shortlist = _content_shortlist(store, current_movie, movie_id) if store is not None else None
+    if shortlist is not None:
+        movie_filter["id"] = {"$in": shortlist}
+    candidates = _scored_content(current_movie, catalog_reads(db.get_movies_collection()).find(
+        movie_filter, SCORING_PROJECTION, **find_options('recommendations.content')
+    ))
+    candidates.sort(key=lambda m: m['score'], reverse=True)
+    return candidates[:SHORTLIST_SIZE]
+
+
+def _similar_content_candidates(ctx):
+    current_movie = ctx['current_movie']
+    movie_id = ctx['movie_id']
+    head = _similar_content.get_or_compute(
+        movie_id, lambda: _content_head(current_movie, movie_id), timeout=remaining_s()
+    )
+    # Copied: merge and re-rank adjust scores in place
+    candidates = [dict(m) for m in head]
+    if ctx['user_id']:
+        # Co-liked movies get a merge boost that can lift them into the head from further down
+        missing = co_liked_movie_ids(movie_id) - {m['id'] for m in head} - {movie_id}
+        if missing:
+            candidates += _scored_content(current_movie, catalog_reads(db.get_movies_collection()).find(
+                {"id": {"$in": list(missing)}, "poster_path": {"$exists": True}}, SCORING_PROJECTION,
+                **find_options('recommendations.content')
+            ))
+    return candidates
+
+
+# movie id -> ids of movies liked by the same users. Kept current from the shared
+# interaction log (interactions.poll); the TTL bounds drift from anything missed.
+CO_LIKED_TTL = float(os.environ.get('CO_LIKED_CACHE_TTL_S', '600'))
+_co_liked = LRUCache('co_liked', maxsize=5000, ttl=CO_LIKED_TTL)
+
+
+def _load_co_liked(movie_id):
+    similar_users = catalog_reads(db.get_users_collection()).find(
+        {"liked_movies": movie_id},
+        {"liked_movies": 1},
+        **find_options('recommendations.co_liked')
+    )
+    collab_movie_ids = set()
+    for sim_user in similar_users:
+        for mid in sim_user.get("liked_movies", []):
+            if mid != movie_id:
+                collab_movie_ids.add(mid)
+    return collab_movie_ids
+
+
+def co_liked_movie_ids(movie_id):
+    return _co_liked.get_or_compute(movie_id, lambda: _load_co_liked(movie_id), timeout=remaining_s())
+
+
+@interactions.subscribe
+def _update_co_liked(user_id, events):
+    # Likes only add pairs, so cached entries are extended rather than rebuilt.
+    # Unlikes and dislikes may remove a pair other users still share, so those entries are dropped.
+    liked = get_liked_ids(user_id)
+    for event in events:
+        movie_id = event['movie_id']
+        if event['type'] == 'like':
+            entry = _co_liked.get(movie_id)
+            if entry is not None:
+                _co_liked.set(movie_id, entry | (liked - {movie_id}))
+            for other_id in liked:
+                entry = _co_liked.get(other_id)
+                if entry is not None and other_id != movie_id:
+                    _co_liked.set(other_id, entry | {movie_id})
+        elif event['type'] in ('unlike', 'dislike'):
+            _co_liked.delete(movie_id)
+            for other_id in liked:
+                _co_liked.delete(other_id)
+
+
+def _similar_collab_candidates(ctx):
+    if not ctx['user_id']:
+        return []
+    collab_movie_ids = co_liked_movie_ids(ctx['movie_id'])
+    if not collab_movie_ids:
+        return []
+    return movie_cards.hydrate(list(collab_movie_ids), movie_cards.field_set('rec'), require_poster=True)
+
+
+def _popular_candidates(ctx):
+    movie_filter = {"poster_path": {"$exists": True}}
+    if ctx.get('movie_id') is not None:
+        movie_filter["id"] = {"$ne": ctx['movie_id']}
+    return list(catalog_reads(db.get_movies_collection()).find(
+        movie_filter,
+        MOVIE_CARD_PROJECTION,
+        **find_options('recommendations.candidates')
+    ).sort("vote_count", -1).limit(12 * OVERSAMPLE_FACTOR))
+
+
+def _merge_similar(ctx, sources):
+    # --- Hybrid: Merge, deduplicate, and rank ---
+    all_results = {m['id']: m for m in sources.get('content', [])}
+    for m in sources.get('collaborative', []):
+        if m['id'] not in all_results:
+            m['score'] = 100  # Boost collaborative results
+            all_results[m['id']] = m
+        else:
+            all_results[m['id']]['score'] += 30  # Boost if both
+    return list(all_results.values())
+
+
+def _score_similar(ctx, candidates):
+    if ctx.get('used_fallback'):
+        return exclude_disliked(candidates, ctx['disliked'], 12)
+    # Only the head of the ranking is re-scored, personalization cost stays O(results)
+    results = sorted(candidates, key=lambda x: x.get('score', 0), reverse=True)[:100]
+    results = exclude_disliked(results, ctx['disliked'])
+    # --- Personalization: re-rank with the cached profile vector ---
+    rerank(results, ctx['profile_vector'])
+    return results[:12]
+
+
+def _card_fragments(ctx, ranked):
+    # Serialized cards for the ranked movies, reused across responses until a movie changes
+    movie_cards.prime(ranked)
+    name = movie_cards.field_set_name(ctx['fields'], 'rec')
+    found = movie_cards.fragment_map([m['id'] for m in ranked], name)
+    return [
+        found[m['id']][0] if m['id'] in found else dumps(movie_cards.project(m, movie_cards.FIELD_SETS[name]))
+        for m in ranked
+    ]
+
+
+def _hydrate_similar(ctx, ranked):
+    # Per-request fields are appended to the cached card bytes
+    fragments = _card_fragments(ctx, ranked)
+    return [
+        extend_object(fragment, movie_cards.project(m, ['score', 'common_genres', 'common_cast']))
+        for fragment, m in zip(fragments, ranked)
+    ]
+
+
+similar_pipeline = RecommendationPipeline(
+    'more_like_this',
+    generators=[
+        CandidateGenerator('content', _similar_content_candidates, budget_ms=1500),
+        CandidateGenerator('collaborative', _similar_collab_candidates, budget_ms=300)
+    ],
+    merger=_merge_similar,
+    scorer=_score_similar,
+    hydrator=_hydrate_similar,
+    fallback=_popular_candidates,
+    budgets={"merge": 20, "score": 20, "hydrate": 10},
+    deadline_ms=3000
+)
+
+
+@rec_routes.cli.command('export-interactions')
+@click.argument('consumer')
+@click.argument('output', type=click.File('a'))
+def export_interactions(consumer, output):
+    """Append interaction events since CONSUMER's checkpoint to OUTPUT as JSON lines."""
+    def write_batch(batch):
+        for event in batch:
+            # A copy, the batch's ObjectIds are checkpointed after this
+            output.write(json.dumps({**event, '_id': str(event['_id'])}, default=str) + "\n")
+
+    count = interaction_log.stream(consumer, write_batch)
+    click.echo(f"Exported {count} interaction events for {consumer}")
+
+
 @rec_routes.route('/more-like-this/<int:movie_id>', methods=['GET'])
 @jwt_required(optional=True)
+@profiled('more_like_this')
 def get_similar_movies(movie_id):
     try:
-        movies_collection = db.get_movies_collection()
-        users_collection = db.get_users_collection()
-        current_movie = movies_collection.find_one({"id": movie_id})
+        with stage('fetch'):
+            current_movie = catalog_reads(db.get_movies_collection()).find_one({"id": movie_id}, SCORING_PROJECTION, **find_options('detail'))
 
         if not current_movie:
-            fallback = list(movies_collection.find(
-                {"poster_path": {"$exists": True}},
-                {
-                    "_id": 0,
-                    "id": 1,
-                    "title": 1,
-                    "poster_path": 1,
-                    "vote_average": 1,
-                    "genres": 1,
-                    "backdrop_path": 1,
-                    "release_year": 1,
-                    "overview": 1,
-                    "vote_count": 1,
-                    "trailer_url": 1
-                }
-            ).sort("vote_count", -1).limit(12))
-            return jsonify(fallback)
-
-        # --- Content-based filtering ---
-        all_movies = list(movies_collection.find({
-            "id": {"$ne": movie_id},
-            "poster_path": {"$exists": True}
-        }))
-
-        similar_movies = []
-        for movie in all_movies:
-            score = 0
-            # Genre similarity (Jaccard)
-            if 'genres' in current_movie and 'genres' in movie:
-                set1 = set(current_movie['genres'])
-                set2 = set(movie['genres'])
-                intersection = set1 & set2
-                union = set1 | set2
-                genre_score = (len(intersection) / len(union)) * 40 if union else 0
-                score += genre_score
-            # Director match
-            if current_movie.get('director_id') and movie.get('director_id'):
-                if current_movie['director_id'] == movie['director_id']:
-                    score += 20
-            # Cast similarity
-            if 'cast_ids' in current_movie and 'cast_ids' in movie:
-                common_cast = set(current_movie['cast_ids']) & set(movie['cast_ids'])
-                score += min(len(common_cast), 5) * 4
-            # Rating similarity
-            if 'vote_average' in current_movie and 'vote_average' in movie:
-                rating_diff = abs(current_movie['vote_average'] - movie['vote_average'])
-                score += max(0, 10 - rating_diff)
-            # Title similarity
-            title_sim = fuzz.token_set_ratio(current_movie.get('title', ''), movie.get('title', ''))
-            score += (title_sim / 100) * 10
-            # Overview similarity
-            overview_sim = fuzz.token_set_ratio(current_movie.get('overview', ''), movie.get('overview', ''))
-            score += (overview_sim / 100) * 5
-            # Recency bonus
-            try:
-                if abs(int(movie.get('release_year', 0)) - int(current_movie.get('release_year', 0))) <= 3:
-                    score += 3
-            except Exception:
-                pass
-
-            if score > 0:
-                similar_movies.append({
-                    "id": movie["id"],
-                    "title": movie["title"],
-                    "poster_path": movie.get("poster_path"),
-                    "vote_average": movie.get("vote_average", None),
-                    "genres": movie.get("genres", []),
-                    "backdrop_path": movie.get("backdrop_path"),
-                    "release_year": movie.get("release_year"),
-                    "overview": movie.get("overview"),
-                    "vote_count": movie.get("vote_count"),
-                    "trailer_url": movie.get("trailer_url"),
-                    "score": round(score, 2),
-                    "common_genres": list(set(current_movie.get('genres', [])) & set(movie.get('genres', []))),
-                    "common_cast": len(set(current_movie.get('cast_ids', [])) & set(movie.get('cast_ids', [])))
-                })
-
-        # --- Collaborative filtering ---
-        collab_movies = []
+            return jsonify(_popular_candidates({})[:12])
+
         user_id = get_jwt_identity()
-        if user_id:
-            similar_users = users_collection.find({"liked_movies": movie_id})
-            collab_movie_ids = set()
-            for sim_user in similar_users:
-                for mid in sim_user.get("liked_movies", []):
-                    if mid != movie_id:
-                        collab_movie_ids.add(mid)
-            if collab_movie_ids:
-                collab_movies = list(movies_collection.find(
-                    {"id": {"$in": list(collab_movie_ids)}, "poster_path": {"$exists": True}},
-                    {
-                        "_id": 0,
-                        "id": 1,
-                        "title": 1,
-                        "poster_path": 1,
-                        "vote_average": 1,
-                        "genres": 1,
-                        "backdrop_path": 1,
-                        "release_year": 1,
-                        "overview": 1,
-                        "vote_count": 1,
-                        "trailer_url": 1
-                    }
-                ))
-
-        # --- Hybrid: Merge, deduplicate, and rank ---
-        all_results = {m['id']: m for m in similar_movies}
-        for m in collab_movies:
-            if m['id'] not in all_results:
-                m['score'] = 100  # Boost collaborative results
-                all_results[m['id']] = m
-            else:
-                all_results[m['id']]['score'] += 30  # Boost if both
-
-        results = sorted(all_results.values(), key=lambda x: x.get('score', 0), reverse=True)[:12]
-
-        if not results:
-            fallback = list(movies_collection.find(
-                {"id": {"$ne": movie_id}, "poster_path": {"$exists": True}},
-                {
-                    "_id": 0,
-                    "id": 1,
-                    "title": 1,
-                    "poster_path": 1,
-                    "vote_average": 1,
-                    "genres": 1,
-                    "backdrop_path": 1,
-                    "release_year": 1,
-                    "overview": 1,
-                    "vote_count": 1,
-                    "trailer_url": 1
-                }
-            ).sort("vote_count", -1).limit(12))
-            return jsonify(fallback)
-
-        return jsonify(results)
+        with stage('fetch.user'):
+            ctx = {
+                "movie_id": movie_id,
+                "current_movie": current_movie,
+                "user_id": user_id,
+                "disliked": get_disliked_ids(user_id),
+                "profile_vector": get_profile_vector(user_id, request.args.get('profile', 0, type=int)),
+                "fields": request.args.get('fields')
+            }
+        return raw_response(list_body(similar_pipeline.run(ctx).results))
 
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         import traceback
         print(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
 
+# --- Chat pipeline ---
+def _chat_intent_candidates(ctx):
+    movies_collection = catalog_reads(db.get_movies_collection())
+    movies = list(movies_collection.find(
+        ctx['mongo_filter'],
+        MOVIE_CARD_PROJECTION,
+        **find_options('recommendations.candidates')
+    ).sort(ctx['sort_criteria']).limit(24 * OVERSAMPLE_FACTOR))
+    # Exclude disliked movies in-process, the query stays the same size for every user
+    return exclude_disliked(movies, ctx['disliked'], 24)
+
+
+def _chat_relaxed_candidates(ctx):
+    # Relaxed filter (drop genre, keep language), fetched alongside the strict query
+    # and only used by the merger when the strict query comes back empty
+    if not ctx['found_languages']:
+        return []
+    movies = list(catalog_reads(db.get_movies_collection()).find(
+        {"original_language": {"$in": ctx['found_languages']}, "poster_path": {"$exists": True}},
+        MOVIE_CARD_PROJECTION,
+        **find_options('recommendations.candidates')
+    ).sort(ctx['sort_criteria']).limit(24 * OVERSAMPLE_FACTOR))
+    return exclude_disliked(movies, ctx['disliked'], 24)
+
+
+def _chat_collab_candidates(ctx):
+    liked_set = ctx['liked_ids']
+    if not liked_set:
+        return []
+    similar_users = catalog_reads(db.get_users_collection()).find(
+        {"liked_movies": {"$in": list(liked_set)}, "_id": {"$ne": ObjectId(ctx['user_id'])}},
+        {"liked_movies": 1},
+        **find_options('recommendations.co_liked')
+    )
+    collab_movie_ids = set()
+    for sim_user in similar_users:
+        for mid in sim_user.get("liked_movies", []):
+            if mid not in liked_set and mid not in ctx['disliked']:
+                collab_movie_ids.add(mid)
+    if not collab_movie_ids:
+        return []
+    return list(catalog_reads(db.get_movies_collection()).find(
+        {"id": {"$in": list(collab_movie_ids)}, "poster_path": {"$exists": True}},
+        MOVIE_CARD_PROJECTION,
+        **find_options('recommendations.candidates')
+    ).sort(ctx['sort_criteria']).limit(24))
+
+
+def _chat_popular_candidates(ctx):
+    # Fallback: if nothing found, return trending/popular movies
+    results = list(catalog_reads(db.get_movies_collection()).find(
+        {"vote_count": {"$gt": 5}, "poster_path": {"$exists": True}},
+        MOVIE_CARD_PROJECTION,
+        **find_options('recommendations.candidates')
+    ).sort(ctx['sort_criteria']).limit(12 * OVERSAMPLE_FACTOR))
+    return exclude_disliked(results, ctx['disliked'], 12)
+
+
+def _merge_chat(ctx, sources):
+    # --- If nothing found, try relaxing filters (e.g., drop genre, keep language) ---
+    movies = sources.get('intent') or sources.get('relaxed', [])
+    all_movies = {m['id']: m for m in movies}
+    for m in sources.get('collaborative', []):
+        all_movies[m['id']] = m
+    return list(all_movies.values())
+
+
+def _score_chat(ctx, candidates):
+    if not ctx.get('used_fallback'):
+        # --- Personalization: re-rank with the cached profile vector ---
+        rerank(candidates, ctx['profile_vector'], score_key='_rank')
+    return candidates[:12]
+
+
+def _hydrate_chat(ctx, ranked):
+    # --- Mark liked/disliked in results for chatbot UI ---
+    fragments = _card_fragments(ctx, ranked)
+    return [
+        extend_object(fragment, {"liked": m['id'] in ctx['liked_ids'], "disliked": m['id'] in ctx['disliked']})
+        for fragment, m in zip(fragments, ranked)
+    ]
+
+
+chat_pipeline = RecommendationPipeline(
+    'chat',
+    generators=[
+        CandidateGenerator('intent', _chat_intent_candidates, budget_ms=500),
+        CandidateGenerator('relaxed', _chat_relaxed_candidates, budget_ms=500),
+        CandidateGenerator('collaborative', _chat_collab_candidates, budget_ms=500)
+    ],
+    merger=_merge_chat,
+    scorer=_score_chat,
+    hydrator=_hydrate_chat,
+    fallback=_chat_popular_candidates,
+    budgets={"merge": 10, "score": 10, "hydrate": 10},
+    deadline_ms=1500
+)
+
+
 @rec_routes.route('/chat', methods=['POST'])
 @jwt_required(optional=True)
+@profiled('chat')
 def chat_recommendations():
     import random
     try:
@@ -247,6 +523,12 @@ def chat_recommendations():
         query = (data.get('query') or '').lower()
         preferences = data.get('preferences', {})
         user_id = get_jwt_identity()
+        try:
+            profile_idx = int(preferences.get('profile_idx', data.get('profile_idx', 0)) or 0)
+        except (TypeError, ValueError):
+            profile_idx = -1
+        if profile_idx < 0:
+            return jsonify({"error": "profile_idx must be a non-negative integer"}), 400
 
         # --- General Q&A: handle before movie logic ---
         general_response = check_general_qa(query)
@@ -262,9 +544,8 @@ def chat_recommendations():
                 "disliked_movies": []
             })
 
-        movies_collection = db.get_movies_collection()
-        users_collection = db.get_users_collection()
-        people_collection = db.get_people_collection()
+        people_collection = catalog_reads(db.get_people_collection())
+        lap('parse')
 
         # --- Mood extraction (multi-mood, robust) ---
         mood_keywords = {}
@@ -311,8 +592,9 @@ def chat_recommendations():
                 found_languages.append(lang)
 
         # --- Person extraction (multiple, fuzzy, cast & director) ---
+        from fuzzywuzzy import fuzz
         found_people = []
-        all_people = list(people_collection.find({}, {"name": 1, "id": 1}))
+        all_people = list(people_collection.find({}, {"name": 1, "id": 1}, **find_options('search')))
         for person in all_people:
             pname = person['name'].lower()
             if fuzz.partial_ratio(pname, query) > 85 or fuzz.partial_ratio(query, pname) > 85:
@@ -321,18 +603,13 @@ def chat_recommendations():
                 if fuzz.partial_ratio(pname, preferences.get('person', '').lower()) > 85:
                     found_people.append(person['name'])
 
+        lap('extract')
+
         # --- Like/Dislike extraction for chatbot ---
-        liked_movies = []
-        disliked_movies = []
-        user_liked_ids = set()
-        user_disliked_ids = set()
-        if user_id:
-            user = users_collection.find_one({"_id": user_id})
-            if user:
-                user_liked_ids = set(user.get("liked_movies", []))
-                user_disliked_ids = set(user.get("disliked_movies", []))
-                liked_movies = list(user_liked_ids)
-                disliked_movies = list(user_disliked_ids)
+        user_liked_ids = get_liked_ids(user_id)
+        user_disliked_ids = get_disliked_ids(user_id)
+        liked_movies = list(user_liked_ids)
+        disliked_movies = list(user_disliked_ids)
 
         # --- Build MongoDB filter ---
         filters = []
@@ -351,9 +628,6 @@ def chat_recommendations():
         for mood in detected_moods:
             if mood in MOOD_GENRE_MAP:
                 filters.append({"genres": {"$in": MOOD_GENRE_MAP[mood]}})
-        # Exclude disliked movies for logged-in users
-        if user_disliked_ids:
-            filters.append({"id": {"$nin": list(user_disliked_ids)}})
 
         mongo_filter = {"vote_count": {"$gt": 5}, "poster_path": {"$exists": True}}
         if filters:
@@ -366,92 +640,18 @@ def chat_recommendations():
         elif "new" in query or "latest" in query:
             sort_criteria = [("release_year", -1), ("vote_count", -1)]
 
-        # --- Query movies (content-based) ---
-        movies = list(movies_collection.find(
-            mongo_filter,
-            {
-                "_id": 0,
-                "id": 1,
-                "title": 1,
-                "poster_path": 1,
-                "backdrop_path": 1,
-                "release_year": 1,
-                "vote_average": 1,
-                "vote_count": 1,
-                "genres": 1,
-                "overview": 1,
-                "trailer_url": 1,
-                "original_language": 1
-            }
-        ).sort(sort_criteria).limit(24))
-
-        # --- If nothing found, try relaxing filters (e.g., drop genre, keep language) ---
-        if not movies and found_languages:
-            relaxed_filter = {"original_language": {"$in": found_languages}, "poster_path": {"$exists": True}}
-            if user_disliked_ids:
-                relaxed_filter["id"] = {"$nin": list(user_disliked_ids)}
-            movies = list(movies_collection.find(
-                relaxed_filter,
-                {
-                    "_id": 0,
-                    "id": 1,
-                    "title": 1,
-                    "poster_path": 1,
-                    "backdrop_path": 1,
-                    "release_year": 1,
-                    "vote_average": 1,
-                    "vote_count": 1,
-                    "genres": 1,
-                    "overview": 1,
-                    "trailer_url": 1,
-                    "original_language": 1
-                }
-            ).sort(sort_criteria).limit(24))
-
-        # --- Collaborative filtering (for logged-in users) ---
-        collab_movies = []
-        if user_id:
-            user = users_collection.find_one({"_id": user_id})
-            if user and user.get("liked_movies"):
-                similar_users = users_collection.find({
-                    "liked_movies": {"$in": user["liked_movies"]},
-                    "_id": {"$ne": user_id}
-                })
-                liked_set = set(user["liked_movies"])
-                collab_movie_ids = set()
-                for sim_user in similar_users:
-                    for mid in sim_user.get("liked_movies", []):
-                        if mid not in liked_set and mid not in user_disliked_ids:
-                            collab_movie_ids.add(mid)
-                if collab_movie_ids:
-                    collab_movies = list(movies_collection.find(
-                        {"id": {"$in": list(collab_movie_ids)}, "poster_path": {"$exists": True}},
-                        {
-                            "_id": 0,
-                            "id": 1,
-                            "title": 1,
-                            "poster_path": 1,
-                            "backdrop_path": 1,
-                            "release_year": 1,
-                            "vote_average": 1,
-                            "vote_count": 1,
-                            "genres": 1,
-                            "overview": 1,
-                            "trailer_url": 1,
-                            "original_language": 1
-                        }
-                    ).sort(sort_criteria).limit(24))
-
-        # --- Hybrid: Merge, deduplicate, and rank ---
-        all_movies = {m['id']: m for m in movies}
-        for m in collab_movies:
-            all_movies[m['id']] = m
-        results = list(all_movies.values())[:12]
-
-        # --- Mark liked/disliked in results for chatbot UI ---
-        for m in results:
-            m['liked'] = m['id'] in user_liked_ids
-            m['disliked'] = m['id'] in user_disliked_ids
+        run = chat_pipeline.run({
+            "user_id": user_id,
+            "mongo_filter": mongo_filter,
+            "sort_criteria": sort_criteria,
+            "found_languages": found_languages,
+            "liked_ids": user_liked_ids,
+            "disliked": user_disliked_ids,
+            "profile_vector": get_profile_vector(user_id, profile_idx),
+            "fields": data.get('fields')
+        })
+        results = run.results
+        lap('pipeline')
 
         # --- Dynamic, conversational message (short and friendly) ---
         greetings = [
@@ -481,40 +681,17 @@ def chat_recommendations():
 
         if message_parts:
             message = f"{random.choice(greetings)} Here are some " + ", ".join(message_parts) + "!"
-        elif user_id and results:
+        elif user_id and not run.used_fallback:
             message = f"{random.choice(greetings)} Based on your likes and similar users, you might enjoy these movies!"
         else:
             message = f"{random.choice(greetings)} Here are some popular movies you might enjoy!"
 
-        # Fallback: if nothing found, return trending/popular movies
-        if not results:
-            fallback_filter = {"vote_count": {"$gt": 5}, "poster_path": {"$exists": True}}
-            if user_disliked_ids:
-                fallback_filter["id"] = {"$nin": list(user_disliked_ids)}
-            results = list(movies_collection.find(
-                fallback_filter,
-                {
-                    "_id": 0,
-                    "id": 1,
-                    "title": 1,
-                    "poster_path": 1,
-                    "backdrop_path": 1,
-                    "release_year": 1,
-                    "vote_average": 1,
-                    "vote_count": 1,
-                    "genres": 1,
-                    "overview": 1,
-                    "trailer_url": 1,
-                    "original_language": 1
-                }
-            ).sort(sort_criteria).limit(12))
-            for m in results:
-                m['liked'] = m['id'] in user_liked_ids
-                m['disliked'] = m['id'] in user_disliked_ids
+        if run.used_fallback:
             message = "Sorry, I couldn't find any matches for your request. Here are some popular movies instead!"
+        lap('respond')
 
+        # Results are already serialized card fragments
         response = {
-            "results": results,
             "found_genres": found_genres,
             "found_people": found_people,
             "detected_moods": detected_moods,
@@ -524,8 +701,10 @@ def chat_recommendations():
             "message": message
         }
 
-        return jsonify(response)
+        return raw_response(extend_object(b'{"results":' + list_body(results) + b'}', response))
 
+    except OVERLOAD_ERRORS:
+        return overloaded()
     except Exception as e:
         import traceback
         print(traceback.format_exc())
@@ -0,0 +1,54 @@
+import json
+from flask import current_app
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON encoding for responses: orjson when installed, the standard library
+# otherwise. Keys keep document order, so pre-serialized fragments (see
+# movie_cards.fragments) can be concatenated into list responses and give the
+# same bytes as serializing the whole list.
+
+if orjson is not None:
+    # Dates still go through Flask's encoder, which formats them as HTTP dates
+    _ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj):
+    # Compact UTF-8 bytes
+    if orjson is not None:
+        return orjson.dumps(obj, default=DefaultJSONProvider.default, option=_ORJSON_OPTIONS)
+    return json.dumps(obj, default=DefaultJSONProvider.default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class JSONProvider(DefaultJSONProvider):
+    # Makes jsonify use dumps() above
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(dumps(obj) + b"\n", mimetype=self.mimetype)
+
+
+def list_body(fragments):
+    return b"[" + b",".join(fragments) + b"]"
+
+
+def extend_object(fragment, extra):
+    # Appends the keys of `extra` to a serialized object
+    if not extra:
+        return fragment
+    if fragment == b"{}":
+        return dumps(extra)
+    return fragment[:-1] + b"," + dumps(extra)[1:]
+
+
+def raw_response(body, status=200):
+    # A JSON response from already serialized bytes
+    return current_app.response_class(body + b"\n", status=status, mimetype="application/json")
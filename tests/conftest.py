@@ -0,0 +1,52 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# The mongomock stand-in provides `database` and `models.user`, so it has to be
+# installed before any app module is imported
+from benchmarks import stand_in  # noqa: E402
+
+bench_db = stand_in.install()
+
+import cache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    database = bench_db.db
+    for name in database.list_collection_names():
+        database[name].delete_many({})
+    for registered in cache.CACHES.values():
+        registered.clear()
+    yield
+
+
+@pytest.fixture
+def db():
+    return bench_db
+
+
+@pytest.fixture
+def app():
+    from app_factory import create_app
+    return create_app({"JWT_SECRET_KEY": "test-secret-key-test-secret-key-0000", "WARMUP_ENABLED": False})
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app, db):
+    from flask_jwt_extended import create_access_token
+    result = db.get_users_collection().insert_one({
+        "name": "Test", "email": "test@example.com", "profiles": [{"name": "Test"}],
+        "liked_movies": [], "disliked_movies": []
+    })
+    with app.app_context():
+        token = create_access_token(identity=str(result.inserted_id))
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip('quart')
+
+import cache  # noqa: E402
+from async_database import ThreadedAsyncDB, set_async_db  # noqa: E402
+from benchmarks import catalog  # noqa: E402
+
+
+@pytest.fixture
+def seeded(db):
+    catalog.generate(db, movies=200, people=60, users=5, seed=3)
+    return db
+
+
+@pytest.fixture
+def async_client(db):
+    from quart import Quart
+    from async_routes import async_movie_routes, async_people_routes
+    set_async_db(ThreadedAsyncDB(db))
+    app = Quart(__name__)
+    app.register_blueprint(async_movie_routes, url_prefix='/movies')
+    app.register_blueprint(async_people_routes, url_prefix='/people')
+    yield app.test_client()
+    set_async_db(None)
+
+
+@pytest.fixture
+def flask_client():
+    from app_factory import create_app
+    app = create_app({"JWT_SECRET_KEY": "test-secret-key-test-secret-key-0000", "WARMUP_ENABLED": False})
+    return app.test_client()
+
+
+def _get(client, path):
+    async def get():
+        response = await client.get(path)
+        return response.status_code, await response.get_json()
+    return asyncio.run(get())
+
+
+@pytest.mark.parametrize('path', ['/movies/1', '/movies/57', '/movies/999999', '/people/popular'])
+def test_async_views_match_the_flask_views(seeded, async_client, flask_client, path):
+    expected = flask_client.get(path)
+    # Computed by the async view, not read back from the sync view's cache
+    for registered in cache.CACHES.values():
+        registered.clear()
+    assert _get(async_client, path) == (expected.status_code, expected.get_json())
@@ -0,0 +1,204 @@
+import os
+import threading
+import time
+
+import pytest
+
+from cache import LRUCache
+
+
+def _blocking(started, release, value):
+    def compute():
+        started.set()
+        release.wait(5)
+        return value
+    return compute
+
+
+def _start(fn, *args):
+    thread = threading.Thread(target=fn, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_concurrent_misses_compute_once():
+    lru = LRUCache('test_coalesce', maxsize=10)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+    results = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'value'
+
+    leader = _start(lambda: results.append(lru.get_or_compute('k', compute)))
+    started.wait(5)
+    followers = [_start(lambda: results.append(lru.get_or_compute('k', compute))) for _ in range(4)]
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader, *followers]:
+        thread.join(5)
+
+    assert calls == [1]
+    assert results == ['value'] * 5
+    assert lru.stats()['coalesced'] == 4
+    assert lru.get('k') == 'value'
+
+
+def test_leader_error_reaches_followers():
+    lru = LRUCache('test_coalesce_error', maxsize=10)
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def compute():
+        started.set()
+        release.wait(5)
+        raise ValueError('boom')
+
+    def call():
+        try:
+            lru.get_or_compute('k', compute)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [_start(call)]
+    started.wait(5)
+    threads.append(_start(call))
+    time.sleep(0.05)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 2
+    assert lru.get('k') is None
+
+
+def test_follower_wait_times_out():
+    lru = LRUCache('test_timeout', maxsize=10)
+    started, release = threading.Event(), threading.Event()
+    leader = _start(lru.get_or_compute, 'k', _blocking(started, release, 'value'))
+    started.wait(5)
+
+    start = time.monotonic()
+    with pytest.raises(TimeoutError):
+        lru.get_or_compute('k', lambda: 'other', timeout=0.05)
+    assert time.monotonic() - start < 1
+
+    release.set()
+    leader.join(5)
+    assert lru.get('k') == 'value'
+
+
+def test_expired_entry_served_while_refreshing():
+    lru = LRUCache('test_stale', maxsize=10, ttl=0.05, stale_ttl=5)
+    lru.set('k', 'old')
+    time.sleep(0.1)
+    refreshed = threading.Event()
+
+    def compute():
+        refreshed.set()
+        return 'new'
+
+    assert lru.get_or_compute('k', compute) == 'old'
+    assert refreshed.wait(5)
+    for _ in range(50):
+        if lru.get('k') == 'new':
+            break
+        time.sleep(0.01)
+    assert lru.get('k') == 'new'
+    assert lru.stats()['stale_hits'] == 1
+
+
+def test_entry_past_stale_window_is_recomputed():
+    lru = LRUCache('test_stale_expired', maxsize=10, ttl=0.05, stale_ttl=0.05)
+    lru.set('k', 'old')
+    time.sleep(0.15)
+    assert lru.get_or_compute('k', lambda: 'new') == 'new'
+
+
+def test_failed_refresh_keeps_stale_entry():
+    lru = LRUCache('test_stale_error', maxsize=10, ttl=0.05, stale_ttl=5)
+    lru.set('k', 'old')
+    time.sleep(0.1)
+
+    def compute():
+        raise ValueError('boom')
+
+    assert lru.get_or_compute('k', compute) == 'old'
+    time.sleep(0.1)
+    # Still served, and the next request starts another refresh
+    assert lru.get_or_compute('k', lambda: 'new') == 'old'
+
+
+def test_clear_during_compute_discards_result():
+    lru = LRUCache('test_generation', maxsize=10)
+    started, release = threading.Event(), threading.Event()
+    results = []
+    thread = _start(lambda: results.append(lru.get_or_compute('k', _blocking(started, release, 'before'))))
+    started.wait(5)
+    lru.clear()
+    release.set()
+    thread.join(5)
+
+    # The caller still gets its value, later readers recompute
+    assert results == ['before']
+    assert lru.get('k') is None
+    assert lru.get_or_compute('k', lambda: 'after') == 'after'
+
+
+def test_delete_during_compute_only_discards_that_key():
+    lru = LRUCache('test_delete', maxsize=10)
+    started_a, release_a = threading.Event(), threading.Event()
+    started_b, release_b = threading.Event(), threading.Event()
+    a = _start(lru.get_or_compute, 'a', _blocking(started_a, release_a, 'a'))
+    b = _start(lru.get_or_compute, 'b', _blocking(started_b, release_b, 'b'))
+    started_a.wait(5)
+    started_b.wait(5)
+    lru.delete('a')
+    release_a.set()
+    release_b.set()
+    a.join(5)
+    b.join(5)
+
+    assert lru.get('a') is None
+    assert lru.get('b') == 'b'
+
+
+def test_lru_eviction():
+    lru = LRUCache('test_eviction', maxsize=2)
+    lru.set('a', 1)
+    lru.set('b', 2)
+    lru.get('a')
+    lru.set('c', 3)
+    assert lru.get('a') == 1
+    assert lru.get('b') is None
+    assert lru.get('c') == 3
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_worker_refreshes_stale_entries():
+    lru = LRUCache('test_fork_refresh', maxsize=10, ttl=0.05, stale_ttl=5)
+    lru.set('k', 'old')
+    time.sleep(0.1)
+    # Starts the refresh pool in this process
+    assert lru.get_or_compute('k', lambda: 'new') == 'old'
+    lru.set('k', 'old')
+    time.sleep(0.1)
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            lru.get_or_compute('k', lambda: 'child')
+            for _ in range(100):
+                if lru.get('k') == 'child':
+                    break
+                time.sleep(0.01)
+            os.write(write_fd, repr(lru.get('k')).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 1024) == b"'child'"
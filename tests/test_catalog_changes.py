@@ -0,0 +1,32 @@
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+import catalog_changes
+
+
+def _record(db, seconds_ago, ids):
+    # A change as another process publishes it, with its client-side _id
+    when = datetime.utcnow() - timedelta(seconds=seconds_ago)
+    db.get_movies_collection().database[catalog_changes.CHANGES_COLLECTION].insert_one({
+        "_id": ObjectId.from_datetime(when), "collection": "movies", "kind": "updated", "ids": ids, "ts": when
+    })
+
+
+def test_poll_does_not_pass_a_change_committed_late(db, monkeypatch):
+    seen = []
+    monkeypatch.setattr(catalog_changes, '_subscribers', [lambda collection, kind, ids: seen.extend(ids)])
+    monkeypatch.setattr(catalog_changes, '_last_seen_id', None)
+    _record(db, 60, [1])
+    assert catalog_changes.poll() == 0
+
+    _record(db, 30, [2])
+    _record(db, 1, [4])
+    assert catalog_changes.poll() == 1
+    assert seen == [2]
+
+    # Published with an earlier _id than [4], but committed after the last poll
+    _record(db, 2, [3])
+    monkeypatch.setattr(catalog_changes, 'READ_LAG', timedelta(seconds=-5))
+    assert catalog_changes.poll() == 2
+    assert seen == [2, 3, 4]
@@ -0,0 +1,85 @@
+import json
+
+import catalog_changes
+import catalog_ingest
+
+
+def _write(path, docs):
+    with open(path, 'w', encoding='utf-8') as f:
+        for doc in docs:
+            f.write(json.dumps(doc) + '\n')
+    return str(path)
+
+
+def _movies(count):
+    return [
+        {"id": i, "title": f"Movie {i}", "genres": [{"name": "Drama"}], "vote_average": 7.0, "vote_count": 100}
+        for i in range(1, count + 1)
+    ]
+
+
+def _changes(db, kind):
+    changes = db.get_movies_collection().database[catalog_changes.CHANGES_COLLECTION]
+    return sorted(i for change in changes.find({"collection": "movies", "kind": kind}) for i in change["ids"])
+
+
+def test_reimport_only_writes_changed_documents(db, tmp_path):
+    movies = _movies(6)
+    path = _write(tmp_path / 'movies.json', movies)
+    stats = catalog_ingest.ingest('movies', path, batch_size=2, workers=2)
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (6, 0, 0)
+    stored = db.get_movies_collection().find_one({"id": 1})
+    assert stored[catalog_ingest.HASH_FIELD] == catalog_ingest.content_hash(
+        {k: v for k, v in stored.items() if k not in ('_id', catalog_ingest.HASH_FIELD)}
+    )
+
+    stats = catalog_ingest.ingest('movies', path, batch_size=2, workers=2)
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (0, 0, 6)
+
+    movies[2]['vote_average'] = 8.5
+    path = _write(tmp_path / 'movies.json', movies)
+    stats = catalog_ingest.ingest('movies', path, batch_size=2, workers=2)
+    assert (stats['inserted'], stats['updated'], stats['unchanged']) == (0, 1, 5)
+    assert db.get_movies_collection().find_one({"id": 3})['vote_average'] == 8.5
+    assert _changes(db, 'updated') == [3]
+    assert _changes(db, 'inserted') == [1, 2, 3, 4, 5, 6]
+
+
+def test_invalid_documents_are_skipped(db, tmp_path):
+    path = _write(tmp_path / 'movies.json', [{"id": 1, "title": "Movie 1"}, {"id": "x", "title": "Bad"}, {"id": 2}])
+    stats = catalog_ingest.ingest('movies', path)
+    assert stats['inserted'] == 1
+    assert stats['invalid'] == 2
+
+
+def test_delete_missing(db, tmp_path):
+    catalog_ingest.ingest('movies', _write(tmp_path / 'movies.json', _movies(4)))
+    stats = catalog_ingest.ingest('movies', _write(tmp_path / 'movies.json', _movies(2)), delete=True)
+    assert stats['deleted'] == 2
+    assert sorted(m['id'] for m in db.get_movies_collection().find()) == [1, 2]
+    assert _changes(db, 'deleted') == [3, 4]
+
+
+def test_json_array_and_json_lines_parse_the_same(tmp_path):
+    movies = _movies(3)
+    array_path = tmp_path / 'array.json'
+    array_path.write_text(json.dumps(movies), encoding='utf-8')
+    lines_path = _write(tmp_path / 'lines.json', movies)
+    assert list(catalog_ingest.iter_documents(str(array_path))) == list(catalog_ingest.iter_documents(lines_path))
+
+
+def test_duplicate_ids_keep_the_last_version(db, tmp_path):
+    versions = [{"id": 5, "title": f"Version {n}", "vote_count": n} for n in range(8)]
+    stats = catalog_ingest.ingest('movies', _write(tmp_path / 'movies.json', versions), batch_size=1, workers=4)
+    assert stats['inserted'] == 1
+    stored = list(db.get_movies_collection().find({"id": 5}))
+    assert len(stored) == 1
+    assert stored[0]['title'] == 'Version 7'
+
+
+def test_changes_expire(db):
+    catalog_changes.publish('movies', 'updated', [1])
+    changes = db.get_movies_collection().database[catalog_changes.CHANGES_COLLECTION]
+    ttl = [index for index in changes.index_information().values() if 'expireAfterSeconds' in index]
+    assert ttl and ttl[0]['key'] == [('ts', 1)]
+    assert ttl[0]['expireAfterSeconds'] == catalog_changes.RETENTION_S
@@ -0,0 +1,82 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import cache  # noqa: E402
+import catalog_changes  # noqa: E402
+import catalog_snapshot  # noqa: E402
+import catalog_store  # noqa: E402
+from benchmarks import catalog  # noqa: E402
+
+MOVIE_IDS = [1, 2, 3, 17, 50, 123, 250, 399]
+
+
+@pytest.fixture
+def seeded(db):
+    catalog.generate(db, movies=400, people=100, users=20, seed=7)
+    return db
+
+
+@pytest.fixture
+def snapshot_dir(tmp_path):
+    yield str(tmp_path / 'snapshots')
+    # Later tests run without a snapshot
+    catalog_snapshot.load(str(tmp_path / 'empty'))
+
+
+def _load(snapshot_dir):
+    import os
+    os.makedirs(snapshot_dir, exist_ok=True)
+    catalog_snapshot.build(snapshot_dir)
+    catalog_snapshot.load(snapshot_dir)
+    return catalog_store.get_store()
+
+
+def _clear_caches():
+    for registered in cache.CACHES.values():
+        registered.clear()
+
+
+def test_store_row_counts_match_the_collection(seeded, snapshot_dir):
+    store = _load(snapshot_dir)
+    movies = list(seeded.get_movies_collection().find({}, {"_id": 0, "id": 1, "genres": 1, "cast_ids": 1}).sort("id", 1))
+    assert store.movie_ids.tolist() == [m['id'] for m in movies]
+
+    code = store.genre_code('Drama')
+    expected = [1 if 'Drama' in m['genres'] else 0 for m in movies]
+    assert store.row_counts('movie_genres', {code}).tolist() == expected
+
+    cast = {1, 2, 3, 5, 8}
+    expected = [len(cast & set(m['cast_ids'])) for m in movies]
+    assert store.row_counts('movie_cast', cast).tolist() == expected
+
+
+def test_shortlist_gives_the_same_recommendations(seeded, snapshot_dir, client):
+    without = {movie_id: client.get(f'/recommendations/more-like-this/{movie_id}').get_json() for movie_id in MOVIE_IDS}
+    assert catalog_store.get_store() is None
+
+    assert _load(snapshot_dir) is not None
+    _clear_caches()
+    with_store = {movie_id: client.get(f'/recommendations/more-like-this/{movie_id}').get_json() for movie_id in MOVIE_IDS}
+
+    assert with_store == without
+    assert all(without.values())
+
+
+def test_popular_people_match_with_and_without_snapshot(seeded, snapshot_dir, client):
+    without = client.get('/people/popular').get_json()
+    _load(snapshot_dir)
+    _clear_caches()
+    assert client.get('/people/popular').get_json() == without
+
+
+def test_catalog_change_stops_serving_the_snapshot(seeded, snapshot_dir):
+    assert _load(snapshot_dir) is not None
+    catalog_changes.publish('movies', 'updated', [1])
+    assert catalog_store.get_store() is None
+
+    # A build after the change is served again
+    assert _load(snapshot_dir) is not None
+    # Changes to other collections do not matter
+    catalog_changes.publish('users', 'updated', [1])
+    assert catalog_store.get_store() is not None
@@ -0,0 +1,17 @@
+import pytest
+
+
+def _chat(client, auth_headers, profile_idx):
+    return client.post('/recommendations/chat', headers=auth_headers,
+                       json={"query": "comedy", "preferences": {"profile_idx": profile_idx}})
+
+
+@pytest.mark.parametrize('profile_idx', ['abc', -1, [0]])
+def test_invalid_profile_idx_is_a_bad_request(client, auth_headers, profile_idx):
+    response = _chat(client, auth_headers, profile_idx)
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "profile_idx must be a non-negative integer"}
+
+
+def test_numeric_string_profile_idx_is_accepted(client, auth_headers):
+    assert _chat(client, auth_headers, '0').status_code == 200
@@ -0,0 +1,70 @@
+from bson import ObjectId
+
+import dislikes
+import profile_mutations
+import user_cache
+from dislikes import DislikeSet, exclude_disliked, get_disliked_ids
+
+
+def _user(db, disliked=(), liked=()):
+    result = db.get_users_collection().insert_one({
+        "name": "Test", "email": "test@example.com", "profiles": [{"name": "Test"}],
+        "liked_movies": list(liked), "disliked_movies": list(disliked)
+    })
+    return str(result.inserted_id)
+
+
+def test_dislike_set():
+    disliked = DislikeSet([5, 3, 3, 9])
+    assert list(disliked) == [3, 5, 9]
+    assert 5 in disliked and 4 not in disliked
+    disliked.add(4)
+    disliked.add(4)
+    disliked.discard(9)
+    disliked.discard(100)
+    assert list(disliked) == [3, 4, 5]
+
+
+def test_exclude_disliked():
+    movies = [{"id": i} for i in range(1, 7)]
+    assert exclude_disliked(movies, DislikeSet([2, 4]), limit=3) == [{"id": 1}, {"id": 3}, {"id": 5}]
+    assert exclude_disliked(movies, DislikeSet(), limit=2) == movies[:2]
+
+
+def test_loaded_from_the_user_document(db):
+    user_id = _user(db, disliked=[7, 3])
+    assert list(get_disliked_ids(user_id)) == [3, 7]
+    assert list(get_disliked_ids(None)) == []
+    assert list(get_disliked_ids(str(ObjectId()))) == []
+
+
+def test_bulk_dislike_and_like_update_the_cached_set(db):
+    user_id = _user(db, disliked=[3])
+    assert 3 in get_disliked_ids(user_id)
+
+    profile_mutations.apply_bulk_ops(user_id, [
+        {"op": "dislike", "movie_id": 8},
+        {"op": "like", "movie_id": 3}
+    ])
+    disliked = get_disliked_ids(user_id)
+    assert 8 in disliked and 3 not in disliked
+    assert db.get_users_collection().find_one({"_id": ObjectId(user_id)})['disliked_movies'] == [8]
+
+
+def test_follows_writes_from_other_workers(db):
+    user_id = _user(db, disliked=[3])
+    assert list(get_disliked_ids(user_id)) == [3]
+
+    # Another worker writes the document; this one only notices once its user entry expires
+    db.get_users_collection().update_one({"_id": ObjectId(user_id)}, {"$addToSet": {"disliked_movies": 11}})
+    assert list(get_disliked_ids(user_id)) == [3]
+    user_cache._users.delete(user_id)
+    assert list(get_disliked_ids(user_id)) == [3, 11]
+
+
+def test_invalidating_the_user_drops_the_entry(db):
+    user_id = _user(db, disliked=[3])
+    get_disliked_ids(user_id)
+    assert dislikes._dislikes.get(user_id) is not None
+    user_cache.invalidate_user(user_id)
+    assert dislikes._dislikes.get(user_id) is None
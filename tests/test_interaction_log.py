@@ -0,0 +1,42 @@
+import json
+from datetime import timedelta
+
+import pytest
+from bson import ObjectId
+
+import interaction_log
+
+
+@pytest.fixture(autouse=True)
+def no_read_lag(monkeypatch):
+    # Events appended by the test are readable straight away
+    monkeypatch.setattr(interaction_log, 'READ_LAG', timedelta(seconds=-5))
+
+
+def _export(app, consumer, path):
+    result = app.test_cli_runner().invoke(args=['recommendations', 'export-interactions', consumer, str(path)])
+    assert result.exit_code == 0, result.output
+    return result.output
+
+
+def test_export_resumes_from_the_checkpoint(app, tmp_path):
+    path = tmp_path / 'events.jsonl'
+    interaction_log.append('u1', [{"type": "like", "movie_id": 1}, {"type": "dislike", "movie_id": 2}])
+    assert 'Exported 2' in _export(app, 'warehouse', path)
+    assert isinstance(interaction_log.load_checkpoint('warehouse'), ObjectId)
+
+    interaction_log.append('u1', [{"type": "like", "movie_id": 3}])
+    assert 'Exported 1' in _export(app, 'warehouse', path)
+    assert 'Exported 0' in _export(app, 'warehouse', path)
+
+    events = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [event['movie_id'] for event in events] == [1, 2, 3]
+    assert all(isinstance(event['_id'], str) for event in events)
+
+
+def test_string_checkpoints_still_load(db):
+    interaction_log.append('u1', [{"type": "like", "movie_id": 1}])
+    last_id = next(interaction_log.read_since())['_id']
+    interaction_log.save_checkpoint('old', str(last_id))
+    assert interaction_log.load_checkpoint('old') == last_id
+    assert list(interaction_log.read_since(interaction_log.load_checkpoint('old'))) == []
@@ -0,0 +1,31 @@
+import interaction_log
+
+
+def _logged(db):
+    database = db.get_users_collection().database
+    return [
+        (event['type'], event['movie_id'])
+        for name in database.list_collection_names() if name.startswith(interaction_log.PARTITION_PREFIX)
+        for event in database[name].find().sort("_id", 1)
+    ]
+
+
+def _post(client, auth_headers, events):
+    return client.post('/user/interactions', headers=auth_headers, json={"events": events})
+
+
+def test_only_matched_events_are_logged(db, client, auth_headers):
+    response = _post(client, auth_headers, [
+        {"type": "like", "movie_id": 1},
+        {"type": "watchlist_add", "movie_id": 2, "profile_idx": 0},
+        {"type": "watchlist_add", "movie_id": 3, "profile_idx": 5}
+    ])
+    assert response.status_code == 200
+    assert response.get_json()['matched'] == 2
+    assert _logged(db) == [('like', 1), ('watchlist_add', 2)]
+
+
+def test_batch_for_a_missing_profile_is_not_found(db, client, auth_headers):
+    response = _post(client, auth_headers, [{"type": "watchlist_add", "movie_id": 2, "profile_idx": 5}])
+    assert response.status_code == 404
+    assert _logged(db) == []
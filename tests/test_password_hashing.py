@@ -0,0 +1,15 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from password_hashing import _method_prefix
+
+
+@pytest.mark.parametrize('method', ['scrypt', 'scrypt:16384:8:1', 'pbkdf2', 'pbkdf2:sha1', 'pbkdf2:sha256:1000'])
+def test_prefix_matches_what_werkzeug_stores(method):
+    assert generate_password_hash('secret', method).split('$', 1)[0] == _method_prefix(method)
+
+
+@pytest.mark.parametrize('method', ['scrypt:65536', 'scrypt:65536:8', 'scrypt:a:b:c', 'pbkdf2:nope', 'pbkdf2:sha256:many', 'pbkdf2:sha256:1:2', 'argon2'])
+def test_methods_werkzeug_cannot_hash_are_rejected(method):
+    with pytest.raises(ValueError):
+        _method_prefix(method)
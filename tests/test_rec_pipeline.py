@@ -0,0 +1,117 @@
+import os
+import threading
+import time
+
+import pytest
+
+from cache import LRUCache
+from rec_pipeline import CandidateGenerator, RecommendationPipeline, remaining_s, stage_stats_snapshot
+
+
+def _pipeline(name, generators, deadline_ms=200, fallback=None):
+    return RecommendationPipeline(
+        name, generators,
+        merger=lambda ctx, sources: [m for source in sources.values() for m in source],
+        scorer=lambda ctx, merged: sorted(merged),
+        hydrator=lambda ctx, ranked: ranked,
+        fallback=fallback,
+        deadline_ms=deadline_ms
+    )
+
+
+def test_generators_past_the_deadline_are_dropped():
+    release = threading.Event()
+
+    def slow(ctx):
+        release.wait(5)
+        return [99]
+
+    pipeline = _pipeline('test_deadline', [
+        CandidateGenerator('fast', lambda ctx: [2, 1]),
+        CandidateGenerator('slow', slow)
+    ])
+    start = time.monotonic()
+    result = pipeline.run({})
+    release.set()
+
+    assert time.monotonic() - start < 1
+    assert result.results == [1, 2]
+    assert result.dropped == ['slow']
+    assert result.sources['slow'] == []
+    assert stage_stats_snapshot()['test_deadline']['generate.slow']['dropped'] == 1
+
+
+def test_fallback_only_when_every_source_is_empty():
+    pipeline = _pipeline('test_fallback', [CandidateGenerator('empty', lambda ctx: [])], fallback=lambda ctx: [7])
+    result = pipeline.run({})
+    assert result.used_fallback
+    assert result.results == [7]
+
+    pipeline = _pipeline('test_no_fallback', [CandidateGenerator('one', lambda ctx: [1])], fallback=lambda ctx: [7])
+    assert pipeline.run({}).results == [1]
+
+
+def test_failing_generator_is_an_empty_source():
+    def broken(ctx):
+        raise ValueError('boom')
+
+    pipeline = _pipeline('test_error', [CandidateGenerator('broken', broken), CandidateGenerator('ok', lambda ctx: [3])])
+    result = pipeline.run({})
+    assert result.results == [3]
+    assert result.dropped == []
+
+
+def test_generators_see_the_deadline():
+    seen = []
+    pipeline = _pipeline('test_remaining', [CandidateGenerator('g', lambda ctx: seen.append(remaining_s()))], deadline_ms=500)
+    pipeline.run({})
+    assert 0 < seen[0] <= 0.5
+    assert remaining_s() is None
+
+
+def test_coalesced_cache_wait_ends_at_the_deadline():
+    lru = LRUCache('test_pipeline_wait', maxsize=10)
+    started, release = threading.Event(), threading.Event()
+
+    def compute():
+        started.set()
+        release.wait(5)
+        return [1]
+
+    # Another request is computing the entry and takes longer than the deadline
+    leader = threading.Thread(target=lru.get_or_compute, args=('k', compute), daemon=True)
+    leader.start()
+    started.wait(5)
+    finished = threading.Event()
+
+    def waiting(ctx):
+        try:
+            return lru.get_or_compute('k', compute, timeout=remaining_s())
+        finally:
+            finished.set()
+
+    result = _pipeline('test_wait', [CandidateGenerator('cached', waiting)]).run({})
+    # The executor thread is released instead of waiting for the leader
+    assert finished.wait(1)
+    assert result.dropped == ['cached']
+    release.set()
+    leader.join(5)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_forked_worker_gets_its_own_executor():
+    pipeline = _pipeline('test_fork', [CandidateGenerator('one', lambda ctx: [1])], deadline_ms=1000)
+    # Starts the executor's threads in this process, as a --preload warm-up does
+    assert pipeline.run({}).results == [1]
+
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            result = pipeline.run({})
+            os.write(write_fd, repr((result.results, result.dropped)).encode())
+        finally:
+            os._exit(0)
+    os.close(write_fd)
+    os.waitpid(pid, 0)
+    assert os.read(read_fd, 1024) == b"([1], [])"
@@ -0,0 +1,12 @@
+def test_likes_are_listed_in_the_order_they_were_liked(db, client, auth_headers):
+    db.get_movies_collection().insert_many([
+        {"id": movie_id, "title": f"Movie {movie_id}", "poster_path": f"/{movie_id}.jpg", "vote_average": 7.0}
+        for movie_id in (10, 20, 30, 40)
+    ])
+    for movie_id in (30, 10, 40, 20):
+        assert client.post(f'/user/like/{movie_id}', headers=auth_headers).status_code == 200
+    client.post('/user/dislike/40', headers=auth_headers)
+
+    response = client.get('/user/likes', headers=auth_headers)
+    assert response.status_code == 200
+    assert [movie['id'] for movie in response.get_json()] == [30, 10, 20]
@@ -2,7 +2,25 @@ from datetime import datetime
 from database import db
 from bson import ObjectId
 import re
-from werkzeug.security import generate_password_hash, check_password_hash
+import password_hashing
+from user_cache import invalidate_user
+
+# Everything except credentials, for endpoints that return the account itself
+PUBLIC_USER_PROJECTION = {"password": 0, "reset_token": 0, "reset_token_expires": 0}
+
+# What login needs; one profile is enough to tell legacy documents apart
+LOGIN_PROJECTION = {
+    "name": 1,
+    "email": 1,
+    "password": 1,
+    "is_admin": 1,
+    "profile_emoji": 1,
+    "is_child": 1,
+    "profiles": {"$slice": 1}
+}
+
+# Matches legacy documents created before profiles existed
+MISSING_PROFILES_FILTER = {"$or": [{"profiles": {"$exists": False}}, {"profiles": {"$size": 0}}]}
 
 class User:
     @staticmethod
@@ -22,7 +40,7 @@ class User:
         # Create user with default profile
         user_data = {
             "email": email,
-            "password": generate_password_hash(password),
+            "password": password_hashing.hash_password(password),
             "name": name,
             "profile_emoji": profile_emoji or "👤",
             "is_child": is_child,
@@ -42,9 +60,11 @@ class User:
         return str(result.inserted_id)
 
     @staticmethod
-    def ensure_default_profile(user_id):
+    def ensure_default_profile(user_id, user=None):
+        # Pass an already loaded user (with name/profile_emoji/is_child/profiles) to skip the read
         users = db.get_users_collection()
-        user = users.find_one({"_id": ObjectId(user_id)})
+        if user is None:
+            user = users.find_one({"_id": ObjectId(user_id)})
         
         if user and not user.get('profiles'):
             default_profile = {
@@ -55,28 +75,67 @@ class User:
                 "created_at": datetime.utcnow()
             }
             
-            users.update_one(
-                {"_id": ObjectId(user_id)},
+            # Conditional, so a concurrent login or the backfill cannot add a second default
+            result = users.update_one(
+                {"_id": ObjectId(user_id), **MISSING_PROFILES_FILTER},
                 {"$set": {"profiles": [default_profile]}}
             )
-            return True
+            invalidate_user(user_id)
+            return result.modified_count > 0
         return False
 
     @staticmethod
-    def find_by_email(email):
-        return db.get_users_collection().find_one({"email": email})
+    def backfill_default_profiles():
+        # One server-side pass that gives every legacy user a default profile
+        result = db.get_users_collection().update_many(
+            MISSING_PROFILES_FILTER,
+            [{"$set": {"profiles": [{
+                "name": "$name",
+                "profile_emoji": {"$ifNull": ["$profile_emoji", "👤"]},
+                "is_child": {"$ifNull": ["$is_child", False]},
+                "is_default": True,
+                "created_at": "$$NOW"
+            }]}}]
+        )
+        return result.modified_count
+
+    @staticmethod
+    def find_by_email(email, projection=None):
+        return db.get_users_collection().find_one({"email": email}, projection)
     
     @staticmethod
-    def find_by_id(user_id):
+    def find_by_id(user_id, projection=None):
         users = db.get_users_collection()
         try:
-            return users.find_one({"_id": ObjectId(user_id)})
+            return users.find_one({"_id": ObjectId(user_id)}, projection)
         except Exception:
             return None
+
+    @staticmethod
+    def get_profile_watchlist(user_id, profile_idx):
+        user = db.get_users_collection().find_one(
+            {"_id": ObjectId(user_id)},
+            {"_id": 0, "profiles.watchlist": 1}
+        )
+        profiles = (user or {}).get('profiles') or []
+        if profile_idx >= len(profiles):
+            return None
+        return profiles[profile_idx].get('watchlist', [])
         
     @staticmethod
     def verify_password(user, password):
-        return check_password_hash(user['password'], password)
+        return password_hashing.verify_password(user['password'], password)
+
+    @staticmethod
+    def rehash_password_if_needed(user, password):
+        # Upgrades a stored hash to the configured method/cost after a successful login
+        if not password_hashing.needs_rehash(user['password']):
+            return False
+        db.get_users_collection().update_one(
+            {"_id": user['_id'], "password": user['password']},
+            {"$set": {"password": password_hashing.hash_password(password)}}
+        )
+        return True
     
     @staticmethod
     def update_preferences(user_id, preferences):
@@ -84,6 +143,7 @@ class User:
             {"_id": ObjectId(user_id)},
             {"$set": {"preferred_genres": preferences}}
         )
+        invalidate_user(user_id)
     
     @staticmethod
     def update_profile(user_id, name, profile_emoji):
@@ -91,6 +151,7 @@ class User:
             {"_id": ObjectId(user_id)},
             {"$set": {"name": name, "profile_emoji": profile_emoji}}
         )
+        invalidate_user(user_id)
     
     @staticmethod
     def set_reset_token(email, token, expires):
@@ -108,11 +169,12 @@ class User:
     
     @staticmethod
     def update_password(user_id, new_password):
-        hashed_password = generate_password_hash(new_password)
+        hashed_password = password_hashing.hash_password(new_password)
         db.get_users_collection().update_one(
             {"_id": ObjectId(user_id)},
             {"$set": {"password": hashed_password}, "$unset": {"reset_token": "", "reset_token_expires": ""}}
         )
+        invalidate_user(user_id)
     
     @staticmethod
     def add_to_watchlist(user_id, movie_id):
@@ -120,6 +182,7 @@ class User:
             {"_id": ObjectId(user_id)},
             {"$addToSet": {"watchlist": movie_id}}
         )
+        invalidate_user(user_id)
     
     @staticmethod
     def remove_from_watchlist(user_id, movie_id):
@@ -127,6 +190,7 @@ class User:
             {"_id": ObjectId(user_id)},
             {"$pull": {"watchlist": movie_id}}
         )
+        invalidate_user(user_id)
 
     @staticmethod
     def add_profile(user_id, profile_data):
@@ -138,6 +202,7 @@ class User:
             {"_id": ObjectId(user_id)},
             {"$push": {"profiles": profile_data}}
         )
+        invalidate_user(user_id)
         return result.modified_count > 0
 
     @staticmethod
@@ -175,6 +240,7 @@ class User:
                 {"_id": ObjectId(user_id)},
                 {"$set": {"profiles": [default_profile]}}
             )
+            invalidate_user(user_id)
             return True
         return False
 
@@ -202,6 +268,7 @@ class User:
                 {"_id": ObjectId(user_id)},
                 {"$set": {"profiles": [default_profile]}}
             )
+            invalidate_user(user_id)
             return [default_profile]
         
         return user['profiles']
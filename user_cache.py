@@ -0,0 +1,80 @@
+from database import db
+from bson import ObjectId
+from cache import LRUCache
+
+# Slim per-user documents for authenticated hot paths: no password hash, no watchlists
+SLIM_USER_PROJECTION = {
+    "name": 1,
+    "email": 1,
+    "profile_emoji": 1,
+    "is_child": 1,
+    "is_admin": 1,
+    "profiles.name": 1,
+    "profiles.profile_emoji": 1,
+    "profiles.is_child": 1,
+    "profiles.is_default": 1,
+    "profiles.preferred_genres": 1,
+    "profiles.preferred_languages": 1,
+    "liked_movies": 1,
+    "disliked_movies": 1
+}
+
+# Workers do not see each other's invalidations, the TTL bounds that staleness
+USER_TTL = 60
+_users = LRUCache('users', maxsize=10000, ttl=USER_TTL)
+
+# Called with the user id whenever a user document changes
+_invalidation_listeners = []
+
+
+def on_invalidate(listener):
+    _invalidation_listeners.append(listener)
+    return listener
+
+
+def _load(user_id):
+    try:
+        user = db.get_users_collection().find_one({"_id": ObjectId(user_id)}, SLIM_USER_PROJECTION)
+    except Exception:
+        return None
+    if user:
+        _users.set(user_id, user)
+    return user
+
+
+def get_user(user_id):
+    if not user_id:
+        return None
+    user_id = str(user_id)
+    user = _users.get(user_id)
+    if user is None:
+        user = _load(user_id)
+    return user
+
+
+def invalidate_user(user_id):
+    if not user_id:
+        return
+    _users.delete(str(user_id))
+    for listener in _invalidation_listeners:
+        listener(str(user_id))
+
+
+def has_profile(user_id, profile_idx):
+    user = get_user(user_id)
+    if user and profile_idx < len(user.get('profiles') or []):
+        return True
+    # Profiles are never removed, so only a miss can be stale: confirm it against Mongo
+    user = _load(user_id)
+    return bool(user) and profile_idx < len(user.get('profiles') or [])
+
+
+def get_liked_ids(user_id):
+    user = get_user(user_id)
+    return set(user.get('liked_movies', [])) if user else set()
+
+
+def get_liked_list(user_id):
+    # Liked movie ids in the order they were liked
+    user = get_user(user_id)
+    return list(user.get('liked_movies', [])) if user else []
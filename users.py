@@ -1,10 +1,16 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
-from models.user import User
+from models.user import User, PUBLIC_USER_PROJECTION
 from database import db
 from bson import ObjectId
 from datetime import datetime
-from werkzeug.security import generate_password_hash
+from password_hashing import hash_password, HashingOverloaded
+from dislikes import record_dislike, record_undislike
+from user_cache import get_liked_list, invalidate_user
+import profile_mutations
+import interactions
+import movie_cards
+from serialization import list_body, raw_response
 
 user_routes = Blueprint('user', __name__)
 
@@ -13,7 +19,7 @@ user_routes = Blueprint('user', __name__)
 @jwt_required()
 def get_profile():
     user_id = get_jwt_identity()
-    user = User.find_by_id(user_id)
+    user = User.find_by_id(user_id, PUBLIC_USER_PROJECTION)
     if not user:
         return jsonify({"error": "User not found"}), 404
     return jsonify({
@@ -46,17 +52,11 @@ def update_profile_preferences_by_index(profile_idx):
     languages = request.json.get('preferred_languages', [])
     if not isinstance(genres, list) or not isinstance(languages, list):
         return jsonify({"error": "Preferred genres and languages must be arrays"}), 400
-    users = db.get_users_collection()
-    user = users.find_one({"_id": ObjectId(user_id)})
-    if not user or not user.get('profiles') or profile_idx >= len(user['profiles']):
+    if not profile_mutations.set_profile_fields(user_id, profile_idx, {
+        "preferred_genres": genres,
+        "preferred_languages": languages
+    }):
         return jsonify({"error": "Profile not found"}), 404
-    users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {
-            f"profiles.{profile_idx}.preferred_genres": genres,
-            f"profiles.{profile_idx}.preferred_languages": languages
-        }}
-    )
     return jsonify({"message": "Preferences updated successfully"}), 200
 
 # ---- Watchlist ----
@@ -64,45 +64,48 @@ def update_profile_preferences_by_index(profile_idx):
 @jwt_required()
 def get_profile_watchlist(profile_idx):
     user_id = get_jwt_identity()
-    user = User.find_by_id(user_id)
-    if not user or not user.get('profiles') or profile_idx >= len(user['profiles']):
+    watchlist = User.get_profile_watchlist(user_id, profile_idx)
+    if watchlist is None:
         return jsonify({"error": "Profile not found"}), 404
-    profile = user['profiles'][profile_idx]
-    movies_collection = db.get_movies_collection()
-    watchlist_movies = list(movies_collection.find(
-        {"id": {"$in": profile.get("watchlist", [])}},
-        {"_id": 0, "id": 1, "title": 1, "poster_path": 1, "release_year": 1, "vote_average": 1}
-    ))
-    return jsonify(watchlist_movies), 200
+    fields = movie_cards.field_set_name(request.args.get('fields'), 'card')
+    return raw_response(list_body(movie_cards.fragments(watchlist, fields)))
 
 @user_routes.route('/watchlist/<int:profile_idx>/<int:movie_id>', methods=['POST'])
 @jwt_required()
 def add_to_profile_watchlist(profile_idx, movie_id):
     user_id = get_jwt_identity()
-    users = db.get_users_collection()
-    user = users.find_one({"_id": ObjectId(user_id)})
-    if not user or not user.get('profiles') or profile_idx >= len(user['profiles']):
+    if not profile_mutations.add_to_watchlist(user_id, profile_idx, movie_id):
         return jsonify({"error": "Profile not found"}), 404
-    users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$addToSet": {f"profiles.{profile_idx}.watchlist": movie_id}}
-    )
+    interactions.record(user_id, 'watchlist_add', movie_id, profile_idx)
     return jsonify({"message": "Added to watchlist"}), 200
 
 @user_routes.route('/watchlist/<int:profile_idx>/<int:movie_id>', methods=['DELETE'])
 @jwt_required()
 def remove_from_profile_watchlist(profile_idx, movie_id):
     user_id = get_jwt_identity()
-    users = db.get_users_collection()
-    user = users.find_one({"_id": ObjectId(user_id)})
-    if not user or not user.get('profiles') or profile_idx >= len(user['profiles']):
+    if not profile_mutations.remove_from_watchlist(user_id, profile_idx, movie_id):
         return jsonify({"error": "Profile not found"}), 404
-    users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$pull": {f"profiles.{profile_idx}.watchlist": movie_id}}
-    )
+    interactions.record(user_id, 'watchlist_remove', movie_id, profile_idx)
     return jsonify({"message": "Removed from watchlist"}), 200
 
+@user_routes.route('/interactions', methods=['POST'])
+@jwt_required()
+def ingest_interactions():
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    try:
+        accepted, matched, modified = interactions.ingest(user_id, data.get('events'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if not matched:
+        return jsonify({"error": "Profile not found"}), 404
+    return jsonify({
+        "message": "Interactions recorded",
+        "accepted": accepted,
+        "matched": matched,
+        "modified": modified
+    }), 200
+
 # ---- Account Management ----
 @user_routes.route('/register', methods=['POST'])
 def register():
@@ -122,7 +125,10 @@ def register():
     if users.find_one({"email": email}):
         return jsonify({"error": "Email already registered"}), 400
 
-    hashed_password = generate_password_hash(password)
+    try:
+        hashed_password = hash_password(password)
+    except HashingOverloaded:
+        return jsonify({"error": "Server busy, please try again"}), 503
     user_doc = {
         "name": name,
         "email": email,
@@ -144,6 +150,7 @@ def register():
             }
         ],
         "liked_movies": [],
+        "disliked_movies": [],
         "created_at": datetime.utcnow()
     }
     result = users.insert_one(user_doc)
@@ -162,7 +169,7 @@ def register():
 @jwt_required()
 def get_user_profiles():
     user_id = get_jwt_identity()
-    user = User.find_by_id(user_id)
+    user = User.find_by_id(user_id, {"profiles": 1})
     if not user:
         return jsonify({"error": "User not found"}), 404
     return jsonify(user.get('profiles', [])), 200
@@ -173,8 +180,11 @@ def like_movie(movie_id):
     user_id = get_jwt_identity()
     db.get_users_collection().update_one(
         {"_id": ObjectId(user_id)},
-        {"$addToSet": {"liked_movies": movie_id}}
+        {"$addToSet": {"liked_movies": movie_id}, "$pull": {"disliked_movies": movie_id}}
     )
+    record_undislike(user_id, movie_id)
+    invalidate_user(user_id)
+    interactions.record(user_id, 'like', movie_id)
     return jsonify({"message": "Liked!"}), 200
 
 @user_routes.route('/dislike/<int:movie_id>', methods=['POST'])
@@ -183,18 +193,20 @@ def dislike_movie(movie_id):
     user_id = get_jwt_identity()
     db.get_users_collection().update_one(
         {"_id": ObjectId(user_id)},
-        {"$pull": {"liked_movies": movie_id}}
+        {"$pull": {"liked_movies": movie_id}, "$addToSet": {"disliked_movies": movie_id}}
     )
+    record_dislike(user_id, movie_id)
+    invalidate_user(user_id)
+    interactions.record(user_id, 'dislike', movie_id)
     return jsonify({"message": "Disliked!"}), 200
 
 @user_routes.route('/likes', methods=['GET'])
 @jwt_required()
 def get_liked_movies():
     user_id = get_jwt_identity()
-    user = db.get_users_collection().find_one({"_id": ObjectId(user_id)})
-    liked = user.get("liked_movies", [])
-    movies = list(db.get_movies_collection().find({"id": {"$in": liked}}, {"_id": 0}))
-    return jsonify(movies), 200
+    liked = get_liked_list(user_id)
+    fields = movie_cards.field_set_name(request.args.get('fields'), 'rec')
+    return raw_response(list_body(movie_cards.fragments(liked, fields)))
 
 @user_routes.route('/profiles', methods=['POST'])
 @jwt_required()
@@ -216,6 +228,7 @@ def create_profile():
         {"_id": ObjectId(user_id)},
         {"$push": {"profiles": new_profile}}
     )
+    invalidate_user(user_id)
     if result.modified_count > 0:
         return jsonify(new_profile), 201
     else:
@@ -230,11 +243,15 @@ def reset_password():
     if not new_password or len(new_password) < 4:
         return jsonify({"error": "Password must be at least 4 characters"}), 400
     users = db.get_users_collection()
-    hashed_password = generate_password_hash(new_password)
+    try:
+        hashed_password = hash_password(new_password)
+    except HashingOverloaded:
+        return jsonify({"error": "Server busy, please try again"}), 503
     result = users.update_one(
         {"_id": ObjectId(user_id)},
         {"$set": {"password": hashed_password}}
     )
+    invalidate_user(user_id)
     if result.matched_count > 0:
         return jsonify({"message": "Password reset successfully"}), 200
     else:
@@ -244,8 +261,7 @@ def reset_password():
 @jwt_required()
 def get_default_profile_watchlist():
     user_id = get_jwt_identity()
-    users = db.get_users_collection()
-    user = users.find_one({"_id": ObjectId(user_id)})
+    user = User.find_by_id(user_id, {"profiles.is_default": 1, "profiles.watchlist": 1})
 
     if not user:
         return jsonify({"error": "User not found"}), 404
@@ -269,15 +285,9 @@ def update_profile_by_index(profile_idx):
     profile_emoji = data.get('profile_emoji')
     if not name or not profile_emoji:
         return jsonify({"error": "Name and profile emoji are required"}), 400
-    users = db.get_users_collection()
-    user = users.find_one({"_id": ObjectId(user_id)})
-    if not user or not user.get('profiles') or profile_idx >= len(user['profiles']):
+    if not profile_mutations.set_profile_fields(user_id, profile_idx, {
+        "name": name,
+        "profile_emoji": profile_emoji
+    }):
         return jsonify({"error": "Profile not found"}), 404
-    users.update_one(
-        {"_id": ObjectId(user_id)},
-        {"$set": {
-            f"profiles.{profile_idx}.name": name,
-            f"profiles.{profile_idx}.profile_emoji": profile_emoji
-        }}
-    )
     return jsonify({"message": "Profile updated successfully"}), 200
\ No newline at end of file
@@ -0,0 +1,94 @@
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from flask import Blueprint, jsonify
+
+# Deploy warm-up: replays hot routes against the app before it reports ready,
+# so the first users after a deploy do not pay for cold Mongo queries and
+# empty caches. Load balancers should gate traffic on /health/ready.
+
+DEFAULT_ROUTES = '/movies/popular,/people/popular,/movies/new-releases,/movies/free'
+WARMUP_ROUTES = [r.strip() for r in os.environ.get('WARMUP_ROUTES', DEFAULT_ROUTES).split(',') if r.strip()]
+WARMUP_TOP_MOODS = int(os.environ.get('WARMUP_TOP_MOODS', '5'))
+WARMUP_CONCURRENCY = int(os.environ.get('WARMUP_CONCURRENCY', '4'))
+
+health_routes = Blueprint('health', __name__)
+
+state = {
+    "ready": False,
+    "started_at": None,
+    "elapsed_ms": None,
+    "requests": 0,
+    "failures": 0,
+    "timings": []
+}
+_lock = threading.Lock()
+
+
+def mark_ready():
+    with _lock:
+        state["ready"] = True
+
+
+def warmup_requests(routes=None, top_moods=WARMUP_TOP_MOODS):
+    # (method, path, json body): the configured hot routes, every genre page
+    # and a chat query for each of the first `top_moods` moods
+    from movies import GENRE_MAPPING
+    from recommendations import MOOD_GENRE_MAP
+    requests = [('GET', path, None) for path in (routes or WARMUP_ROUTES)]
+    requests += [('GET', f"/movies/by-genre/{slug}", None) for slug in GENRE_MAPPING]
+    requests += [
+        ('POST', '/recommendations/chat', {"query": f"recommend {mood} movies"})
+        for mood in list(MOOD_GENRE_MAP)[:top_moods]
+    ]
+    return requests
+
+
+def _replay(app, request):
+    method, path, body = request
+    start = time.perf_counter()
+    try:
+        status = app.test_client().open(path, method=method, json=body).status_code
+    except Exception:
+        print(traceback.format_exc())
+        status = None
+    return {"method": method, "path": path, "status": status, "ms": round((time.perf_counter() - start) * 1000, 1)}
+
+
+def run(app, routes=None, top_moods=WARMUP_TOP_MOODS, concurrency=WARMUP_CONCURRENCY):
+    """Replay the warm-up requests concurrently, then mark the app ready."""
+    start = time.perf_counter()
+    with _lock:
+        state.update(ready=False, started_at=datetime.utcnow().isoformat(), timings=[])
+    requests = warmup_requests(routes, top_moods)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='warm-up') as executor:
+        timings = list(executor.map(lambda request: _replay(app, request), requests))
+    failures = sum(1 for t in timings if t["status"] is None or t["status"] >= 500)
+    elapsed_ms = round((time.perf_counter() - start) * 1000, 1)
+    # A failed warm-up request is reported but does not keep the worker out of rotation
+    with _lock:
+        state.update(ready=True, elapsed_ms=elapsed_ms, requests=len(timings), failures=failures, timings=timings)
+    print(f"[warm-up] {len(timings)} requests in {elapsed_ms:.0f}ms, {failures} failed")
+    return state
+
+
+@health_routes.route('/live', methods=['GET'])
+def live():
+    return jsonify({"status": "ok"}), 200
+
+
+@health_routes.route('/ready', methods=['GET'])
+def ready():
+    with _lock:
+        body = {
+            "ready": state["ready"],
+            "started_at": state["started_at"],
+            "elapsed_ms": state["elapsed_ms"],
+            "requests": state["requests"],
+            "failures": state["failures"],
+            "slowest": sorted(state["timings"], key=lambda t: t["ms"], reverse=True)[:5]
+        }
+    return jsonify(body), 200 if body["ready"] else 503